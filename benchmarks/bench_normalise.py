@@ -0,0 +1,97 @@
+"""
+Compare the old pandas row pipeline with ``stock_app.rows.normalise``.
+
+Each variant runs in a fresh interpreter so its import cost and peak RSS
+are measured in isolation:
+
+    python benchmarks/bench_normalise.py --rows 2500 --repeat 50
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER = r'''
+import csv, io, json, random, resource, statistics, sys, time
+
+def fake_rows(n):
+    rnd = random.Random(1)
+    return [
+        {"sr": i + 1, "nsecode": f"SYM{i}", "name": f"Company {i}", "bsecode": str(500000 + i),
+         "per_chg": round(rnd.uniform(-5, 5), 2), "close": round(rnd.uniform(20, 5000), 2),
+         "volume": rnd.randint(1000, 10**7)}
+        for i in range(n)
+    ]
+
+variant, n, repeat = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+raw = fake_rows(n)
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+t0 = time.perf_counter()
+if variant == "pandas":
+    import pandas as pd
+
+    def run():
+        filtered = [r for r in raw if all(k in r for k in ["nsecode", "per_chg", "close", "volume", "sr"])]
+        records = pd.DataFrame(filtered).rename(columns={
+            "nsecode": "stock_name", "per_chg": "percent_change", "close": "current_price",
+            "volume": "trade_volume", "sr": "rank"}).to_dict(orient="records")
+        buf = io.StringIO()
+        pd.DataFrame(filtered).to_csv(buf, index=False)
+        return records
+else:
+    from stock_app.rows import CSV_HEADER, normalise
+
+    def run():
+        rows = list(normalise(raw))
+        writer = csv.writer(io.StringIO(), lineterminator="\n")
+        writer.writerow(CSV_HEADER)
+        writer.writerows(row.as_tuple() for row in rows)
+        return rows
+import_s = time.perf_counter() - t0
+
+timings = []
+for _ in range(repeat):
+    t = time.perf_counter()
+    run()
+    timings.append(time.perf_counter() - t)
+
+rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    "variant": variant,
+    "import_ms": import_s * 1000,
+    "median_ms": statistics.median(timings) * 1000,
+    "p95_ms": sorted(timings)[int(len(timings) * 0.95) - 1] * 1000,
+    "rss_delta_mb": (rss_after - rss_before) / 1024,
+    "peak_rss_mb": rss_after / 1024,
+}))
+'''
+
+
+def run_variant(variant, rows, repeat):
+    out = subprocess.run(
+        [sys.executable, "-c", WORKER, variant, str(rows), str(repeat)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2500)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{args.rows} rows, {args.repeat} repeats")
+    print(f"{'variant':<10}{'import ms':>12}{'median ms':>12}{'p95 ms':>10}{'RSS +MB':>10}{'peak MB':>10}")
+    for variant in ("pandas", "normalise"):
+        r = run_variant(variant, args.rows, args.repeat)
+        print(f"{r['variant']:<10}{r['import_ms']:>12.1f}{r['median_ms']:>12.2f}{r['p95_ms']:>10.2f}"
+              f"{r['rss_delta_mb']:>10.1f}{r['peak_rss_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Bytes on the wire and server time for the screener page and JSON API,
+against a local fake Chartink (``fake_chartink.py``):
+
+    python benchmarks/bench_render.py --repeat 50
+
+Each variant runs in a fresh interpreter with a throwaway database and
+caches. ``fragments`` is the normal setup; ``no-fragments`` swaps the
+``template_fragments`` cache for a dummy one, so the screener grid and
+result table are rendered on every request.
+
+Every screener is scanned once, untimed. Then, for each request, the
+report gives the response size for each ``Accept-Encoding`` (identity,
+gzip, brotli) and the median wall and CPU time of requests sent with
+``Accept-Encoding: br, gzip``, compression included:
+
+* ``grid``: GET /, the category grid without results;
+* ``table``: POST / with a screener, the grid and its result table;
+* ``api``: GET /api/screeners/<key>/results/.
+
+The page's CSS and JS are separate static files; their sizes are reported
+once, since browsers cache them for as long as their hashed names last.
+"""
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from bench_views import ROOT, environment, start_fake_chartink, stop
+
+VARIANTS = ("fragments", "no-fragments")
+ENCODINGS = {"identity": "", "gzip": "gzip", "br": "br, gzip"}
+
+WORKER = r'''
+import json, os, statistics, sys, time
+
+import django
+from django.conf import settings
+
+variant, screeners, repeat = sys.argv[1], sys.argv[2].split(","), int(sys.argv[3])
+django.setup()
+if variant == "no-fragments":
+    settings.CACHES["template_fragments"] = {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.core.management import call_command
+from django.test import Client
+
+call_command("migrate", verbosity=0)
+client = Client()
+client.force_login(User.objects.create_user("bench", password="bench"))
+
+REQUESTS = {
+    "grid": lambda key, **h: client.get("/", **h),
+    "table": lambda key, **h: client.post("/", {"screener_name": key}, **h),
+    "api": lambda key, **h: client.get(f"/api/screeners/{key}/results/", **h),
+}
+ENCODINGS = json.loads(sys.argv[4])
+
+for key in screeners:
+    assert REQUESTS["table"](key).status_code == 200
+
+report = {}
+for name, request in REQUESTS.items():
+    sizes = {}
+    for encoding, accept in ENCODINGS.items():
+        responses = [request(key, HTTP_ACCEPT_ENCODING=accept) for key in screeners]
+        assert all(r.status_code == 200 for r in responses), [r.status_code for r in responses]
+        assert all(r.get("Content-Encoding", "identity") in (encoding, "gzip") for r in responses)
+        sizes[encoding] = statistics.mean(len(r.content) for r in responses)
+    wall, cpu = [], []
+    for _ in range(repeat):
+        for key in screeners:
+            w0, c0 = time.perf_counter(), time.process_time()
+            request(key, HTTP_ACCEPT_ENCODING=ENCODINGS["br"])
+            wall.append(time.perf_counter() - w0)
+            cpu.append(time.process_time() - c0)
+    report[name] = {
+        "bytes": sizes,
+        "served_as": request(screeners[0], HTTP_ACCEPT_ENCODING=ENCODINGS["br"]).get("Content-Encoding", "identity"),
+        "wall_ms": statistics.median(wall) * 1000,
+        "cpu_ms": statistics.median(cpu) * 1000,
+    }
+report["static"] = {
+    name: os.path.getsize(finders.find(f"stock_app/{name}")) for name in ("index.css", "index.js")
+}
+print(json.dumps(report))
+'''
+
+
+def run(variant, args, env):
+    out = subprocess.run(
+        [sys.executable, "-c", WORKER, variant, ",".join(args.screeners), str(args.repeat), json.dumps(ENCODINGS)],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if out.returncode:
+        raise SystemExit(out.stderr)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--screeners", default="episodic_pivot,ipo_base,minervini_stage_2,all_tradable_stocks",
+                        help="Comma-separated screener keys.")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed requests per screener per request type.")
+    parser.add_argument("--rows", type=int, help="Rows in every fake payload.")
+    parser.add_argument("--variants", default=",".join(VARIANTS))
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+    args.screeners = [s for s in args.screeners.split(",") if s]
+    args.latency = args.jitter = 0.0
+    args.payloads = None
+
+    fake, port = start_fake_chartink(args)
+    try:
+        report = {}
+        for variant in args.variants.split(","):
+            workdir = tempfile.mkdtemp(prefix="bench_render_")
+            try:
+                env = environment(workdir, port)
+                env["STATIC_ROOT"] = workdir
+                report[variant] = run(variant, args, env)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        stop(fake)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'variant':<14}{'request':<8}{'identity B':>11}{'gzip B':>9}{'br B':>9}{'served':>8}{'p50 ms':>9}{'CPU ms':>9}")
+    for variant, requests in report.items():
+        for name, r in requests.items():
+            if name == "static":
+                continue
+            b = r["bytes"]
+            print(f"{variant:<14}{name:<8}{b['identity']:>11.0f}{b['gzip']:>9.0f}{b['br']:>9.0f}"
+                  f"{r['served_as']:>8}{r['wall_ms']:>9.2f}{r['cpu_ms']:>9.2f}")
+    static = next(iter(report.values()))["static"]
+    print("static (cached by the browser): " + ", ".join(f"{name} {size} B" for name, size in static.items()))
+
+
+if __name__ == "__main__":
+    main()
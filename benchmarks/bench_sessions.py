@@ -0,0 +1,144 @@
+"""
+Database queries and time per request for each session setup:
+
+    python benchmarks/bench_sessions.py --repeat 200
+
+* ``db-untracked``: ``user_sessions.backends.db`` behind Django's own
+  session middleware (the previous settings). Sessions never record an IP
+  or user agent.
+* ``db``: ``user_sessions.backends.db`` behind ``user_sessions``'
+  middleware. Device tracking works, but every request reads the session
+  row and a changed device rewrites the whole row.
+* ``cached``: ``stock_app.sessions``, reads from the session cache and
+  writes device activity at most once per ``SESSION_ACTIVITY_INTERVAL``.
+
+Each variant runs in a fresh interpreter against a throwaway database and
+session cache. It makes logged-in GET / requests in two scenarios:
+``same_device`` sends the same IP and user agent every time, and
+``roaming`` switches between two devices on every request. Queries are
+counted by table: the session table, the user lookup done by
+authentication, and anything else.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VARIANTS = {
+    "db-untracked": ("user_sessions.backends.db", "django.contrib.sessions.middleware.SessionMiddleware"),
+    "db": ("user_sessions.backends.db", "user_sessions.middleware.SessionMiddleware"),
+    "cached": ("stock_app.sessions", "user_sessions.middleware.SessionMiddleware"),
+}
+
+WORKER = r'''
+import json, statistics, sys, time
+
+engine, middleware, repeat = sys.argv[1], sys.argv[2], int(sys.argv[3])
+
+import django
+from django.conf import settings
+
+django.setup()
+settings.SESSION_ENGINE = engine
+settings.MIDDLEWARE = [
+    middleware if name.endswith(".SessionMiddleware") else name for name in settings.MIDDLEWARE
+]
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+call_command("migrate", verbosity=0)
+user = User.objects.create_user("bench", password="bench")
+DEVICES = [
+    {"REMOTE_ADDR": "10.0.0.1", "HTTP_USER_AGENT": "Mozilla/5.0 (X11; Linux x86_64) Firefox/128.0"},
+    {"REMOTE_ADDR": "10.0.0.2", "HTTP_USER_AGENT": "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0) Safari/604.1"},
+]
+SCENARIOS = {"same_device": [DEVICES[0]], "roaming": DEVICES}
+
+
+def table(sql):
+    if "user_sessions_session" in sql:
+        return "session"
+    if "auth_user" in sql:
+        return "user"
+    return "other"
+
+
+report = {}
+for name, devices in SCENARIOS.items():
+    client = Client()
+    client.force_login(user)
+    # Untimed: the first request records the device.
+    assert client.get("/", **devices[0]).status_code == 200
+    counts = {"session": 0, "user": 0, "other": 0}
+    timings = []
+    for i in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            t0 = time.perf_counter()
+            response = client.get("/", **devices[(i + 1) % len(devices)])
+            timings.append(time.perf_counter() - t0)
+        assert response.status_code == 200, response.status_code
+        for query in queries:
+            counts[table(query["sql"])] += 1
+    report[name] = {
+        "queries": {kind: count / repeat for kind, count in counts.items()},
+        "p50_ms": statistics.median(timings) * 1000,
+    }
+print(json.dumps(report))
+'''
+
+
+def run(variant, repeat):
+    engine, middleware = VARIANTS[variant]
+    workdir = tempfile.mkdtemp(prefix="bench_sessions_")
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        "DJANGO_SETTINGS_MODULE": "stock_project.settings",
+        "SECRET_KEY": env.get("SECRET_KEY") or "bench",
+        "ALLOWED_HOSTS": "*",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'db.sqlite3')}",
+        "SCREENER_CACHE_DIR": os.path.join(workdir, "cache"),
+        "SESSION_CACHE_DIR": os.path.join(workdir, "sessions"),
+        "METRICS_DIR": os.path.join(workdir, "metrics"),
+        "LOG_LEVEL": "WARNING",
+    })
+    try:
+        out = subprocess.run(
+            [sys.executable, "-c", WORKER, engine, middleware, str(repeat)],
+            cwd=ROOT, env=env, capture_output=True, text=True,
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if out.returncode:
+        raise SystemExit(out.stderr)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200, help="Requests per scenario.")
+    parser.add_argument("--variants", default=",".join(VARIANTS))
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+
+    report = {variant: run(variant, args.repeat) for variant in args.variants.split(",")}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'variant':<14}{'scenario':<13}{'session q':>10}{'user q':>8}{'other q':>9}{'p50 ms':>9}")
+    for variant, scenarios in report.items():
+        for name, r in scenarios.items():
+            q = r["queries"]
+            print(f"{variant:<14}{name:<13}{q['session']:>10.2f}{q['user']:>8.2f}{q['other']:>9.2f}{r['p50_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
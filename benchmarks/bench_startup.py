@@ -0,0 +1,156 @@
+"""
+Worker cold start: how long a fresh interpreter takes to import the
+application and resolve the URLconf, measured with ``python -X importtime``:
+
+    python benchmarks/bench_startup.py                    # WSGI and ASGI, 5 runs each
+    python benchmarks/bench_startup.py --check            # compare with baselines.json
+    python benchmarks/bench_startup.py --update-baseline
+
+Each run is a new interpreter that imports ``stock_project.wsgi`` (or
+``stock_project.asgi``) and loads every view the way a worker does before
+serving its first request. The report gives the median wall time, the
+median import time by module for the slowest imports, and which of the
+heavy libraries (NumPy, pandas, requests, httpx, ...) were loaded.
+
+``--check`` exits 1 when the wall time grew by more than ``--tolerance``
+against the baseline, or when a heavy library is imported at startup
+again. Those libraries belong on the code paths that use them.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINES = os.path.join(HERE, "baselines.json")
+HEAVY = ("numpy", "pandas", "requests", "httpx", "pytz", "bs4", "lxml")
+
+WORKER = r'''
+import json, sys, time
+
+t0 = time.perf_counter()
+import importlib
+importlib.import_module(sys.argv[1])
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - t0
+print(json.dumps({"wall_ms": elapsed * 1000, "heavy": [m for m in sys.argv[2].split(",") if m in sys.modules]}))
+'''
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+TARGETS = {"wsgi": "stock_project.wsgi", "asgi": "stock_project.asgi"}
+
+
+def run_once(module, env):
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", WORKER, module, ",".join(HEAVY)],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if out.returncode:
+        raise SystemExit(out.stderr)
+    modules = {}
+    for line in out.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            modules[name] = (int(own), int(cumulative), len(indent) // 2)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["modules"] = modules
+    return result
+
+
+def measure(target, env, repeat):
+    runs = [run_once(TARGETS[target], env) for _ in range(repeat)]
+    names = set().union(*(run["modules"] for run in runs))
+    cumulative = {
+        name: statistics.median(run["modules"][name][1] for run in runs if name in run["modules"]) / 1000
+        for name in names
+    }
+    return {
+        "wall_ms": round(statistics.median(run["wall_ms"] for run in runs), 1),
+        "modules": len(names),
+        "heavy": sorted(set().union(*(run["heavy"] for run in runs))),
+        "slowest": [
+            [name, round(ms, 1)]
+            for name, ms in sorted(cumulative.items(), key=lambda item: -item[1])
+            if name.startswith(("stock_app", "stock_project")) or name.split(".")[0] in HEAVY
+        ][:10],
+    }
+
+
+def environment(workdir):
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        "DJANGO_SETTINGS_MODULE": "stock_project.settings",
+        "SECRET_KEY": env.get("SECRET_KEY") or "bench",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'db.sqlite3')}",
+        "SCREENER_CACHE_DIR": os.path.join(workdir, "cache"),
+        "SESSION_CACHE_DIR": os.path.join(workdir, "sessions"),
+        "METRICS_DIR": os.path.join(workdir, "metrics"),
+    })
+    env.pop("ASYNC_VIEWS", None)
+    return env
+
+
+def regressions(report, baseline, tolerance):
+    found = []
+    for target, result in report.items():
+        if result["heavy"]:
+            found.append(f"{target}: imports {', '.join(result['heavy'])} at startup")
+        base = baseline.get(target)
+        if base and result["wall_ms"] > base["wall_ms"] * (1 + tolerance):
+            found.append(f"{target}: {result['wall_ms']}ms vs {base['wall_ms']}ms")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per target.")
+    parser.add_argument("--check", action="store_true", help="Exit 1 on a regression against the baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as workdir:
+        env = environment(workdir)
+        report = {target: measure(target, env, args.repeat) for target in args.targets.split(",")}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for target, r in report.items():
+            print(f"{target}: {r['wall_ms']}ms to import and resolve URLs, {r['modules']} modules, "
+                  f"heavy libraries: {', '.join(r['heavy']) or 'none'}")
+            for name, ms in r["slowest"]:
+                print(f"  {ms:>8.1f}ms  {name}")
+
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as fh:
+            baselines = json.load(fh)
+    if args.update_baseline:
+        baselines["startup"] = {target: {"wall_ms": r["wall_ms"]} for target, r in report.items()}
+        with open(BASELINES, "w") as fh:
+            json.dump(baselines, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"Baseline for startup written to {os.path.relpath(BASELINES)}")
+    if args.check:
+        if "startup" not in baselines:
+            raise SystemExit("No startup baseline; run with --update-baseline first")
+        found = regressions(report, baselines["startup"], args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+        print(f"No regressions against the startup baseline (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""
+End-to-end benchmarks of ``index`` and ``download_csv`` against a local
+fake Chartink (``fake_chartink.py``), so nothing leaves the machine:
+
+    python benchmarks/bench_views.py                      # Django test client
+    python benchmarks/bench_views.py --http --server gunicorn --workers 4 --concurrency 32
+    python benchmarks/bench_views.py --check              # compare with baselines.json
+    python benchmarks/bench_views.py --update-baseline
+
+The test client runs in a fresh interpreter, one request at a time,
+through the whole middleware stack:
+
+* ``index_cold``: POST / with the screener's cache entry and recorded
+  runs deleted first, so every request scans (fake Chartink's
+  ``--latency`` included) and records the run;
+* ``index_db``: POST / with only the cache entry deleted, so the result
+  is loaded from the latest recorded run;
+* ``index_warm``: POST / served from the screener cache;
+* ``download_warm``: GET /download/ with the CSV fully streamed.
+
+``--http`` starts a real server (gunicorn, uvicorn with the async views,
+or runserver) and ``--concurrency`` logged-in clients that alternate the
+two views for ``--duration`` seconds. Each scenario reports throughput,
+p50/p95/p99 latency and the RSS of every worker process.
+
+Baselines are kept per mode in ``baselines.json``. ``--check`` exits 1
+when a scenario's p95 or RSS grew, or its throughput fell, by more than
+``--tolerance``. Timings depend on the machine: update the baseline on
+the machine that runs the check.
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINES = os.path.join(HERE, "baselines.json")
+USERNAME = PASSWORD = "bench"
+
+WORKER = r'''
+import json, sys, time
+
+import django
+
+django.setup()
+import psutil
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import Client
+
+from stock_app.models import ScreenerRun
+from stock_app.screener_cache import screener_cache
+from stock_app.screeners import SCREENER_CONDITIONS
+
+screeners, repeat = sys.argv[1].split(","), int(sys.argv[2])
+call_command("migrate", verbosity=0)
+user = User.objects.create_user("bench", password="bench")
+client = Client()
+client.force_login(user)
+
+
+def index(key):
+    response = client.post("/", {"screener_name": key})
+    assert response.status_code == 200, response.status_code
+    assert b"Scan failed:" not in response.content, response.content
+
+
+def download(key):
+    response = client.get("/download/", {"screener_name": key})
+    assert response.status_code == 200, response.status_code
+    for _ in response.streaming_content:
+        pass
+
+
+def forget_cached(key):
+    screener_cache.delete(key, SCREENER_CONDITIONS[key]["condition"])
+
+
+def forget_recorded(key):
+    ScreenerRun.objects.filter(screener=key).delete()
+    forget_cached(key)
+
+
+# name -> (untimed preparation, timed request)
+SCENARIOS = {
+    "index_cold": (forget_recorded, index),
+    "index_db": (forget_cached, index),
+    "index_warm": (None, index),
+    "download_warm": (None, download),
+}
+
+report = {}
+for name, (prepare, view) in SCENARIOS.items():
+    timings = []
+    for _ in range(repeat):
+        for key in screeners:
+            if prepare:
+                prepare(key)
+            t0 = time.perf_counter()
+            view(key)
+            timings.append(time.perf_counter() - t0)
+    report[name] = {"timings": timings, "elapsed": sum(timings), "rss_mb": [psutil.Process().memory_info().rss / 2**20]}
+print(json.dumps(report))
+'''
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, proc, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"{proc.args[1] if len(proc.args) > 1 else proc.args[0]} exited with {proc.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f"Nothing listening on port {port} after {timeout}s")
+
+
+def stop(proc):
+    if proc.poll() is None:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarise(timings, elapsed, rss_mb):
+    return {
+        "requests": len(timings),
+        "throughput": round(len(timings) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(timings, 50) * 1000, 2),
+        "p95_ms": round(percentile(timings, 95) * 1000, 2),
+        "p99_ms": round(percentile(timings, 99) * 1000, 2),
+        "rss_mb": [round(rss, 1) for rss in rss_mb],
+    }
+
+
+def environment(workdir, chartink_port):
+    """Environment for the app under test: throwaway DB, caches and metrics."""
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        "DJANGO_SETTINGS_MODULE": "stock_project.settings",
+        "SECRET_KEY": env.get("SECRET_KEY") or "bench",
+        "ALLOWED_HOSTS": "*",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'db.sqlite3')}",
+        "SCREENER_CACHE_DIR": os.path.join(workdir, "cache"),
+        "SCREENER_LOCK_DIR": os.path.join(workdir, "locks"),
+        "SESSION_CACHE_DIR": os.path.join(workdir, "sessions"),
+        "METRICS_DIR": os.path.join(workdir, "metrics"),
+        "CHARTINK_URL": f"http://127.0.0.1:{chartink_port}/screener/process",
+        # The fake server is not rate limited; the benchmark measures the app.
+        "CHARTINK_RATE": "1000",
+        "SCREENER_SOURCE": "chartink",
+        "LOG_LEVEL": "WARNING",
+    })
+    return env
+
+
+def start_fake_chartink(args):
+    port = free_port()
+    cmd = [sys.executable, os.path.join(HERE, "fake_chartink.py"), "--port", str(port),
+           "--latency", str(args.latency), "--jitter", str(args.jitter)]
+    if args.payloads:
+        cmd += ["--payloads", args.payloads]
+    if args.rows:
+        cmd += ["--rows", str(args.rows)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    wait_for(port, proc)
+    return proc, port
+
+
+def run_client(args, env):
+    out = subprocess.run(
+        [sys.executable, "-c", WORKER, ",".join(args.screeners), str(args.repeat)],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if out.returncode:
+        raise SystemExit(out.stderr)
+    report = json.loads(out.stdout.strip().splitlines()[-1])
+    return {name: summarise(r["timings"], r["elapsed"], r["rss_mb"]) for name, r in report.items()}
+
+
+def server_command(args, port):
+    if args.server == "gunicorn":
+        return ["gunicorn", "stock_project.wsgi", "-w", str(args.workers), "-b", f"127.0.0.1:{port}",
+                "--threads", str(args.threads)]
+    if args.server == "uvicorn":
+        return ["uvicorn", "stock_project.asgi:application", "--workers", str(args.workers),
+                "--host", "127.0.0.1", "--port", str(port)]
+    return [sys.executable, "manage.py", "runserver", "--noreload", f"127.0.0.1:{port}"]
+
+
+def sample_rss(proc, peaks, done):
+    """Peak RSS (MB) per worker process of the server, until ``done`` is set."""
+    import psutil
+
+    root = psutil.Process(proc.pid)
+    while not done.is_set():
+        try:
+            procs = [root] + root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return
+        for p in procs:
+            try:
+                rss = p.memory_info().rss / 2 ** 20
+            except psutil.NoSuchProcess:
+                continue
+            peaks[p.pid] = max(peaks.get(p.pid, 0), rss)
+        done.wait(0.5)
+
+
+def login(base):
+    import requests
+
+    session = requests.Session()
+    session.get(f"{base}/login/")
+    response = session.post(f"{base}/login/", data={
+        "username": USERNAME, "password": PASSWORD,
+        "csrfmiddlewaretoken": session.cookies["csrftoken"],
+    }, headers={"Referer": f"{base}/login/"}, allow_redirects=False)
+    if response.status_code != 302:
+        raise SystemExit(f"Login failed with {response.status_code}")
+    return session
+
+
+def load(args, base, scenario):
+    """``--concurrency`` clients requesting ``scenario`` for ``--duration`` seconds."""
+    timings, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + args.duration
+
+    def client(n):
+        session = login(base)
+        token = session.cookies["csrftoken"]
+        i = n
+        while time.monotonic() < stop_at:
+            key = args.screeners[i % len(args.screeners)]
+            i += 1
+            t0 = time.perf_counter()
+            if scenario == "index":
+                r = session.post(f"{base}/", data={"screener_name": key, "csrfmiddlewaretoken": token},
+                                 headers={"Referer": f"{base}/"})
+            else:
+                r = session.get(f"{base}/download/", params={"screener_name": key})
+            elapsed = time.perf_counter() - t0
+            with lock:
+                if r.status_code == 200:
+                    timings.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(args.concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return timings, time.perf_counter() - started, errors[0]
+
+
+def run_http(args, env):
+    port = free_port()
+    if shutil.which(server_command(args, port)[0]) is None:
+        raise SystemExit(f"{args.server} is not installed")
+    if args.server == "uvicorn":
+        env = dict(env, ASYNC_VIEWS="1")
+    setup = (
+        "import django; django.setup()\n"
+        "from django.core.management import call_command\n"
+        "from django.contrib.auth.models import User\n"
+        "call_command('migrate', verbosity=0)\n"
+        f"User.objects.create_user({USERNAME!r}, password={PASSWORD!r})\n"
+    )
+    subprocess.run([sys.executable, "-c", setup], cwd=ROOT, env=env, check=True)
+    server = subprocess.Popen(server_command(args, port), cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for(port, server)
+        base = f"http://127.0.0.1:{port}"
+        # Fill the screener cache so both scenarios measure warm requests.
+        warm = login(base)
+        for key in args.screeners:
+            warm.get(f"{base}/download/", params={"screener_name": key})
+        report = {}
+        for scenario in ("index", "download"):
+            peaks, done = {}, threading.Event()
+            sampler = threading.Thread(target=sample_rss, args=(server, peaks, done))
+            sampler.start()
+            timings, elapsed, errors = load(args, base, scenario)
+            done.set()
+            sampler.join()
+            result = summarise(timings, elapsed, [peaks[pid] for pid in sorted(peaks)])
+            result["errors"] = errors
+            report[f"{scenario}_http"] = result
+        return report
+    finally:
+        stop(server)
+
+
+def regressions(report, baseline, tolerance):
+    found = []
+    for name, result in report.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            found.append(f"{name}: p95 {result['p95_ms']}ms vs {base['p95_ms']}ms")
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            found.append(f"{name}: throughput {result['throughput']}/s vs {base['throughput']}/s")
+        if max(result["rss_mb"]) > max(base["rss_mb"]) * (1 + tolerance):
+            found.append(f"{name}: RSS {max(result['rss_mb'])}MB vs {max(base['rss_mb'])}MB")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--screeners", default="episodic_pivot,ipo_base,minervini_stage_2,all_tradable_stocks",
+                        help="Comma-separated screener keys to request in turn.")
+    parser.add_argument("--repeat", type=int, default=10, help="Test client: requests per screener per scenario.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake Chartink latency per scan (seconds).")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--payloads", help="Recorded payload directory for fake Chartink.")
+    parser.add_argument("--rows", type=int, help="Rows in every fake payload.")
+    parser.add_argument("--http", action="store_true", help="Load a real server over HTTP.")
+    parser.add_argument("--server", choices=("gunicorn", "uvicorn", "runserver"), default="gunicorn")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=1, help="Gunicorn threads per worker.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per HTTP scenario.")
+    parser.add_argument("--check", action="store_true", help="Exit 1 on a regression against the baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+    args.screeners = [s for s in args.screeners.split(",") if s]
+
+    mode = f"http-{args.server}-w{args.workers}-c{args.concurrency}" if args.http else "client"
+    if args.latency:
+        mode += f"-latency{args.latency:g}"
+    workdir = tempfile.mkdtemp(prefix="bench_views_")
+    fake, port = start_fake_chartink(args)
+    try:
+        env = environment(workdir, port)
+        report = run_http(args, env) if args.http else run_client(args, env)
+    finally:
+        stop(fake)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'scenario':<16}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  RSS MB per worker")
+        for name, r in report.items():
+            print(f"{name:<16}{r['requests']:>9}{r['throughput']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+                  f"{r['p99_ms']:>9}  {', '.join(map(str, r['rss_mb']))}")
+
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as fh:
+            baselines = json.load(fh)
+    if args.update_baseline:
+        baselines[mode] = report
+        with open(BASELINES, "w") as fh:
+            json.dump(baselines, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"Baseline for {mode} written to {os.path.relpath(BASELINES)}")
+    if args.check:
+        if mode not in baselines:
+            raise SystemExit(f"No baseline for {mode}; run with --update-baseline first")
+        found = regressions(report, baselines[mode], args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+        print(f"No regressions against the {mode} baseline (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Local stand-in for Chartink's ``/screener/process``, for benchmarks and
+load tests that must not touch chartink.com:
+
+    python benchmarks/fake_chartink.py --port 8765 --latency 0.25 --jitter 0.1
+    CHARTINK_URL=http://127.0.0.1:8765/screener/process python manage.py runserver
+
+``GET`` serves a page with the csrf-token meta tag. ``POST`` checks the
+``x-csrf-token`` header (419 if it is wrong, as Chartink does) and answers
+with the payload of the screener whose ``scan_clause`` was posted.
+
+Payloads come from ``--payloads DIR`` (one ``<screener key>.json`` per
+screener, as written by ``--record``). Screeners without one get a
+synthetic payload in Chartink's shape: deterministic per key, with 10 to
+3000 rows on a log scale (``--rows N`` fixes the size). Each POST waits
+``--latency`` seconds plus up to ``--jitter`` more, and ``--error-rate`` of
+them are answered 503.
+
+``--record DIR`` scans every screener on chartink.com once, through the
+app's rate-limited client, and saves the payloads for later runs.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATH = "/screener/process"
+MIN_ROWS, MAX_ROWS = 10, 3000
+
+
+def screener_conditions():
+    """``SCREENER_CONDITIONS`` from the app's screener registry."""
+    sys.path.insert(0, ROOT)
+    from stock_app.screeners import SCREENER_CONDITIONS
+
+    return SCREENER_CONDITIONS
+
+
+def synthetic_payload(key, rows=None):
+    """A Chartink-shaped payload for screener ``key``, the same on every run."""
+    rnd = random.Random(key)
+    if rows is None:
+        rows = int(math.exp(rnd.uniform(math.log(MIN_ROWS), math.log(MAX_ROWS))))
+    symbols = rnd.sample(range(5000), rows)
+    data = []
+    for sr, n in enumerate(symbols, 1):
+        data.append({
+            "sr": sr,
+            "nsecode": f"SYM{n}",
+            "name": f"Company {n} Limited",
+            "bsecode": str(500000 + n),
+            "per_chg": round(rnd.uniform(-8, 12), 2),
+            "close": round(rnd.uniform(20, 5000), 2),
+            "volume": rnd.randint(1000, 5 * 10 ** 7),
+        })
+    return {"draw": 1, "recordsTotal": rows, "recordsFiltered": rows, "data": data}
+
+
+class FakeChartink(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, payloads, latency=0.0, jitter=0.0, error_rate=0.0):
+        super().__init__(address, Handler)
+        self.token = secrets.token_hex(20)
+        # scan clause -> encoded response body
+        self.payloads = payloads
+        self.fallback = json.dumps(synthetic_payload("unknown", 25)).encode()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.posts = 0
+        self._lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json", headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.split("?")[0] != PATH:
+            return self._send(404, b"")
+        page = (
+            '<!DOCTYPE html><html><head><title>Screener</title>'
+            f'<meta name="csrf-token" content="{self.server.token}"></head>'
+            '<body>' + "<div>fake chartink</div>" * 200 + '</body></html>'
+        ).encode()
+        self._send(200, page, "text/html; charset=utf-8", [("Set-Cookie", "ci_session=fake; Path=/")])
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.split("?")[0] != PATH:
+            return self._send(404, b"")
+        server = self.server
+        with server._lock:
+            server.posts += 1
+        if self.headers.get("x-csrf-token") != server.token:
+            return self._send(419, b'{"message": "CSRF token mismatch."}')
+        delay = server.latency + random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+        if server.error_rate and random.random() < server.error_rate:
+            return self._send(503, b'{"message": "Service Unavailable"}', headers=[("Retry-After", "1")])
+        clause = parse_qs(body.decode("utf-8")).get("scan_clause", [""])[0]
+        self._send(200, server.payloads.get(clause, server.fallback))
+
+
+def load_payloads(conditions, directory=None, rows=None):
+    """``{scan clause: encoded payload}`` for every screener."""
+    payloads = {}
+    for key, screener in conditions.items():
+        path = os.path.join(directory, f"{key}.json") if directory else None
+        if path and os.path.exists(path):
+            with open(path, "rb") as fh:
+                body = fh.read()
+        else:
+            body = json.dumps(synthetic_payload(key, rows)).encode()
+        payloads[screener["condition"]["scan_clause"]] = body
+    return payloads
+
+
+def record(conditions, directory):
+    # The client's rate limit and retries are configured in the settings.
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stock_project.settings")
+    os.environ.setdefault("DATABASE_URL", "sqlite://:memory:")
+    import django
+
+    django.setup()
+    from stock_app.chartink import CHARTINK_URL, ChartinkClient
+
+    client = ChartinkClient(CHARTINK_URL)
+    os.makedirs(directory, exist_ok=True)
+    for key, screener in conditions.items():
+        try:
+            data = client.scan(screener["condition"])
+        except Exception as e:
+            print(f"{key}: {e.__class__.__name__}: {e}", file=sys.stderr)
+            continue
+        with open(os.path.join(directory, f"{key}.json"), "w") as fh:
+            json.dump({"data": data}, fh)
+        print(f"{key}: {len(data)} rows")
+
+
+def serve(port=0, host="127.0.0.1", payload_dir=None, rows=None, latency=0.0, jitter=0.0, error_rate=0.0):
+    """Start a server on a background thread and return it (``server.server_port``)."""
+    server = FakeChartink((host, port), load_payloads(screener_conditions(), payload_dir, rows),
+                          latency, jitter, error_rate)
+    threading.Thread(target=server.serve_forever, name="fake-chartink", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--payloads", help="Directory of recorded <screener key>.json payloads.")
+    parser.add_argument("--rows", type=int, help="Rows in every synthetic payload (default 10-3000 by key).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each POST is answered.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra seconds per POST.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of POSTs answered 503.")
+    parser.add_argument("--record", metavar="DIR", help="Save real Chartink payloads to DIR and exit.")
+    args = parser.parse_args()
+
+    conditions = screener_conditions()
+    if args.record:
+        return record(conditions, args.record)
+    server = FakeChartink((args.host, args.port), load_payloads(conditions, args.payloads, args.rows),
+                          args.latency, args.jitter, args.error_rate)
+    print(f"Fake Chartink on http://{args.host}:{server.server_port}{PATH}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
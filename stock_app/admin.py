@@ -1,3 +1,18 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ScreenerHit, ScreenerRun
+
+
+@admin.register(ScreenerRun)
+class ScreenerRunAdmin(admin.ModelAdmin):
+    list_display = ("screener", "run_time", "row_count", "source")
+    list_filter = ("screener", "source")
+    date_hierarchy = "run_time"
+
+
+@admin.register(ScreenerHit)
+class ScreenerHitAdmin(admin.ModelAdmin):
+    list_display = ("symbol", "screener", "rank", "close", "percent_change", "run_time")
+    list_filter = ("screener",)
+    search_fields = ("symbol",)
+    raw_id_fields = ("run",)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class StockAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'stock_app'
+
+    def ready(self):
+        # Connects the signal that evicts deleted sessions from the cache.
+        from . import sessions  # noqa: F401
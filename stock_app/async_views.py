@@ -0,0 +1,176 @@
+"""
+Async versions of the screener views in ``stock_app.views`` for ASGI
+deployments.
+
+They share the request parsing, page context and error responses of
+``stock_app.views`` and differ only in how results are fetched: the
+Chartink round trip is awaited on the event loop instead of holding a
+worker thread. Only auth, the ORM and template rendering (whose context
+processors touch ``request.user``) go through ``sync_to_async``.
+``stock_project.urls`` routes to these when ``settings.ASYNC_VIEWS`` is on.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
+
+from . import changes, live, metrics
+from .combine import acombined_result
+from .exports import export_response
+from .fanout import arun_many
+from .scans import aget_screener_result, as_of_result, delta_since
+from .screeners import SCREENER_CONDITIONS
+from .views import (
+    combined_api_query,
+    download_failed,
+    download_query,
+    fanout_response,
+    index_failed,
+    index_query,
+    index_results,
+    requested_screeners,
+    result_api_failed,
+    result_api_query,
+    results_response,
+    scan_failed,
+)
+
+
+async def afetch_entry(screener_key, condition, as_of=None):
+    if as_of:
+        # CPU bound; keep it off the event loop and the shared sync thread.
+        return await sync_to_async(as_of_result, thread_sensitive=False)(screener_key, condition, as_of)
+    return await aget_screener_result(screener_key, condition)
+
+
+async def index(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+
+    context, query = index_query(request)
+    if query is not None:
+        try:
+            if "expression" in query:
+                entry = await acombined_result(query["expression"], SCREENER_CONDITIONS, settings.FANOUT_TIMEOUT)
+            else:
+                entry = await afetch_entry(query["screener"], query["condition"], query["as_of"])
+            index_results(context, query, entry)
+        except Exception as e:
+            index_failed(context, e)
+    # Streams need ASGI, which these views run under.
+    context['live'] = True
+
+    with metrics.stage("render"):
+        return await sync_to_async(render)(request, 'stock_app/index.html', context)
+
+
+async def download_csv(request):
+    query = download_query(request)
+    if isinstance(query, HttpResponse):
+        return query
+    screener_key, condition, export_format, as_of = query
+    try:
+        entry = await afetch_entry(screener_key, condition, as_of)
+        return export_response(request, screener_key, entry, export_format, asynchronous=True)
+    except Exception as e:
+        return download_failed(screener_key, export_format, e)
+
+
+async def run_screeners(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+
+    try:
+        screeners = requested_screeners(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    started = time.perf_counter()
+    outcomes = await arun_many(screeners, timeout=settings.FANOUT_TIMEOUT)
+    return fanout_response(outcomes, time.perf_counter() - started, request.GET.get("rows") != "0")
+
+
+async def _screener_result_api(request, screener_key, symbols_only):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+
+    query = result_api_query(request, screener_key)
+    if isinstance(query, HttpResponse):
+        return query
+    condition, as_of, since = query
+    try:
+        entry = await afetch_entry(screener_key, condition, as_of)
+    except Exception as e:
+        return result_api_failed(e, as_of)
+    try:
+        delta = await sync_to_async(delta_since)(screener_key, entry, since) if since is not None else None
+    except changes.UnknownRun as e:
+        return JsonResponse({"error": str(e)}, status=409)
+    return results_response(entry, request.GET, symbols_only, delta)
+
+
+async def screener_results(request, screener_key):
+    return await _screener_result_api(request, screener_key, symbols_only=False)
+
+
+async def screener_symbols(request, screener_key):
+    return await _screener_result_api(request, screener_key, symbols_only=True)
+
+
+async def _combined_api(request, symbols_only):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+
+    query = combined_api_query(request)
+    if isinstance(query, HttpResponse):
+        return query
+    expression, export_format = query
+    try:
+        entry = await acombined_result(expression, SCREENER_CONDITIONS, settings.FANOUT_TIMEOUT)
+    except Exception as e:
+        return scan_failed(JsonResponse({"error": f"Scan failed: {e}"}), e)
+    if export_format:
+        return export_response(request, expression.slug, entry, export_format, asynchronous=True)
+    return results_response(entry, request.GET, symbols_only)
+
+
+async def combined_results(request):
+    return await _combined_api(request, symbols_only=False)
+
+
+async def combined_symbols(request):
+    return await _combined_api(request, symbols_only=True)
+
+
+async def screener_stream(request):
+    """
+    ``update`` events for the screeners named by ``?screener=`` (repeated)
+    or ``?category=``, each sent when a new run of one of them is found.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+
+    try:
+        screeners = requested_screeners(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    hub = live.get_hub()
+    if len(screeners) > hub.config["MAX_SCREENERS"]:
+        return JsonResponse({"error": f"At most {hub.config['MAX_SCREENERS']} screeners per stream"}, status=400)
+
+    response = StreamingHttpResponse(
+        hub.events({key: screener["condition"] for key, screener in screeners.items()}),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream.
+    response["X-Accel-Buffering"] = "no"
+    return response
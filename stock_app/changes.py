@@ -0,0 +1,60 @@
+"""
+What changed in a screener between two runs.
+
+A run's result is reduced to ``{symbol: rank}`` and two runs are compared
+with set operations on the symbols: those only in the new run entered,
+those only in the old run exited, and those in both whose rank differs
+moved. ``ScreenerRun.objects.record`` stores the delta from the previous
+run of the same condition with each run, as JSON::
+
+    {"entered": [symbol, ...], "exited": [symbol, ...], "moved": {symbol: [old rank, new rank]}}
+
+so the index can mark new entrants and ``?since=<run_id>`` can answer
+with only what changed.
+"""
+EMPTY = {"entered": [], "exited": [], "moved": {}}
+
+
+class UnknownRun(Exception):
+    """``since`` is not a recorded run of this screener."""
+
+
+def ranks(rows):
+    """``{symbol: rank}`` for a list of ``StockRow``."""
+    return {row.stock_name: row.rank for row in rows}
+
+
+def diff(previous, current):
+    """The delta between two ``{symbol: rank}`` maps, ordered by rank."""
+    before, after = previous.keys(), current.keys()
+    return {
+        "entered": sorted(after - before, key=current.__getitem__),
+        "exited": sorted(before - after, key=previous.__getitem__),
+        "moved": {
+            symbol: [previous[symbol], current[symbol]]
+            for symbol in sorted(before & after, key=current.__getitem__)
+            if previous[symbol] != current[symbol]
+        },
+    }
+
+
+def entered(entry):
+    """Symbols new in ``entry``'s run since the run before it."""
+    return set((entry.get("delta") or EMPTY)["entered"])
+
+
+def payload(entry, since, delta, symbols_only=False):
+    """The ``?since=`` response: ``entry``'s run relative to run ``since``."""
+    if symbols_only:
+        entered_rows = delta["entered"]
+    else:
+        new_symbols = set(delta["entered"])
+        entered_rows = [dict(row.as_dict(), new=True) for row in entry["rows"] if row.stock_name in new_symbols]
+    return {
+        "run": entry["run_id"],
+        "since": since,
+        "total": len(entry["rows"]),
+        "entered": entered_rows,
+        "exited": delta["exited"],
+        "moved": [{"symbol": symbol, "from": old, "to": new} for symbol, (old, new) in delta["moved"].items()],
+    }
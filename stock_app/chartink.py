@@ -0,0 +1,245 @@
+"""
+Chartink screener client.
+
+One ``ChartinkClient`` per process keeps a pooled keep-alive session and
+the CSRF token/cookie pair Chartink hands out with its screener page, so a
+scan is normally a single POST. The token is refetched only when Chartink
+rejects it (419 or 403).
+
+``AsyncChartinkClient`` is the httpx-based equivalent for async views. It
+keeps one connection pool per event loop, since httpx clients cannot be
+shared between loops.
+
+Both send every request through ``resilience.upstream``: a rate limit
+shared by all workers, timeouts, retries and a circuit breaker. The token
+fetch, the scan POST and decoding its JSON are timed as ``csrf_fetch``,
+``scan_post`` and ``json_decode`` stages (``stock_app.metrics``).
+
+requests and httpx are imported when a client first sends something, so a
+worker that only serves cached or recorded results never loads them.
+"""
+import asyncio
+import re
+import threading
+import weakref
+
+from django.conf import settings
+
+from . import metrics
+from .resilience import upstream
+
+CHARTINK_URL = "https://chartink.com/screener/process"
+
+# Chartink renders the token in <head>; match either attribute order.
+CSRF_META_RES = [
+    re.compile(rb'<meta[^>]+name=["\']csrf-token["\'][^>]+content=["\']([^"\']+)["\']', re.I),
+    re.compile(rb'<meta[^>]+content=["\']([^"\']+)["\'][^>]+name=["\']csrf-token["\']', re.I),
+]
+TOKEN_REJECTED = (403, 419)
+MAX_TOKEN_SCAN_BYTES = 256 * 1024
+
+
+# Request failures worth retrying (the status codes are in resilience).
+def transient_errors():
+    import requests
+
+    return (requests.ConnectionError, requests.Timeout)
+
+
+def async_transient_errors():
+    import httpx
+
+    return (httpx.TransportError,)
+
+
+def _match_token(buf):
+    for pattern in CSRF_META_RES:
+        match = pattern.search(buf)
+        if match:
+            return match.group(1).decode("ascii", "replace")
+    return None
+
+
+def _scan_finished(buf):
+    return b"</head>" in buf or len(buf) > MAX_TOKEN_SCAN_BYTES
+
+
+def find_csrf_token(chunks):
+    """
+    Scan an iterable of byte chunks for the csrf-token meta tag and stop as
+    soon as it is found, without parsing the rest of the document.
+    """
+    buf = b""
+    for chunk in chunks:
+        buf += chunk
+        token = _match_token(buf)
+        if token or _scan_finished(buf):
+            return token
+    return None
+
+
+async def afind_csrf_token(chunks):
+    """``find_csrf_token`` over an async iterable of byte chunks."""
+    buf = b""
+    async for chunk in chunks:
+        buf += chunk
+        token = _match_token(buf)
+        if token or _scan_finished(buf):
+            return token
+    return None
+
+
+def chartink_url():
+    """``settings.CHARTINK_URL``, e.g. a local stand-in (benchmarks/fake_chartink.py)."""
+    return getattr(settings, "CHARTINK_URL", None) or CHARTINK_URL
+
+
+class ChartinkClient:
+    def __init__(self, url=None, pool_size=10):
+        self.url = url or chartink_url()
+        self.pool_size = pool_size
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._token = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """The pooled keep-alive session, created on first use."""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    def csrf_token(self):
+        token = self._token
+        if token is not None:
+            return token
+        with self._lock:
+            if self._token is None:
+                self._token = self._fetch_token()
+            return self._token
+
+    def invalidate(self):
+        with self._lock:
+            self._token = None
+            if self._session is not None:
+                self._session.cookies.clear()
+
+    def _fetch_token(self):
+        def send(timeout):
+            return self.session.get(self.url, stream=True, timeout=timeout)
+
+        with metrics.stage("csrf_fetch"), upstream.call(send, transient_errors()) as r:
+            return find_csrf_token(r.iter_content(chunk_size=8192))
+
+    def scan(self, condition):
+        """POST a screener condition and return Chartink's ``data`` rows."""
+        response = self._post(condition)
+        if response.status_code in TOKEN_REJECTED:
+            self.invalidate()
+            response = self._post(condition)
+        response.raise_for_status()
+        with metrics.stage("json_decode"):
+            return response.json()["data"]
+
+    def _post(self, condition):
+        token = self.csrf_token()
+        header = {"x-csrf-token": token} if token else {}
+
+        def send(timeout):
+            return self.session.post(self.url, headers=header, data=condition, timeout=timeout)
+
+        with metrics.stage("scan_post"):
+            return upstream.call(send, transient_errors())
+
+
+def _httpx_timeout(timeout):
+    import httpx
+
+    connect, read = timeout
+    return httpx.Timeout(read, connect=connect)
+
+
+class _LoopState:
+    def __init__(self, pool_size):
+        import httpx
+
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.http = httpx.AsyncClient(limits=limits)
+        self.token = None
+        self.lock = asyncio.Lock()
+
+
+class AsyncChartinkClient:
+    def __init__(self, url=None, pool_size=20):
+        self.url = url or chartink_url()
+        self.pool_size = pool_size
+        self._states = weakref.WeakKeyDictionary()
+
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = _LoopState(self.pool_size)
+        return state
+
+    async def csrf_token(self):
+        state = self._state()
+        if state.token is not None:
+            return state.token
+        async with state.lock:
+            if state.token is None:
+                async def send(timeout):
+                    request = state.http.build_request("GET", self.url, timeout=_httpx_timeout(timeout))
+                    return await state.http.send(request, stream=True)
+
+                with metrics.stage("csrf_fetch"):
+                    r = await upstream.acall(send, async_transient_errors())
+                    try:
+                        state.token = await afind_csrf_token(r.aiter_bytes())
+                    finally:
+                        await r.aclose()
+            return state.token
+
+    def invalidate(self):
+        state = self._state()
+        state.token = None
+        state.http.cookies.clear()
+
+    async def scan(self, condition):
+        response = await self._post(condition)
+        if response.status_code in TOKEN_REJECTED:
+            self.invalidate()
+            response = await self._post(condition)
+        response.raise_for_status()
+        with metrics.stage("json_decode"):
+            return response.json()["data"]
+
+    async def _post(self, condition):
+        token = await self.csrf_token()
+        header = {"x-csrf-token": token} if token else {}
+        http = self._state().http
+
+        async def send(timeout):
+            return await http.post(self.url, headers=header, data=condition, timeout=_httpx_timeout(timeout))
+
+        with metrics.stage("scan_post"):
+            return await upstream.acall(send, async_transient_errors())
+
+    async def aclose(self):
+        state = self._states.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state.http.aclose()
+
+
+client = ChartinkClient()
+async_client = AsyncChartinkClient()
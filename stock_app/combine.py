@@ -0,0 +1,311 @@
+"""
+Boolean combinations of screeners, e.g.
+``minervini_stage_2 AND tight_flag AND NOT ipo_1_year``.
+
+Each process interns every symbol it sees to a small integer id
+(``SymbolIndex``). It keeps each screener's latest run as a NumPy bool
+array over those ids (``ScreenerSets``), rebuilt only when the run
+changes. Evaluating an expression is then a few vectorised ``&``, ``|``
+and ``& ~`` operations on arrays of a few thousand bytes. ``NOT`` is
+relative to the union of the screeners the expression names.
+
+Each matching symbol takes its row, and its place in the order, from the
+leftmost screener in the expression that holds it. The combination can
+therefore be paged, sorted and exported like any other screener result.
+
+Parsing needs only the standard library. NumPy is imported by the code
+that evaluates, so validating an expression does not load it.
+"""
+import functools
+import re
+import threading
+import time
+
+from . import metrics
+from .fanout import arun_many, run_many
+from .rows import StockRow
+from .scans import entry_version
+
+TOKEN_RE = re.compile(r"\s*(?:(\()|(\))|([&|\-~!])|([A-Za-z_][A-Za-z0-9_]*))")
+# Symbolic spellings of the operators; "-" is AND NOT.
+SYMBOLS = {"&": "AND", "|": "OR", "~": "NOT", "!": "NOT", "-": "MINUS"}
+KEYWORDS = {"AND", "OR", "NOT"}
+MAX_LENGTH = 1000
+# Nested parentheses and NOTs; the parser and evaluator recurse per level.
+MAX_DEPTH = 32
+
+
+class OperandFailed(Exception):
+    """A screener in the expression could not be fetched."""
+
+
+def tokenize(expression):
+    if len(expression) > MAX_LENGTH:
+        raise ValueError(f"Expression longer than {MAX_LENGTH} characters")
+    expression = expression.strip()
+    tokens, pos = [], 0
+    while pos < len(expression):
+        match = TOKEN_RE.match(expression, pos)
+        if match is None:
+            raise ValueError(f"Unexpected {expression[pos:pos + 10]!r} at position {pos}")
+        lparen, rparen, symbol, word = match.groups()
+        if lparen or rparen:
+            tokens.append(lparen or rparen)
+        elif symbol:
+            tokens.append(SYMBOLS[symbol])
+        elif word.upper() in KEYWORDS:
+            tokens.append(word.upper())
+        else:
+            tokens.append(("key", word))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """
+    expr   := term (OR term)*
+    term   := factor ((AND | MINUS) factor)*
+    factor := NOT factor | "(" expr ")" | screener key
+    """
+
+    def __init__(self, tokens, known):
+        self.tokens = tokens
+        self.known = known
+        self.pos = 0
+        self.keys = []
+        self.depth = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("Empty expression")
+        node = self.expr()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected {self._describe(self.peek())}")
+        return node
+
+    def expr(self):
+        node = self.term()
+        while self.peek() == "OR":
+            self.take()
+            node = ("or", node, self.term())
+        return node
+
+    def term(self):
+        node = self.factor()
+        while self.peek() in ("AND", "MINUS"):
+            if self.take() == "AND":
+                node = ("and", node, self.factor())
+            else:
+                node = ("and", node, ("not", self.factor()))
+        return node
+
+    def factor(self):
+        token = self.take()
+        if token in ("NOT", "("):
+            self.depth += 1
+            if self.depth > MAX_DEPTH:
+                raise ValueError("expression nested too deeply")
+            try:
+                return self.nested(token)
+            finally:
+                self.depth -= 1
+        if isinstance(token, tuple):
+            key = token[1]
+            if key not in self.known:
+                raise ValueError(f"Unknown screener: {key}")
+            if key not in self.keys:
+                self.keys.append(key)
+            return token
+        raise ValueError(f"Expected a screener, got {self._describe(token)}")
+
+    def nested(self, token):
+        if token == "NOT":
+            return ("not", self.factor())
+        node = self.expr()
+        if self.take() != ")":
+            raise ValueError("Missing )")
+        return node
+
+    @staticmethod
+    def _describe(token):
+        if token is None:
+            return "end of expression"
+        return token[1] if isinstance(token, tuple) else token
+
+
+class Expression:
+    def __init__(self, tree, keys):
+        self.tree = tree
+        # Screeners in order of first appearance, which is the ranking order.
+        self.keys = keys
+        self.text = canonical(tree)
+        # For file names and ETags.
+        self.slug = re.sub(r"[^A-Za-z0-9_]+", "_", self.text).strip("_")
+
+    def evaluate(self, masks):
+        """The bool mask of symbols matching the expression, given each screener's mask."""
+        import numpy as np
+
+        universe = np.logical_or.reduce([masks[key] for key in self.keys])
+        return _evaluate(self.tree, masks, universe)
+
+
+def _evaluate(node, masks, universe):
+    kind = node[0]
+    if kind == "key":
+        return masks[node[1]]
+    if kind == "not":
+        return universe & ~_evaluate(node[1], masks, universe)
+    left, right = _evaluate(node[1], masks, universe), _evaluate(node[2], masks, universe)
+    return left & right if kind == "and" else left | right
+
+
+_PRECEDENCE = {"or": 1, "and": 2, "not": 3, "key": 4}
+
+
+def canonical(node, parent=0):
+    kind = node[0]
+    if kind == "key":
+        return node[1]
+    if kind == "not":
+        text = f"NOT {canonical(node[1], _PRECEDENCE['not'])}"
+    else:
+        precedence = _PRECEDENCE[kind]
+        text = f"{canonical(node[1], precedence)} {kind.upper()} {canonical(node[2], precedence + 1)}"
+    return f"({text})" if _PRECEDENCE[kind] < parent else text
+
+
+@functools.lru_cache(maxsize=256)
+def parse(expression, known):
+    """``Expression`` for ``expression`` over the screener keys in ``known`` (a frozenset)."""
+    parser = _Parser(tokenize(expression), known)
+    tree = parser.parse()
+    return Expression(tree, parser.keys)
+
+
+class SymbolIndex:
+    """Symbol -> small integer id, append-only."""
+
+    def __init__(self):
+        self.ids = {}
+        self.symbols = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def intern(self, symbols):
+        import numpy as np
+
+        with self._lock:
+            ids = self.ids
+            out = np.empty(len(symbols), dtype=np.int32)
+            for i, symbol in enumerate(symbols):
+                symbol_id = ids.get(symbol)
+                if symbol_id is None:
+                    symbol_id = ids[symbol] = len(self.symbols)
+                    self.symbols.append(symbol)
+                out[i] = symbol_id
+            return out
+
+
+class ScreenerSet:
+    """One run of a screener as symbol ids (in rank order) and a bool mask over them."""
+
+    __slots__ = ("version", "ids", "mask", "rows")
+
+    def __init__(self, version, rows, index):
+        import numpy as np
+
+        ids = index.intern([row.stock_name for row in rows])
+        _, first = np.unique(ids, return_index=True)
+        keep = np.sort(first)
+        self.version = version
+        self.ids = ids[keep]
+        self.rows = dict(zip(self.ids.tolist(), (rows[i] for i in keep.tolist())))
+        self.mask = np.zeros(len(index), dtype=bool)
+        self.mask[self.ids] = True
+
+    def bits(self, size):
+        """The mask widened to ``size`` ids (symbols interned since are not in this run)."""
+        import numpy as np
+
+        if len(self.mask) < size:
+            self.mask = np.concatenate([self.mask, np.zeros(size - len(self.mask), dtype=bool)])
+        return self.mask[:size]
+
+
+class ScreenerSets:
+    def __init__(self, index=None):
+        self.index = index or SymbolIndex()
+        self._sets = {}
+
+    def get(self, screener_key, entry):
+        version = entry_version(entry)
+        found = self._sets.get(screener_key)
+        if found is None or found.version != version:
+            found = self._sets[screener_key] = ScreenerSet(version, entry["rows"], self.index)
+        return found
+
+    def combine(self, expression, entries):
+        """
+        The entry for ``expression`` given the current entry of each of its
+        screeners (key -> entry).
+        """
+        entries = [entries[key] for key in expression.keys]
+        sets = {key: self.get(key, entry) for key, entry in zip(expression.keys, entries)}
+        size = len(self.index)
+        with metrics.stage("combine"):
+            started = time.perf_counter()
+            remaining = expression.evaluate({key: found.bits(size) for key, found in sets.items()}).copy()
+            elapsed = time.perf_counter() - started
+            rows = []
+            for key in expression.keys:
+                found = sets[key]
+                take = found.ids[remaining[found.ids]]
+                remaining[take] = False
+                rows.extend(found.rows[symbol_id] for symbol_id in take.tolist())
+        return {
+            "rows": [
+                StockRow(rank, row.stock_name, row.percent_change, row.current_price, row.trade_volume)
+                for rank, row in enumerate(rows, 1)
+            ],
+            # The newest run among the screeners, so paging cursors expire when any changes.
+            "fetched_at": max(entry["fetched_at"] for entry in entries),
+            "run_id": None,
+            "stale": any(entry.get("stale") for entry in entries),
+            "expression": expression.text,
+            "evaluate_us": round(elapsed * 1e6, 1),
+        }
+
+
+screener_sets = ScreenerSets()
+
+
+def _entries(outcomes):
+    failed = [f"{o['key']} ({o['error']})" for o in outcomes if o["status"] != "ok"]
+    if failed:
+        raise OperandFailed(f"Could not fetch {'; '.join(failed)}")
+    return {
+        o["key"]: {"rows": o["rows"], "fetched_at": o["fetched_at"], "run_id": o["run_id"], "stale": o["stale"]}
+        for o in outcomes
+    }
+
+
+def combined_result(expression, screeners, timeout=None):
+    """The combined entry for an ``Expression``, fetching its screeners (key -> definition)."""
+    outcomes = run_many({key: screeners[key] for key in expression.keys}, timeout=timeout)
+    return screener_sets.combine(expression, _entries(outcomes))
+
+
+async def acombined_result(expression, screeners, timeout=None):
+    outcomes = await arun_many({key: screeners[key] for key in expression.keys}, timeout=timeout)
+    return screener_sets.combine(expression, _entries(outcomes))
@@ -0,0 +1,122 @@
+"""
+Local scan engine: Chartink scan clauses evaluated over a local OHLCV panel.
+
+``parse`` turns a clause into an AST (``dsl``), ``evaluate`` runs it over
+a ``Panel`` with NumPy (``evaluate``), and ``scan_rows`` produces the same
+``StockRow`` list a Chartink scan would; ``scan_batch`` does the same for
+a whole catalogue in one shared pass (``batch``), and ``backtest`` replays
+one over a range of past days (``backtest``). Bars come from the memory-mapped
+store in ``settings.OHLCV_STORE_DIR`` (``store``, filled by ``manage.py
+ingest_eod``). Daily indicators are shared between screeners and days
+through one ``IndicatorCache`` per process (``indicators``). Which screeners use the engine is set per screener in
+``settings.SCREENER_SOURCES`` (see ``stock_app.scans``).
+"""
+import functools
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from ..rows import StockRow
+from .backtest import Backtest, backtest
+from .batch import Batch
+from .dsl import ClauseSyntaxError, canonical, parse
+from .evaluate import Evaluator, UnsupportedClause, evaluate, lookback
+from .indicators import DEFAULT_MAX_BYTES, IndicatorCache
+from .panel import Panel
+from .store import OHLCVStore, StoreError
+
+__all__ = [
+    "Backtest", "Batch", "ClauseSyntaxError", "Evaluator", "IndicatorCache", "OHLCVStore", "Panel", "StoreError",
+    "UnsupportedClause", "backtest", "compile_clause", "evaluate", "get_indicator_cache", "get_panel", "get_store",
+    "lookback", "parse", "scan_batch", "scan_rows",
+]
+
+_panel_lock = threading.Lock()
+_panel = None
+_panel_version = None
+_indicator_cache = None
+
+
+@functools.lru_cache(maxsize=256)
+def compile_clause(scan_clause):
+    """Parsed clause in canonical form, cached per clause string."""
+    return canonical(parse(scan_clause))
+
+
+def get_store():
+    return OHLCVStore(getattr(settings, "OHLCV_STORE_DIR", "ohlcv"))
+
+
+def get_panel():
+    """
+    The store's panel, reopened (cheaply: it is memory-mapped) whenever a
+    day, symbol or corporate action has been added since.
+    """
+    global _panel, _panel_version
+    store = get_store()
+    if not store.exists():
+        raise UnsupportedClause(f"No local OHLCV store at {store.path} (run manage.py ingest_eod)")
+    version = store.version()
+    with _panel_lock:
+        if _panel is None or version != _panel_version:
+            _panel, _panel_version = store.panel(), version
+        return _panel
+
+
+def get_indicator_cache():
+    """The process-wide cache of indicators computed from the store."""
+    global _indicator_cache
+    with _panel_lock:
+        if _indicator_cache is None:
+            _indicator_cache = IndicatorCache(getattr(settings, "INDICATOR_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        return _indicator_cache
+
+
+def scan_rows(condition, panel=None, day=None, cache=None):
+    """
+    ``StockRow`` objects for the stocks matching ``condition["scan_clause"]``,
+    strongest percent change first, as a Chartink scan would return them.
+    The store's panel, the default, shares the process indicator cache.
+    """
+    if panel is None:
+        panel, cache = get_panel(), get_indicator_cache()
+    mask = evaluate(compile_clause(condition["scan_clause"]), panel, day, cache)
+    return matched_rows(panel, mask, day)
+
+
+def scan_batch(conditions, panel=None, day=None, cache=None):
+    """
+    ``scan_rows`` for many conditions (key -> condition) at once:
+    ``({key: [StockRow, ...]}, {key: error})``, where the errors are the
+    ``ClauseSyntaxError``/``UnsupportedClause`` a single scan would raise.
+    """
+    if panel is None:
+        panel, cache = get_panel(), get_indicator_cache()
+    batch = Batch({key: condition["scan_clause"] for key, condition in conditions.items()}, compile_clause)
+    masks, errors = batch.evaluate(panel, day, cache)
+    return {key: matched_rows(panel, mask, day) for key, mask in masks.items()}, errors
+
+
+def matched_rows(panel, mask, day=None):
+    """Ranked ``StockRow`` objects for the symbols in ``mask`` on ``day``."""
+    end = len(panel.dates) if day is None else panel.day_index(day) + 1
+    last_days = panel.window(max(end - 2, 0), end)
+    close = last_days.field("close")[:, -1]
+    prev_close = last_days.field("close")[:, -2] if end > 1 else np.full_like(close, np.nan)
+    volume = last_days.field("volume")[:, -1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        change = np.round((close / prev_close - 1) * 100, 2)
+
+    matched = np.flatnonzero(mask)
+    order = matched[np.argsort(-np.nan_to_num(change[matched], nan=-np.inf), kind="stable")]
+    return [
+        StockRow(
+            rank,
+            panel.symbols[i],
+            None if np.isnan(change[i]) else float(change[i]),
+            None if np.isnan(close[i]) else float(close[i]),
+            None if np.isnan(volume[i]) else int(volume[i]),
+        )
+        for rank, i in enumerate(order, 1)
+    ]
@@ -0,0 +1,152 @@
+"""
+Replay a scan clause over a range of past trading days.
+
+``backtest`` answers "what did this screener return on each day of the
+last three years, and how did those stocks do afterwards?". Each day is
+evaluated as of its own close: weekly and monthly bars are built only from
+the days up to it, and nothing later is read, so a day's hits are exactly
+what ``evaluate(node, panel, day)`` returns for it.
+
+Days are not scanned one by one. The range is cut into chunks of
+consecutive days and each chunk is one ``Evaluator.evaluate(node, days)``
+sweep over a single panel window, so every indicator and coarse bar is
+computed once per chunk instead of once per day. Chunks run in parallel
+on a process pool. A store-backed panel is reopened by path in each
+worker (it is memory-mapped, so nothing is copied); any other panel is
+sent as the window its chunk reads.
+
+Forward returns are close to close, ``horizon`` trading days after the
+signal day, on the panel's (adjusted) closes. The universe's return over
+the same days is the benchmark.
+"""
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .evaluate import Evaluator, history_window
+from .store import OHLCVStore, StoreError, StorePanel
+
+DEFAULT_HORIZONS = (5, 20, 60)
+# Fewest days worth a process of their own: each chunk re-reads its
+# clause's lookback, and a sweep of a few hundred days takes well under a
+# second.
+MIN_CHUNK_DAYS = 250
+
+
+class Backtest:
+    """
+    Hits of one clause on each day of a range. ``hits`` is a boolean
+    ``symbols x days`` array over ``dates``; ``returns`` maps each horizon
+    to the matching array of forward returns (NaN where the horizon runs
+    past the panel or a symbol has no close).
+    """
+
+    def __init__(self, panel, start, end, hits, horizons=DEFAULT_HORIZONS):
+        self.panel = panel
+        self.start, self.end = start, end
+        self.dates = panel.dates[start:end]
+        self.hits = hits
+        self.horizons = tuple(horizons)
+        close = panel.field("close")
+        self.returns = {h: forward_returns(close, start, end, h) for h in self.horizons}
+
+    def hit_days(self):
+        """``[(day index in dates, row indices of the hits), ...]`` for days with hits."""
+        counts = self.hits.sum(axis=0)
+        return [(j, np.flatnonzero(self.hits[:, j])) for j in np.flatnonzero(counts)]
+
+    def stats(self):
+        counts = self.hits.sum(axis=0)
+        summary = {
+            "start": str(self.dates[0]) if len(self.dates) else None,
+            "end": str(self.dates[-1]) if len(self.dates) else None,
+            "days": len(self.dates),
+            "days_with_hits": int(np.count_nonzero(counts)),
+            "hits": int(counts.sum()),
+            "symbols": int(np.count_nonzero(self.hits.any(axis=1))),
+            "mean_hits_per_day": round(float(counts.mean()), 2) if len(counts) else None,
+            "horizons": {},
+        }
+        for horizon, returns in self.returns.items():
+            summary["horizons"][horizon] = return_stats(self.hits, returns)
+        return summary
+
+
+def forward_returns(close, start, end, horizon):
+    """``close[t + horizon] / close[t] - 1`` for the days ``start:end``."""
+    out = np.full((close.shape[0], end - start), np.nan)
+    stop = min(end, close.shape[1] - horizon)
+    if stop > start:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[:, :stop - start] = close[:, start + horizon:stop + horizon] / close[:, start:stop] - 1
+    return out
+
+
+def return_stats(hits, returns):
+    """Forward-return statistics of the hits, against the universe on the same days."""
+    valid = hits & ~np.isnan(returns)
+    signals = returns[valid]
+    if not len(signals):
+        return {"signals": 0, "mean": None, "median": None, "win_rate": None, "universe": None, "excess": None}
+    # The universe's mean on each signal day, weighted by that day's hits.
+    per_day = valid.sum(axis=0)
+    on = per_day > 0
+    universe_daily = np.nansum(returns[:, on], axis=0) / np.count_nonzero(~np.isnan(returns[:, on]), axis=0)
+    universe = float(np.sum(universe_daily * per_day[on]) / per_day.sum())
+    mean = float(signals.mean())
+    return {
+        "signals": len(signals),
+        "mean": mean,
+        "median": float(np.median(signals)),
+        "win_rate": float(np.mean(signals > 0)),
+        "universe": universe,
+        "excess": mean - universe,
+    }
+
+
+def chunks(start, end, chunk_days):
+    """``[(first, stop), ...]`` covering the days ``start:end``."""
+    return [(first, min(first + chunk_days, end)) for first in range(start, end, chunk_days)]
+
+
+def sweep(panel, node, days):
+    """Where ``node`` held on each of the last ``days`` days of ``panel``."""
+    return Evaluator(panel).evaluate(node, days)
+
+
+def _sweep_store(path, last_day, node, start, end, days):
+    panel = OHLCVStore(path).panel()
+    if len(panel.dates) < end or panel.dates[end - 1] != last_day:
+        raise StoreError(f"The store at {path} changed during the backtest")
+    return sweep(panel.window(start, end), node, days)
+
+
+def backtest(node, panel, start=None, end=None, horizons=DEFAULT_HORIZONS, workers=1, chunk_days=None):
+    """
+    A ``Backtest`` of ``node`` on every trading day from ``start`` to
+    ``end`` (dates, inclusive; default the panel's first and last day).
+    The days are split into ``chunk_days`` chunks (default: one per
+    worker, of at least ``MIN_CHUNK_DAYS``) evaluated on up to ``workers``
+    processes.
+    """
+    first = 0 if start is None else int(np.searchsorted(panel.dates, np.datetime64(start, "D")))
+    stop = len(panel.dates) if end is None else panel.day_index(end) + 1
+    if first >= stop:
+        raise ValueError(f"No trading days between {start} and {end}")
+    workers = max(1, workers or 1)
+    chunk_days = chunk_days or max(math.ceil((stop - first) / workers), MIN_CHUNK_DAYS)
+    parts = chunks(first, stop, chunk_days)
+    windows = [(history_window(node, last, last - day0)[0], last, last - day0) for day0, last in parts]
+
+    if workers == 1 or len(parts) == 1:
+        found = [sweep(panel.window(lo, hi), node, days) for lo, hi, days in windows]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(parts))) as pool:
+            if isinstance(panel, StorePanel) and panel.path and panel.offset == 0:
+                jobs = [pool.submit(_sweep_store, panel.path, panel.dates[hi - 1], node, lo, hi, days)
+                        for lo, hi, days in windows]
+            else:
+                jobs = [pool.submit(sweep, panel.window(lo, hi), node, days) for lo, hi, days in windows]
+            found = [job.result() for job in jobs]
+    return Backtest(panel, first, stop, np.concatenate(found, axis=1), horizons)
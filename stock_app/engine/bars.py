@@ -0,0 +1,162 @@
+"""
+Weekly, monthly, quarterly and yearly bars kept alongside the daily store.
+
+Each timeframe has a directory ``bars/<timeframe>/`` in the store::
+
+    layer.json     {"days": <daily bars covered>, "periods": <bars>, "capacity": <symbol slots>}
+    starts.bin     int32 index of each period's first trading day
+    <field>.bin    one row of ``capacity`` values per period
+
+Periods are built from the stored trading days, so their boundaries follow
+the NSE calendar: a week whose Monday is a holiday opens on Tuesday, and a
+month ending on a holiday closes on its last trading day. Bars are the raw
+traded values; ``StorePanel`` applies corporate actions on read.
+
+``update_layers`` runs after each appended day and touches a single row
+per timeframe: the open period's bar is merged with the new day, or a new
+period is started. A layer that does not cover exactly the days before
+the new one (an older store, an interrupted append, a capacity change) is
+rebuilt from the daily files instead. Readers only use a layer whose
+``days`` match the store's, and otherwise aggregate the daily bars
+themselves.
+"""
+import json
+import os
+
+import numpy as np
+
+from .panel import AGGREGATES, Periods, aggregate_bars, period_keys
+
+TIMEFRAMES = ("week", "month", "quarter", "year")
+
+
+class BarLayer:
+    """One timeframe's stored bars: ``fields`` are ``periods x symbols`` arrays."""
+
+    def __init__(self, starts, fields, days):
+        self.starts = starts
+        self.fields = fields
+        self.days = days
+
+    def period_of(self, day):
+        """Period holding store day index ``day``."""
+        return int(np.searchsorted(self.starts, day, side="right")) - 1
+
+    def last_day(self, period):
+        """Store day index of the last stored day of ``period``."""
+        return int(self.starts[period + 1]) - 1 if period + 1 < len(self.starts) else self.days - 1
+
+
+def layer_dir(path, timeframe):
+    return os.path.join(path, "bars", timeframe)
+
+
+def _read_state(path, timeframe):
+    try:
+        with open(os.path.join(layer_dir(path, timeframe), "layer.json")) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+def write_json(path, data):
+    """Replace ``path`` atomically with ``data`` as JSON."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(data, fh)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+def _write_state(path, timeframe, state):
+    write_json(os.path.join(layer_dir(path, timeframe), "layer.json"), state)
+
+
+def read_layers(path, meta, days, symbols):
+    """``{timeframe: BarLayer}`` for the layers that cover all ``days`` stored days."""
+    layers = {}
+    for timeframe in TIMEFRAMES:
+        state = _read_state(path, timeframe)
+        if not state or state["days"] != days or state["capacity"] != meta["capacity"] or not days:
+            continue
+        directory = layer_dir(path, timeframe)
+        starts = np.fromfile(os.path.join(directory, "starts.bin"), dtype="<i4", count=state["periods"])
+        fields = {
+            name: np.memmap(os.path.join(directory, f"{name}.bin"), dtype=meta["dtype"], mode="r",
+                            shape=(state["periods"], meta["capacity"]))[:, :symbols]
+            for name in meta["fields"]
+        }
+        layers[timeframe] = BarLayer(starts, fields, days)
+    return layers
+
+
+def version_files(path):
+    return [os.path.join(layer_dir(path, timeframe), "layer.json") for timeframe in TIMEFRAMES]
+
+
+def update_layers(path, meta, dates, rows):
+    """
+    Bring every layer up to date after the day ``dates[-1]`` was stored
+    with field values ``rows``.
+    """
+    for timeframe in TIMEFRAMES:
+        state = _read_state(path, timeframe)
+        if not state or state["days"] != len(dates) - 1 or state["capacity"] != meta["capacity"]:
+            rebuild_layer(path, meta, dates, timeframe)
+            continue
+        directory = layer_dir(path, timeframe)
+        dtype = np.dtype(meta["dtype"])
+        rowbytes = meta["capacity"] * dtype.itemsize
+        keys = period_keys(dates[-2:], timeframe) if len(dates) > 1 else None
+        periods = state["periods"]
+        same_period = keys is not None and keys[0] == keys[1]
+        for name, row in rows.items():
+            with open(os.path.join(directory, f"{name}.bin"), "r+b") as fh:
+                if same_period:
+                    fh.seek((periods - 1) * rowbytes)
+                    bar = np.frombuffer(fh.read(rowbytes), dtype=dtype)
+                    row = merge(AGGREGATES.get(name, "last"), bar, row)
+                    fh.seek((periods - 1) * rowbytes)
+                else:
+                    fh.seek(periods * rowbytes)
+                fh.write(np.asarray(row, dtype=dtype).tobytes())
+                fh.truncate()
+        if not same_period:
+            with open(os.path.join(directory, "starts.bin"), "r+b") as fh:
+                fh.seek(periods * 4)
+                fh.write(np.array([len(dates) - 1], dtype="<i4").tobytes())
+                fh.truncate()
+            periods += 1
+        _write_state(path, timeframe, dict(state, days=len(dates), periods=periods))
+
+
+def merge(how, bar, row):
+    """The open period's ``bar`` extended by one day's ``row``."""
+    if how == "first":
+        return bar
+    if how == "last":
+        return row
+    if how == "max":
+        return np.fmax(bar, row)
+    if how == "min":
+        return np.fmin(bar, row)
+    if how == "sum":
+        return np.where(np.isnan(bar), row, np.where(np.isnan(row), bar, bar + row))
+    raise ValueError(f"Unknown aggregate: {how}")
+
+
+def rebuild_layer(path, meta, dates, timeframe):
+    """Recompute one timeframe's bars from the daily files."""
+    directory = layer_dir(path, timeframe)
+    os.makedirs(directory, exist_ok=True)
+    periods = Periods(period_keys(dates, timeframe))
+    shape = (len(dates), meta["capacity"])
+    for name in meta["fields"]:
+        daily = np.memmap(os.path.join(path, f"{name}.bin"), dtype=meta["dtype"], mode="r", shape=shape)
+        bars = aggregate_bars(daily.T, periods, AGGREGATES.get(name, "last"))
+        tmp = os.path.join(directory, f"{name}.bin.tmp")
+        np.ascontiguousarray(bars.T, dtype=meta["dtype"]).tofile(tmp)
+        os.replace(tmp, os.path.join(directory, f"{name}.bin"))
+    periods.starts.astype("<i4").tofile(os.path.join(directory, "starts.bin"))
+    _write_state(path, timeframe, {"days": len(dates), "periods": len(periods), "capacity": meta["capacity"]})
@@ -0,0 +1,108 @@
+"""
+Run a whole catalogue of scan clauses as one shared scan.
+
+Most screeners open with the same prefilters (``market cap > 500``,
+``latest volume > 10000``, ``latest close > 20``) and share indicator
+terms. ``Batch`` parses every clause into one DAG of unique nodes: clauses
+are put in ``dsl.canonical`` form, and equal nodes hash equal, so each
+distinct predicate, indicator and field aggregate is a single DAG node
+however many clauses use it.
+
+``Batch.evaluate`` then runs the clauses through one ``Evaluator`` per
+group of similar lookbacks, each over a panel window that covers its
+longest member. Weekly and monthly bars span the whole window, so
+a 60-day clause evaluated over ten years of history would cost more than
+it shares; within a group no window is more than ``WINDOW_SLACK`` times a
+member's own. The groups share daily indicators through an
+``IndicatorCache``, so every DAG node is still computed about once and
+refreshing the catalogue costs little more than its most complex clause.
+"""
+from .dsl import ClauseSyntaxError, Indicator, canonical, fields, parse, walk
+from .evaluate import Evaluator, UnsupportedClause, history_window
+from .indicators import IndicatorCache
+
+# Longest window (relative to its own) a clause is evaluated over to share work.
+WINDOW_SLACK = 2
+
+
+class Batch:
+    """
+    ``clauses`` maps a key (a screener key) to a scan clause, parsed with
+    ``compile``. Clauses that do not parse are kept in ``errors``; the rest
+    become ``roots``.
+    """
+
+    def __init__(self, clauses, compile=parse):
+        self.roots = {}
+        self.errors = {}
+        for key, clause in clauses.items():
+            try:
+                self.roots[key] = canonical(compile(clause))
+            except ClauseSyntaxError as e:
+                self.errors[key] = e
+
+    def nodes(self):
+        """The distinct nodes of the DAG."""
+        return {node for root in self.roots.values() for node in walk(root)}
+
+    def stats(self):
+        """Node counts with and without sharing."""
+        total = sum(sum(1 for _ in walk(root)) for root in self.roots.values())
+        return {"clauses": len(self.roots), "nodes": total, "unique_nodes": len(self.nodes())}
+
+    def evaluate(self, panel, day=None, cache=None):
+        """
+        ``({key: boolean mask over panel.symbols}, {key: error})`` for ``day``
+        (default: the panel's last day). Clauses needing fields the panel
+        lacks get an ``UnsupportedClause`` error. Without a ``cache`` the
+        groups share a temporary one.
+        """
+        errors = dict(self.errors)
+        roots = {}
+        for key, root in self.roots.items():
+            missing = sorted(name for name in fields(root) if not panel.has(name))
+            if missing:
+                errors[key] = UnsupportedClause(f"No local data for {', '.join(map(repr, missing))}")
+            else:
+                roots[key] = root
+        if not roots:
+            return {}, errors
+
+        end = len(panel.dates) if day is None else panel.day_index(day) + 1
+        cache = cache if cache is not None else IndicatorCache()
+        groups = [(panel.window(start, end), keys) for start, keys in self.groups(roots, end)]
+
+        # Plan every group first, so a daily indicator shared by several is
+        # computed once, by the longest, for as many days as any reads.
+        needs = []
+        for window, keys in groups:
+            planner = Evaluator(window)
+            for key in keys:
+                planner.plan(roots[key], "day", 1)
+            needs.append({node: need for (node, tf), need in planner.needs.items()
+                          if tf == "day" and isinstance(node, Indicator)})
+        most = {}
+        for group_needs in needs:
+            for node, need in group_needs.items():
+                most[node] = max(most.get(node, 0), need)
+
+        masks = {}
+        for (window, keys), group_needs in zip(groups, needs):
+            evaluator = Evaluator(window, cache)
+            for node in group_needs:
+                evaluator.plan(node, "day", most[node])
+            found = evaluator.evaluate_many([roots[key] for key in keys])
+            masks.update((key, mask[:, -1]) for key, mask in zip(keys, found))
+        return {key: masks[key] for key in roots}, errors
+
+    @staticmethod
+    def groups(roots, end):
+        """``[(window start, [key, ...]), ...]``, longest lookback first."""
+        starts = {key: history_window(root, end)[0] for key, root in roots.items()}
+        groups = []
+        for key in sorted(starts, key=starts.get):
+            if groups and end - groups[-1][0] <= WINDOW_SLACK * max(end - starts[key], 1):
+                groups[-1][1].append(key)
+            else:
+                groups.append((starts[key], [key]))
+        return groups
@@ -0,0 +1,435 @@
+"""
+Parser for Chartink scan clauses.
+
+Turns a ``scan_clause`` string into a tree of the small, immutable node
+types below. Nodes are frozen dataclasses, so equal sub-expressions compare
+and hash equal; the evaluator and planner rely on that to share work.
+
+Grammar, loosest binding first::
+
+    expr       := and_expr ("or" and_expr)*
+    and_expr   := condition ("and" condition)*
+    condition  := "not" "(" expr ")" | arith [CMP arith]
+    arith      := term (("+" | "-") term)*
+    term       := unary (("*" | "/") unary)*
+    unary      := "-" unary | primary
+    primary    := NUMBER | "(" [SEGMENT] expr ")" | "abs" "(" arith ")"
+                | [offset] operand
+    offset     := "latest" | "daily" | "weekly" | "monthly" | "quarterly"
+                | "yearly" | NUMBER UNIT "ago"
+    operand    := FIELD | "market cap" | FUNDAMENTAL | QUOTED
+                | ("ema" | "sma" | "wma") "(" arith "," NUMBER ")"
+                | ("max" | "min") "(" NUMBER "," arith ")"
+                | "rsi" "(" [arith ","] NUMBER ")"
+                | "count" "(" NUMBER "," NUMBER "where" expr ")"
+
+Segment markers such as ``{cash}`` and the ``{custom_indicator_*}`` wrappers
+around saved custom indicators are accepted and dropped; a quoted custom
+expression is parsed like any other, with ``N candle(s) ago`` meaning N
+periods of whichever timeframe it is used in.
+"""
+import re
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+TIMEFRAMES = ("day", "week", "month", "quarter", "year")
+
+# Words that select a timeframe without an offset.
+TIMEFRAME_WORDS = {
+    "latest": "day",
+    "daily": "day",
+    "weekly": "week",
+    "monthly": "month",
+    "quarterly": "quarter",
+    "yearly": "year",
+}
+# "N <unit> ago"; None means "the enclosing timeframe".
+OFFSET_UNITS = {
+    "day": "day", "days": "day",
+    "week": "week", "weeks": "week",
+    "month": "month", "months": "month",
+    "quarter": "quarter", "quarters": "quarter",
+    "year": "year", "years": "year",
+    "candle": None, "candles": None,
+}
+PRICE_FIELDS = ("open", "high", "low", "close", "volume")
+SERIES_FUNCTIONS = ("ema", "sma", "wma")
+WINDOW_FUNCTIONS = ("max", "min")
+COMPARATORS = (">=", "<=", "!=", "=", ">", "<")
+
+# Multi-word field names; several contain "and"/"or"/numbers, so they are
+# matched before anything else.
+FUNDAMENTAL_FIELDS = (
+    "market cap",
+    "indian promoter and group shareholders",
+    "insurance companies percentage",
+    "individuals share capital up to rs 1 lakh percentage",
+    "individuals share capital in excess of rs 1 lakh percentage",
+    "foreign institutional investors percentage",
+    "mutual funds or uti percentage",
+)
+
+
+class ClauseSyntaxError(ValueError):
+    def __init__(self, message, clause="", position=None):
+        if position is not None:
+            message = f"{message} at position {position}: {clause[position:position + 30]!r}"
+        super().__init__(message)
+        self.position = position
+
+
+# =========================
+# AST
+# =========================
+
+@dataclass(frozen=True)
+class Num:
+    value: float
+
+
+@dataclass(frozen=True)
+class Field:
+    # "open", "high", "low", "close", "volume", "market_cap" or a
+    # fundamental's name; read in the timeframe of the enclosing context.
+    name: str
+
+
+@dataclass(frozen=True)
+class Offset:
+    # Evaluate ``expr`` in ``timeframe`` (None: the enclosing one), then
+    # look ``periods`` bars back.
+    timeframe: Optional[str]
+    periods: int
+    expr: object
+
+
+@dataclass(frozen=True)
+class Indicator:
+    # ema/sma/wma/max/min/rsi over ``window`` bars of ``expr``; for
+    # "count", ``expr`` is a condition and the result counts true bars.
+    name: str
+    window: int
+    expr: object
+
+
+@dataclass(frozen=True)
+class Unary:
+    op: str  # "neg" or "abs"
+    expr: object
+
+
+@dataclass(frozen=True)
+class BinOp:
+    op: str
+    left: object
+    right: object
+
+
+@dataclass(frozen=True)
+class Compare:
+    op: str
+    left: object
+    right: object
+
+
+@dataclass(frozen=True)
+class BoolOp:
+    op: str  # "and" or "or"
+    items: Tuple[object, ...]
+
+
+@dataclass(frozen=True)
+class Not:
+    expr: object
+
+
+BOOLEAN_NODES = (Compare, BoolOp, Not)
+
+
+def is_condition(node):
+    return isinstance(node, BOOLEAN_NODES)
+
+
+# =========================
+# Tokenizer
+# =========================
+
+_FUNDAMENTAL_RE = re.compile(
+    r"(?:%s)\b" % "|".join(
+        re.escape(name).replace(r"\ ", r"\s+")
+        for name in sorted(FUNDAMENTAL_FIELDS, key=len, reverse=True)
+    ),
+    re.IGNORECASE,
+)
+_TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<custom>\{custom_indicator_\w+?_(?:start|end)\})
+  | (?P<segment>\{[^}]*\})
+  | (?P<quoted>"[^"]*")
+  | (?P<number>\d+(?:\.\d+)?|\.\d+)
+  | (?P<op>>=|<=|!=|[=<>+\-*/(),])
+  | (?P<word>[A-Za-z_]\w*)
+""", re.VERBOSE)
+
+
+def tokenize(clause):
+    """``[(kind, value, position), ...]`` for ``clause``."""
+    tokens = []
+    pos = 0
+    while pos < len(clause):
+        match = _FUNDAMENTAL_RE.match(clause, pos)
+        if match:
+            name = " ".join(match.group().lower().split())
+            tokens.append(("field", name.replace(" ", "_") if name == "market cap" else name, pos))
+            pos = match.end()
+            continue
+        match = _TOKEN_RE.match(clause, pos)
+        if not match:
+            raise ClauseSyntaxError("Unexpected character", clause, pos)
+        kind = match.lastgroup
+        value = match.group()
+        if kind == "word":
+            value = value.lower()
+            if value in PRICE_FIELDS:
+                kind = "field"
+        elif kind == "quoted":
+            value = value[1:-1]
+        elif kind == "number":
+            value = float(value)
+        if kind not in ("space", "custom"):
+            tokens.append((kind, value, pos))
+        pos = match.end()
+    tokens.append(("end", None, len(clause)))
+    return tokens
+
+
+# =========================
+# Parser
+# =========================
+
+class _Parser:
+    def __init__(self, clause):
+        self.clause = clause
+        self.tokens = tokenize(clause)
+        self.i = 0
+
+    # -- token helpers --
+
+    def peek(self, ahead=0):
+        return self.tokens[min(self.i + ahead, len(self.tokens) - 1)]
+
+    def at(self, kind, value=None, ahead=0):
+        tok_kind, tok_value, _ = self.peek(ahead)
+        return tok_kind == kind and (value is None or tok_value == value)
+
+    def next(self):
+        tok = self.tokens[self.i]
+        self.i += 1
+        return tok
+
+    def expect(self, kind, value=None):
+        if not self.at(kind, value):
+            self.error(f"Expected {value or kind}")
+        return self.next()[1]
+
+    def error(self, message):
+        raise ClauseSyntaxError(message, self.clause, self.peek()[2])
+
+    def integer(self):
+        value = self.expect("number")
+        if value != int(value):
+            self.error("Expected a whole number")
+        return int(value)
+
+    # -- grammar --
+
+    def parse(self):
+        node = self.expr()
+        if not self.at("end"):
+            self.error("Unexpected input")
+        return node
+
+    def expr(self):
+        items = [self.and_expr()]
+        while self.at("word", "or"):
+            self.next()
+            items.append(self.and_expr())
+        return self.boolean("or", items)
+
+    def and_expr(self):
+        items = [self.condition()]
+        while self.at("word", "and"):
+            self.next()
+            items.append(self.condition())
+        return self.boolean("and", items)
+
+    def boolean(self, op, items):
+        if len(items) == 1:
+            return items[0]
+        for item in items:
+            self.require(item, condition=True)
+        return BoolOp(op, tuple(items))
+
+    def condition(self):
+        if self.at("word", "not"):
+            self.next()
+            self.expect("op", "(")
+            node = self.require(self.expr(), condition=True)
+            self.expect("op", ")")
+            return Not(node)
+        left = self.arith()
+        if self.at("op") and self.peek()[1] in COMPARATORS:
+            op = self.next()[1]
+            right = self.require(self.arith(), condition=False)
+            return Compare(op, self.require(left, condition=False), right)
+        return left
+
+    def arith(self):
+        node = self.term()
+        while self.at("op", "+") or self.at("op", "-"):
+            op = self.next()[1]
+            node = BinOp(op, self.require(node, False), self.require(self.term(), False))
+        return node
+
+    def term(self):
+        node = self.unary()
+        while self.at("op", "*") or self.at("op", "/"):
+            op = self.next()[1]
+            node = BinOp(op, self.require(node, False), self.require(self.unary(), False))
+        return node
+
+    def unary(self):
+        if self.at("op", "-"):
+            self.next()
+            return Unary("neg", self.require(self.unary(), False))
+        return self.primary()
+
+    def primary(self):
+        if self.at("op", "("):
+            self.next()
+            if self.at("segment"):
+                self.next()
+            node = self.expr()
+            self.expect("op", ")")
+            return node
+        if self.at("word", "abs"):
+            self.next()
+            self.expect("op", "(")
+            node = self.require(self.arith(), False)
+            self.expect("op", ")")
+            return Unary("abs", node)
+        if self.at("number"):
+            if self.at("word", ahead=1) and self.peek(1)[1] in OFFSET_UNITS and self.at("word", "ago", ahead=2):
+                periods = self.integer()
+                timeframe = OFFSET_UNITS[self.next()[1]]
+                self.next()
+                return Offset(timeframe, periods, self.operand())
+            return Num(self.next()[1])
+        if self.at("word") and self.peek()[1] in TIMEFRAME_WORDS:
+            timeframe = TIMEFRAME_WORDS[self.next()[1]]
+            return Offset(timeframe, 0, self.operand())
+        return self.operand()
+
+    def operand(self):
+        kind, value, _ = self.peek()
+        if kind == "field":
+            self.next()
+            return Field(value)
+        if kind == "quoted":
+            self.next()
+            return self.require(parse(value), False)
+        if kind == "word" and value in SERIES_FUNCTIONS + WINDOW_FUNCTIONS + ("rsi", "count"):
+            self.next()
+            self.expect("op", "(")
+            node = getattr(self, f"_{value}_args", self._series_args)(value)
+            self.expect("op", ")")
+            return node
+        if kind == "op" and value == "(":
+            return self.primary()
+        self.error("Expected a field, indicator or number")
+
+    def _series_args(self, name):
+        if name in WINDOW_FUNCTIONS:
+            window = self.integer()
+            self.expect("op", ",")
+            return Indicator(name, window, self.require(self.arith(), False))
+        series = self.require(self.arith(), False)
+        self.expect("op", ",")
+        return Indicator(name, self.integer(), series)
+
+    def _rsi_args(self, name):
+        if self.at("number") and self.at("op", ")", ahead=1):
+            return Indicator("rsi", self.integer(), Field("close"))
+        return self._series_args(name)
+
+    def _count_args(self, name):
+        window = self.integer()
+        self.expect("op", ",")
+        self.expect("number")
+        self.expect("word", "where")
+        return Indicator("count", window, self.require(self.expr(), True))
+
+    def require(self, node, condition):
+        if is_condition(node) != condition:
+            self.error("Expected a condition" if condition else "Expected a value, not a condition")
+        return node
+
+
+def parse(clause):
+    """The AST for a scan clause; raises ``ClauseSyntaxError``."""
+    return _Parser(clause).parse()
+
+
+def walk(node):
+    """Every node of the tree, parents before children."""
+    yield node
+    if isinstance(node, (Offset, Indicator, Unary, Not)):
+        yield from walk(node.expr)
+    elif isinstance(node, (BinOp, Compare)):
+        yield from walk(node.left)
+        yield from walk(node.right)
+    elif isinstance(node, BoolOp):
+        for item in node.items:
+            yield from walk(item)
+
+
+def fields(node):
+    """Names of every field the clause reads."""
+    return {n.name for n in walk(node) if isinstance(n, Field)}
+
+
+_MIRRORED = {">": "<", ">=": "<=", "<": ">", "<=": ">=", "=": "=", "!=": "!="}
+
+
+def canonical(node, timeframe="day"):
+    """
+    An equivalent tree in the form shared sub-expressions are matched in:
+    nested ``and``/``or`` flattened and repeated conditions dropped,
+    ``20 < latest close`` turned into ``latest close > 20``, and offsets of
+    zero periods in the timeframe already in force (``latest close`` in a
+    daily clause, ``weekly close`` inside a weekly one) removed.
+    """
+    if isinstance(node, Offset):
+        tf = node.timeframe or timeframe
+        expr = canonical(node.expr, tf)
+        return expr if node.periods == 0 and tf == timeframe else Offset(node.timeframe, node.periods, expr)
+    if isinstance(node, BoolOp):
+        items = []
+        for item in (canonical(item, timeframe) for item in node.items):
+            parts = item.items if isinstance(item, BoolOp) and item.op == node.op else (item,)
+            items.extend(part for part in parts if part not in items)
+        return items[0] if len(items) == 1 else BoolOp(node.op, tuple(items))
+    if isinstance(node, Compare):
+        left, right = canonical(node.left, timeframe), canonical(node.right, timeframe)
+        if isinstance(left, Num) and not isinstance(right, Num):
+            return Compare(_MIRRORED[node.op], right, left)
+        return Compare(node.op, left, right)
+    if isinstance(node, BinOp):
+        return BinOp(node.op, canonical(node.left, timeframe), canonical(node.right, timeframe))
+    if isinstance(node, Indicator):
+        return Indicator(node.name, node.window, canonical(node.expr, timeframe))
+    if isinstance(node, Unary):
+        return Unary(node.op, canonical(node.expr, timeframe))
+    if isinstance(node, Not):
+        return Not(canonical(node.expr, timeframe))
+    return node
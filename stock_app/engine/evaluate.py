@@ -0,0 +1,485 @@
+"""
+Vectorised evaluation of parsed scan clauses over a ``Panel``.
+
+Every node evaluates to a time series for every symbol at once, so a
+clause costs a handful of array operations rather than a loop over stocks.
+
+Evaluation is demand driven: before computing anything the evaluator
+works out, for each ``(node, timeframe)``, how many trailing days of it its
+parents read (``plan``). ``1 day ago max( 252 , latest high )`` asked for
+the last day needs one day of the max and 253 days of ``high``; asked for
+the last 750 days (a backtest), it needs 750 and 1002. Daily values are
+arrays of exactly that many trailing days, padded with NaN where the panel
+has less history.
+
+A value in a coarser timeframe (weekly, monthly, ...) is a ``Series`` with
+two arrays:
+
+* ``bars`` -- one column per period of the panel, built from all of that
+  period's days (the last period may still be open);
+* ``live`` -- one column per needed day: the value as of that day, with the
+  current period's bar built from its days so far.
+
+``weekly high`` on a Wednesday is therefore the high since Monday, and
+``1 week ago high`` is last week's completed bar. Indicators over a coarse
+series extend the completed bars with the live bar, exactly as a chart
+drawn on that day would.
+
+Comparisons involving a missing bar are false, so ``not( 800 days ago
+close > 0 )`` is true for stocks listed less than 800 days ago.
+
+Given an ``IndicatorCache`` (``indicators``), daily indicators are read
+from it, or extended from an earlier day's entry, instead of computed.
+"""
+import numpy as np
+
+from . import rolling
+from .dsl import BinOp, BoolOp, Compare, Field, Indicator, Not, Num, Offset, Unary, walk
+from .panel import AGGREGATES
+
+# Upper bound on trading days per period, for sizing the history a clause needs.
+DAYS_PER = {"day": 1, "week": 5, "month": 23, "quarter": 66, "year": 252}
+# History (in windows) before a smoothed indicator's seed no longer
+# matters. Wilder's RSI smoothing (1/n, not 2/(n+1)) decays half as fast.
+WARMUP_WINDOWS = {"ema": 6, "rsi": 12}
+
+_ROLLING = {
+    "sma": rolling.rolling_mean,
+    "wma": rolling.rolling_wma,
+    "max": rolling.rolling_max,
+    "min": rolling.rolling_min,
+    "ema": rolling.ema,
+    "rsi": rolling.rsi,
+    "count": lambda values, window: rolling.rolling_sum(values, window, min_periods=1),
+}
+_ARITH = {"+": np.add, "-": np.subtract, "*": np.multiply, "/": np.divide}
+_COMPARE = {
+    ">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal,
+    "=": np.equal, "!=": np.not_equal,
+}
+
+
+class UnsupportedClause(Exception):
+    """The clause needs data the panel does not have (e.g. shareholding)."""
+
+
+class Series:
+    __slots__ = ("timeframe", "bars", "live")
+
+    def __init__(self, timeframe, live, bars=None):
+        self.timeframe = timeframe
+        self.live = live
+        # Daily series have no separate bars.
+        self.bars = bars
+
+    def map(self, fn):
+        return Series(self.timeframe, fn(self.live), None if self.bars is None else fn(self.bars))
+
+
+def history(node):
+    """Bars of ``node``'s own input before the current one it reads, in days."""
+    if isinstance(node, Indicator):
+        warmup = WARMUP_WINDOWS.get(node.name, 1)
+        return node.window * warmup - 1 + (node.name == "rsi")
+    return 0
+
+
+def extension_history(node, new_days):
+    """Input bars needed to extend a cached daily ``node`` by ``new_days`` days."""
+    if not new_days:
+        return 0
+    return new_days + (0 if node.name in WARMUP_WINDOWS else history(node))
+
+
+def lookback(node, timeframe="day"):
+    """Trading days of history ``node`` needs to be evaluated on its last day."""
+    if isinstance(node, (Num, Field)):
+        return DAYS_PER[timeframe]
+    if isinstance(node, Offset):
+        tf = node.timeframe or timeframe
+        return node.periods * DAYS_PER[tf] + lookback(node.expr, tf)
+    if isinstance(node, Indicator):
+        return (history(node) + 1) * DAYS_PER[timeframe] + lookback(node.expr, timeframe)
+    if isinstance(node, (Unary, Not)):
+        return lookback(node.expr, timeframe)
+    if isinstance(node, (BinOp, Compare)):
+        return max(lookback(node.left, timeframe), lookback(node.right, timeframe))
+    if isinstance(node, BoolOp):
+        return max(lookback(item, timeframe) for item in node.items)
+    raise TypeError(f"Not a clause node: {node!r}")
+
+
+def result_timeframe(node, timeframe):
+    """Timeframe of ``node``'s value in context ``timeframe`` (None: a constant)."""
+    if isinstance(node, Num):
+        return None
+    if isinstance(node, (Field, Indicator)):
+        return timeframe
+    if isinstance(node, Offset):
+        return node.timeframe or timeframe
+    if isinstance(node, (Unary, Not)):
+        return result_timeframe(node.expr, timeframe)
+    children = (node.left, node.right) if isinstance(node, (BinOp, Compare)) else node.items
+    found = {result_timeframe(child, timeframe) for child in children} - {None}
+    if not found:
+        return None
+    return found.pop() if len(found) == 1 else "day"
+
+
+def children(node, timeframe):
+    """``[(child, child timeframe), ...]`` as ``compute`` evaluates them."""
+    if isinstance(node, Offset):
+        return [(node.expr, node.timeframe or timeframe)]
+    if isinstance(node, (Indicator, Unary, Not)):
+        return [(node.expr, timeframe)]
+    if isinstance(node, (BinOp, Compare)):
+        return [(node.left, timeframe), (node.right, timeframe)]
+    if isinstance(node, BoolOp):
+        return [(item, timeframe) for item in node.items]
+    return []
+
+
+class Evaluator:
+    """
+    Evaluates nodes against one panel. Results are memoised per
+    ``(node, timeframe)``, so sub-expressions shared within or across the
+    clauses given to one evaluator are computed once. Daily indicators are
+    also shared through ``cache`` across evaluators, when given.
+    """
+
+    def __init__(self, panel, cache=None):
+        self.panel = panel
+        self.days = len(panel.dates)
+        self.memo = {}
+        self.needs = {}
+        self.cache = cache if self.days else None
+        # Cache entries found while planning, held so eviction cannot pull
+        # them out from under a plan that relies on them.
+        self.cached = {}
+
+    def evaluate(self, node, days=1):
+        """Boolean ``symbols x days`` array: where ``node`` held on each of the last ``days`` days."""
+        return self.evaluate_many([node], days)[0]
+
+    def evaluate_many(self, nodes, days=1):
+        for node in nodes:
+            self.plan(node, "day", days)
+        return [self.daily(self.value(node, "day"), days) for node in nodes]
+
+    # -- planning --
+
+    def plan(self, node, timeframe, need):
+        key = (node, timeframe)
+        if self.needs.get(key, -1) >= need:
+            return
+        self.needs[key] = need
+        self.memo.pop(key, None)
+        if self.cache is not None and timeframe == "day" and isinstance(node, Indicator):
+            self.cached[node] = self.cache.lookup(self.panel.lineage, node, "day", self.panel.dates, need)
+        for child, child_tf in children(node, timeframe):
+            self.plan(child, child_tf, self.child_need(node, timeframe, need, child, child_tf))
+
+    def child_need(self, node, timeframe, need, child, child_tf):
+        if child_tf != "day" and result_timeframe(child, child_tf) not in (None, child_tf):
+            # Coarse bars built from a finer value need all of its days.
+            return self.days
+        if isinstance(node, Offset):
+            if child_tf == "day":
+                return need + node.periods
+            return need if node.periods == 0 else 0
+        if isinstance(node, Indicator) and timeframe == "day":
+            found = self.cached.get(node)
+            if found is not None:
+                return extension_history(node, found[1])
+            return need + history(node)
+        return need
+
+    # -- evaluation --
+
+    def value(self, node, timeframe):
+        key = (node, timeframe)
+        series = self.memo.get(key)
+        if series is None:
+            if key not in self.needs:
+                self.plan(node, timeframe, 1)
+            series = self.memo[key] = self.compute(node, timeframe, self.needs[key])
+        return series
+
+    def compute(self, node, timeframe, need):
+        if isinstance(node, Num):
+            return node.value
+        if isinstance(node, Field):
+            return self.field(node.name, timeframe, need)
+        if isinstance(node, Offset):
+            tf = node.timeframe or timeframe
+            return self.shift(self.convert(self.value(node.expr, tf), tf), node.periods, need)
+        if isinstance(node, Indicator):
+            return self.indicator(node, timeframe, need)
+        if isinstance(node, Unary):
+            fn = np.negative if node.op == "neg" else np.abs
+            return self.apply(fn, self.value(node.expr, timeframe), need)
+        if isinstance(node, BinOp):
+            return self.combine(_ARITH[node.op], node.left, node.right, timeframe, need)
+        if isinstance(node, Compare):
+            return self.combine(_COMPARE[node.op], node.left, node.right, timeframe, need)
+        if isinstance(node, BoolOp):
+            fn = np.logical_and if node.op == "and" else np.logical_or
+            result = self.value(node.items[0], timeframe)
+            for item in node.items[1:]:
+                result = self.combine_values(fn, result, self.value(item, timeframe), need)
+            return result
+        if isinstance(node, Not):
+            return self.apply(np.logical_not, self.value(node.expr, timeframe), need)
+        raise TypeError(f"Not a clause node: {node!r}")
+
+    def field(self, name, timeframe, need):
+        if not self.panel.has(name):
+            raise UnsupportedClause(f"No local data for {name!r}")
+        daily = self.panel.field(name)
+        if timeframe == "day":
+            return Series("day", _tail(daily, need))
+        periods = self.panel.periods(timeframe)
+        how = AGGREGATES.get(name, "last")
+        return Series(timeframe, _aggregate_live(daily, periods, how, need), self.panel.bars(name, timeframe))
+
+    def argument(self, node, timeframe):
+        arg = self.value(node.expr, timeframe)
+        if not isinstance(arg, Series):
+            arg = Series("day", np.full((len(self.panel.symbols), self.days), float(arg)))
+        return self.convert(arg, timeframe)
+
+    def indicator(self, node, timeframe, need):
+        if timeframe == "day":
+            if self.cache is not None:
+                return Series("day", self.cached_indicator(node, need))
+            values = _as_float(_tail(self.argument(node, "day").live, need + history(node)))
+            return Series("day", _daily_indicator(node, values, need)[0])
+        arg = self.argument(node, timeframe)
+        bars = _as_float(arg.bars)
+        live = _as_float(_tail(arg.live, need))
+        prev = self.period_of_days(timeframe, need) - 1
+        return Series(timeframe, _extend(node.name, node.window, bars, live, prev), _ROLLING[node.name](bars, node.window))
+
+    def cached_indicator(self, node, need):
+        found = self.cached.get(node)
+        symbols = len(self.panel.symbols)
+        if found is not None and not found[1]:
+            self.cache.tally("hits")
+            return _tail(found[0].fit(symbols).values, need)
+        if found is None:
+            self.cache.tally("misses")
+            inputs = _as_float(_tail(self.argument(node, "day").live, need + history(node)))
+            values, state = _daily_indicator(node, inputs, need)
+        else:
+            self.cache.tally("extensions")
+            entry, new_days = found
+            entry = entry.fit(symbols)
+            inputs = _as_float(_tail(self.argument(node, "day").live, extension_history(node, new_days)))
+            values, state = _extend_daily(node, inputs, new_days, entry)
+            if need > new_days:
+                values = np.concatenate([_tail(entry.values, need - new_days), values], axis=1)
+        return self.cache.store(self.panel.lineage, node, "day", self.panel.dates[-1], values, state)
+
+    # -- timeframe handling --
+
+    def period_of_days(self, timeframe, need):
+        """Period number of each of the last ``need`` days (-1 before the panel)."""
+        of_day = self.panel.periods(timeframe).of_day
+        if need <= self.days:
+            return of_day[self.days - need:]
+        return np.concatenate([np.full(need - self.days, -1), of_day])
+
+    def convert(self, value, timeframe):
+        """``value`` re-expressed in ``timeframe`` (constants pass through)."""
+        if not isinstance(value, Series) or value.timeframe == timeframe:
+            return value
+        if timeframe == "day":
+            return Series("day", value.live)
+        ends = self.panel.periods(timeframe).ends
+        return Series(timeframe, value.live, _tail(value.live, self.days)[:, ends])
+
+    def shift(self, value, periods, need):
+        if not isinstance(value, Series):
+            return value
+        if value.timeframe == "day":
+            return Series("day", _tail(value.live, need + periods)[:, :need])
+        if periods == 0:
+            return Series(value.timeframe, _tail(value.live, need), value.bars)
+        return Series(
+            value.timeframe,
+            rolling.take(value.bars, self.period_of_days(value.timeframe, need) - periods),
+            rolling.shift(value.bars, periods),
+        )
+
+    def apply(self, fn, value, need):
+        if not isinstance(value, Series):
+            return fn(value)
+        return Series(value.timeframe, fn(_tail(value.live, need)), None if value.bars is None else fn(value.bars))
+
+    def combine(self, fn, left, right, timeframe, need):
+        return self.combine_values(fn, self.value(left, timeframe), self.value(right, timeframe), need)
+
+    def combine_values(self, fn, a, b, need):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if not isinstance(a, Series):
+                return self.apply(lambda x: fn(a, x), b, need)
+            if not isinstance(b, Series):
+                return self.apply(lambda x: fn(x, b), a, need)
+            if a.timeframe != b.timeframe:
+                a, b = self.convert(a, "day"), self.convert(b, "day")
+            live = fn(_tail(a.live, need), _tail(b.live, need))
+            if a.timeframe == "day":
+                return Series("day", live)
+            return Series(a.timeframe, live, fn(a.bars, b.bars))
+
+    def daily(self, value, days):
+        """A root value as a boolean ``symbols x days`` array."""
+        if not isinstance(value, Series):
+            return np.full((len(self.panel.symbols), days), bool(value))
+        return _tail(self.convert(value, "day").live, days)
+
+
+def _tail(values, n):
+    """The last ``n`` columns of ``values``, padded at the front with NaN/False."""
+    have = values.shape[1]
+    if have >= n:
+        return values[:, have - n:]
+    out = np.empty((values.shape[0], n), dtype=values.dtype)
+    out[:, :n - have] = False if values.dtype == bool else np.nan
+    out[:, n - have:] = values
+    return out
+
+
+def _as_float(values):
+    return values.astype(np.float64) if values.dtype == bool else values
+
+
+def _last_wma(values):
+    window = values.shape[1]
+    return values @ np.arange(1, window + 1, dtype=np.float64) / (window * (window + 1) / 2)
+
+
+# Single-day reductions, used when only the latest value is needed.
+_LAST = {
+    "max": lambda values: np.fmax.reduce(values, axis=1),
+    "min": lambda values: np.fmin.reduce(values, axis=1),
+    "sma": lambda values: values.mean(axis=1),
+    "wma": _last_wma,
+    "count": lambda values: np.nansum(values, axis=1),
+}
+
+
+def _daily_indicator(node, values, need):
+    """
+    ``node`` over daily input ``values`` for the last ``need`` days, plus the
+    state ``_extend_daily`` continues from.
+    """
+    if node.name == "rsi":
+        out, gain, loss = rolling.rsi_parts(values, node.window)
+        return out[:, -need:], (values[:, -1], gain[:, -1], loss[:, -1])
+    if need == 1 and node.name in _LAST:
+        return _LAST[node.name](values[:, -node.window:])[:, None], None
+    return _ROLLING[node.name](values, node.window)[:, -need:], None
+
+
+def _extend_daily(node, values, new_days, entry):
+    """``node`` for ``new_days`` more days, from a cached entry and the new input ``values``."""
+    if node.name == "ema":
+        return rolling.ema(values, node.window, entry.values[:, -1]), None
+    if node.name == "rsi":
+        out, gain, loss = rolling.rsi_parts(values, node.window, entry.state)
+        return out, (values[:, -1], gain[:, -1], loss[:, -1])
+    return _daily_indicator(node, values, new_days)
+
+
+def _aggregate_live(daily, periods, how, need):
+    """The last ``need`` days' values of their period's bar built from the days so far."""
+    days = daily.shape[1]
+    if need <= 0 or not days:
+        return _tail(daily[:, :0], need)
+    # Start at the beginning of the first needed day's period.
+    first = periods.starts[periods.of_day[max(days - need, 0)]]
+    x = daily[:, first:]
+    of_day = periods.of_day[first:] - periods.of_day[first]
+    starts = periods.starts[periods.of_day[first]:] - first
+    if how == "first":
+        out = x[:, starts[of_day]]
+    elif how == "last":
+        out = x
+    elif how == "sum":
+        valid = ~np.isnan(x)
+        out = _running_within(np.where(valid, x, 0.0), starts, of_day)
+        out[_running_within(valid.astype(np.int64), starts, of_day) == 0] = np.nan
+    else:
+        fn = np.fmax if how == "max" else np.fmin
+        out = np.empty_like(x)
+        for start, end in zip(starts, np.append(starts[1:], x.shape[1])):
+            out[:, start:end] = fn.accumulate(x[:, start:end], axis=1)
+    return _tail(out, need)
+
+
+def _running_within(values, starts, of_day):
+    running = np.cumsum(values, axis=1)
+    before = np.zeros_like(running)
+    before[:, 1:] = running[:, :-1]
+    return running - before[:, starts[of_day]]
+
+
+def _extend(name, window, bars, live, prev):
+    """
+    ``name`` over the ``window - 1`` completed bars before each day's period
+    plus that day's live bar.
+    """
+    if name in ("max", "min"):
+        if window <= 1:
+            return live
+        fn = np.fmax if name == "max" else np.fmin
+        return fn(rolling.take(_ROLLING[name](bars, window - 1), prev), live)
+    if name == "count":
+        if window <= 1:
+            return live
+        before = rolling.take(rolling.rolling_sum(bars, window - 1, min_periods=1), prev)
+        return np.where(np.isnan(before), 0.0, before) + live
+    if name == "sma":
+        if window <= 1:
+            return live
+        return (rolling.take(rolling.rolling_sum(bars, window - 1), prev) + live) / window
+    if name == "wma":
+        if window <= 1:
+            return live
+        before = rolling.take(rolling.weighted_sum(bars, window - 1), prev)
+        return (before + window * live) / (window * (window + 1) / 2)
+    if name == "ema":
+        before = rolling.take(rolling.ema(bars, window), prev)
+        step = before + 2.0 / (window + 1) * (live - before)
+        return np.where(np.isnan(before), live, np.where(np.isnan(live), before, step))
+    if name == "rsi":
+        _, gain, loss = rolling.rsi_parts(bars, window)
+        delta = live - rolling.take(bars, prev)
+        up = np.where(delta > 0, delta, 0.0)
+        down = np.where(delta < 0, -delta, 0.0)
+        g, l = rolling.take(gain, prev), rolling.take(loss, prev)
+        g = np.where(np.isnan(g), up, g + (up - g) / window)
+        l = np.where(np.isnan(l), down, l + (down - l) / window)
+        out = rolling.rsi_from(g, l)
+        out[np.isnan(delta)] = np.nan
+        return out
+    raise ValueError(f"Unknown indicator: {name}")
+
+
+def history_window(node, end, days=1):
+    """``(start, end)`` of the panel days needed to evaluate ``node`` on the ``days`` days ending at ``end``."""
+    # One extra period of the coarsest timeframe so no bar the clause reads
+    # is cut short at the start of the window.
+    margin = max([DAYS_PER[n.timeframe] for n in walk(node) if isinstance(n, Offset) and n.timeframe] or [1])
+    return max(0, end - days + 1 - lookback(node) - margin), end
+
+
+def evaluate(node, panel, day=None, cache=None):
+    """
+    Boolean mask over ``panel.symbols``: where ``node`` holds on ``day``
+    (default: the panel's last day). Only the history the clause needs is
+    read, so a memory-mapped panel pages in just that window.
+    """
+    end = len(panel.dates) if day is None else panel.day_index(day) + 1
+    return Evaluator(panel.window(*history_window(node, end)), cache).evaluate(node)[:, -1]
@@ -0,0 +1,145 @@
+"""
+Indicator series shared across clauses, screeners and days.
+
+``ema( close,50 )``, ``sma( volume , 20 )``, ``max( 252 , latest high )``
+and ``rsi( 14 )`` appear in many screeners. An ``IndicatorCache`` passed to
+the ``Evaluator`` keeps every daily indicator it computes, keyed by
+
+    (panel lineage, indicator node, timeframe, as-of date)
+
+The indicator node carries its name, window and input expression. The
+lineage identifies the data it was computed from (a store path plus the
+corporate actions in force), so an adjustment never serves stale values.
+Each series is therefore computed once per day for the whole universe,
+whichever screener asks first.
+
+When the store gains a bar, the previous day's entry is extended instead
+of recomputed:
+
+* ``ema`` and ``rsi`` continue their smoothing from the stored last value
+  (and, for RSI, the smoothed gain/loss), one step per new day;
+* window functions (``max``, ``min``, ``sma``, ``wma``, ``count``) only
+  read the last ``window`` input bars for each new day.
+
+An extended EMA is the exact continuation of the series it was seeded
+from, so it never drifts further from a full-history EMA than the first
+day's warm-up did.
+
+Entries are arrays of the trailing days last asked for, evicted least
+recently used once ``max_bytes`` is exceeded.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+# Trading days an entry may be behind and still be extended.
+CATCH_UP_DAYS = 10
+
+
+class Entry:
+    __slots__ = ("values", "state", "nbytes")
+
+    def __init__(self, values, state=None):
+        self.values = values
+        # Smoothing state beyond the last value (RSI: previous input, gain, loss).
+        self.state = state
+        self.nbytes = values.nbytes + sum(part.nbytes for part in state or ())
+
+    @property
+    def days(self):
+        return self.values.shape[1]
+
+    def fit(self, symbols):
+        """The entry with NaN rows for symbols added to the store since."""
+        have = self.values.shape[0]
+        if have == symbols:
+            return self
+        if have > symbols:
+            raise ValueError(f"Entry has {have} symbols, panel has {symbols}")
+        return Entry(_pad(self.values, symbols), None if self.state is None else tuple(_pad(s, symbols) for s in self.state))
+
+
+def _pad(values, rows):
+    out = np.full((rows,) + values.shape[1:], np.nan)
+    out[:values.shape[0]] = values
+    return out
+
+
+def _readonly(values):
+    values = np.array(values, dtype=np.float64)
+    values.flags.writeable = False
+    return values
+
+
+class IndicatorCache:
+    """Thread-safe, memory-bounded LRU of daily indicator series."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.extensions = self.evictions = 0
+
+    def lookup(self, lineage, node, timeframe, dates, need):
+        """
+        ``(entry, new_days)`` for ``node`` on the last of ``dates``: the
+        entry for that day (``new_days == 0``) if it holds ``need`` days,
+        else the latest entry at most ``CATCH_UP_DAYS`` earlier that can be
+        extended to it. ``None`` if neither is cached.
+        """
+        with self._lock:
+            for new_days in range(min(CATCH_UP_DAYS, len(dates) - 1) + 1):
+                key = (lineage, node, timeframe, dates[-1 - new_days])
+                entry = self._entries.get(key)
+                if entry is not None and entry.days >= need - new_days:
+                    self._entries.move_to_end(key)
+                    return entry, new_days
+        return None
+
+    def store(self, lineage, node, timeframe, day, values, state=None):
+        """Cache ``values`` (the trailing days up to ``day``) and return them read-only."""
+        entry = Entry(_readonly(values), None if state is None else tuple(_readonly(s) for s in state))
+        if entry.nbytes > self.max_bytes:
+            return entry.values
+        key = (lineage, node, timeframe, day)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+        return entry.values
+
+    def tally(self, outcome):
+        """Count a lookup outcome: "hits", "misses" or "extensions"."""
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.extensions
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "extensions": self.extensions,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.extensions) / lookups, 4) if lookups else None,
+            }
@@ -0,0 +1,145 @@
+"""
+OHLCV panel: one ``symbols x trading days`` float array per field.
+
+Only trading days are present, so weekly/monthly/yearly periods derived
+from the dates skip NSE holidays by construction: a week whose Monday is a
+holiday simply starts on Tuesday.
+"""
+import numpy as np
+
+# How a coarser bar is built from its daily bars; unlisted fields take the
+# period's last value.
+AGGREGATES = {
+    "open": "first",
+    "high": "max",
+    "low": "min",
+    "close": "last",
+    "volume": "sum",
+}
+
+
+class Periods:
+    """Grouping of a panel's trading days into weekly/monthly/... bars."""
+
+    def __init__(self, keys):
+        n = len(keys)
+        change = np.ones(n, dtype=bool)
+        if n:
+            change[1:] = keys[1:] != keys[:-1]
+        self.starts = np.flatnonzero(change)
+        self.ends = np.append(self.starts[1:] - 1, n - 1) if n else self.starts
+        # Period number of every day.
+        self.of_day = np.cumsum(change) - 1
+
+    def __len__(self):
+        return len(self.starts)
+
+
+def period_keys(dates, timeframe):
+    """A value per date that changes exactly when a new period starts."""
+    days = dates.astype("datetime64[D]").astype(np.int64)
+    if timeframe == "day":
+        return days
+    if timeframe == "week":
+        # 1970-01-01 was a Thursday; shift so weeks start on Monday.
+        return (days + 3) // 7
+    months = dates.astype("datetime64[M]").astype(np.int64)
+    if timeframe == "month":
+        return months
+    if timeframe == "quarter":
+        return months // 3
+    if timeframe == "year":
+        return dates.astype("datetime64[Y]").astype(np.int64)
+    raise ValueError(f"Unknown timeframe: {timeframe}")
+
+
+def aggregate_bars(daily, periods, how):
+    """One bar per period from ``daily`` values, aggregated ``how``."""
+    if not len(periods):
+        return daily[:, :0]
+    if how == "first":
+        return daily[:, periods.starts]
+    if how == "last":
+        return daily[:, periods.ends]
+    if how == "sum":
+        valid = ~np.isnan(daily)
+        total = np.add.reduceat(np.where(valid, daily, 0.0), periods.starts, axis=1)
+        total[np.add.reduceat(valid, periods.starts, axis=1) == 0] = np.nan
+        return total
+    fn = np.fmax if how == "max" else np.fmin
+    return fn.reduceat(daily, periods.starts, axis=1)
+
+
+class Panel:
+    """
+    ``fields`` maps a field name ("open", "high", "low", "close", "volume",
+    "market_cap", ...) to a float array of shape ``(len(symbols), len(dates))``
+    with NaN where a symbol has no bar. A 1-D per-symbol array (e.g. a
+    current market cap) is accepted and repeated across days. Arrays are
+    used as given, without copying, so they may be memory-mapped views.
+
+    ``lineage`` names the data the panel holds, for sharing cached
+    indicators between panels (and windows) over the same bars; ``None``
+    for a panel that is not backed by a store.
+    """
+
+    lineage = None
+
+    def __init__(self, symbols, dates, fields):
+        self.symbols = list(symbols)
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        shape = (len(self.symbols), len(self.dates))
+        self.fields = {}
+        for name, values in fields.items():
+            values = np.asarray(values)
+            if values.dtype.kind != "f":
+                values = values.astype(np.float64)
+            if values.ndim == 1:
+                values = np.broadcast_to(values[:, None], shape)
+            if values.shape != shape:
+                raise ValueError(f"Field {name!r} has shape {values.shape}, expected {shape}")
+            self.fields[name] = values
+        self._periods = {}
+        self._bars = {}
+
+    def __repr__(self):
+        return f"<Panel {len(self.symbols)} symbols x {len(self.dates)} days>"
+
+    @property
+    def shape(self):
+        return (len(self.symbols), len(self.dates))
+
+    def has(self, name):
+        return name in self.fields
+
+    def field(self, name):
+        return self.fields[name]
+
+    def periods(self, timeframe):
+        if timeframe not in self._periods:
+            self._periods[timeframe] = Periods(period_keys(self.dates, timeframe))
+        return self._periods[timeframe]
+
+    def bars(self, name, timeframe):
+        """``name`` as one bar per ``timeframe`` period (the last may still be open)."""
+        key = (name, timeframe)
+        if key not in self._bars:
+            self._bars[key] = aggregate_bars(self.field(name), self.periods(timeframe), AGGREGATES.get(name, "last"))
+        return self._bars[key]
+
+    def day_index(self, day):
+        """Index of the last trading day on or before ``day``."""
+        idx = int(np.searchsorted(self.dates, np.datetime64(day, "D"), side="right")) - 1
+        if idx < 0:
+            raise ValueError(f"No data on or before {day}")
+        return idx
+
+    def window(self, start, end):
+        """Days ``start:end`` as a panel sharing this one's arrays."""
+        if (start, end) == (0, len(self.dates)):
+            return self
+        return Panel(self.symbols, self.dates[start:end], {k: v[:, start:end] for k, v in self.fields.items()})
+
+    def until(self, day):
+        """The panel truncated to trading days on or before ``day``."""
+        return self.window(0, self.day_index(day) + 1)
@@ -0,0 +1,139 @@
+"""
+Rolling-window primitives over ``symbols x periods`` arrays.
+
+Every function works along axis 1 for all symbols at once and treats NaN
+as "no bar". Averages need a full window of bars (NaN until then); max,
+min and count use whatever bars the window holds, the way a chart's
+"highest high" does for a stock with a short history.
+"""
+import numpy as np
+
+
+def shift(values, periods):
+    """``values`` moved ``periods`` bars later, padded with NaN (or False)."""
+    if periods == 0:
+        return values
+    out = np.empty_like(values)
+    fill = False if values.dtype == bool else np.nan
+    periods = min(periods, values.shape[1])
+    out[:, :periods] = fill
+    out[:, periods:] = values[:, :values.shape[1] - periods]
+    return out
+
+
+def take(values, index):
+    """``values[:, index]`` with NaN (or False) where ``index`` is negative."""
+    out = values[:, np.maximum(index, 0)]
+    missing = index < 0
+    if missing.any():
+        out[:, missing] = False if values.dtype == bool else np.nan
+    return out
+
+
+def rolling_sum(values, window, min_periods=None):
+    """Sum of the last ``window`` bars; NaN with fewer than ``min_periods``."""
+    if min_periods is None:
+        min_periods = window
+    values = values.astype(np.float64, copy=False)
+    valid = ~np.isnan(values)
+    total = _window_diff(np.cumsum(np.where(valid, values, 0.0), axis=1), window)
+    count = _window_diff(np.cumsum(valid, axis=1, dtype=np.int32), window)
+    total[count < max(min_periods, 1)] = np.nan
+    return total
+
+
+def _window_diff(cumulative, window):
+    out = cumulative.copy()
+    if window < out.shape[1]:
+        out[:, window:] -= cumulative[:, :-window]
+    return out
+
+
+def rolling_mean(values, window):
+    return rolling_sum(values, window) / window
+
+
+def weighted_sum(values, window):
+    """Sum of the last ``window`` bars weighted 1 (oldest) .. ``window`` (newest)."""
+    values = values.astype(np.float64, copy=False)
+    valid = ~np.isnan(values)
+    x = np.where(valid, values, 0.0)
+    t = np.arange(x.shape[1], dtype=np.float64)
+    plain = _window_diff(np.cumsum(x, axis=1), window)
+    indexed = _window_diff(np.cumsum(x * t, axis=1), window)
+    # sum((j - (t - window)) * x[j]) over the window
+    out = indexed - (t - window) * plain
+    out[_window_diff(np.cumsum(valid, axis=1, dtype=np.int32), window) < window] = np.nan
+    return out
+
+
+def rolling_wma(values, window):
+    return weighted_sum(values, window) / (window * (window + 1) / 2)
+
+
+def rolling_max(values, window):
+    return _rolling_extreme(values, window, np.fmax, -np.inf)
+
+
+def rolling_min(values, window):
+    return _rolling_extreme(values, window, np.fmin, np.inf)
+
+
+def _rolling_extreme(values, window, fn, fill):
+    # Doubling: after k steps each column holds the extreme of the last 2**k
+    # bars, so any window takes log2(window) whole-array operations.
+    x = np.where(np.isnan(values), fill, values).astype(np.float64, copy=False)
+    n = x.shape[1]
+    window = min(window, max(n, 1))
+    span = 1
+    while span * 2 <= window:
+        x[:, span:] = fn(x[:, span:], x[:, :-span])
+        span *= 2
+    if span < window:
+        rest = window - span
+        x[:, rest:] = fn(x[:, rest:], x[:, :-rest])
+    x[np.isinf(x)] = np.nan
+    return x
+
+
+def smooth(values, alpha, state=None):
+    """
+    Exponential smoothing ``s = s + alpha * (x - s)``, seeded with each
+    symbol's first bar; a missing bar carries the previous value. Returns
+    every step, continuing from ``state`` (the value before the first bar)
+    when given.
+    """
+    x = np.ascontiguousarray(values.T, dtype=np.float64)
+    out = np.empty_like(x)
+    prev = np.full(x.shape[1], np.nan) if state is None else np.array(state, dtype=np.float64)
+    for t in range(x.shape[0]):
+        v = x[t]
+        step = prev + alpha * (v - prev)
+        prev = np.where(np.isnan(prev), v, np.where(np.isnan(v), prev, step))
+        out[t] = prev
+    return out.T
+
+
+def ema(values, window, state=None):
+    return smooth(values, 2.0 / (window + 1), state)
+
+
+def rsi_parts(values, window, state=None):
+    """Wilder RSI plus its smoothed gain/loss, for incremental extension."""
+    prev_value, gain_state, loss_state = state if state is not None else (None, None, None)
+    previous = shift(values.astype(np.float64, copy=False), 1)
+    if prev_value is not None:
+        previous[:, 0] = prev_value
+    delta = values - previous
+    gain = smooth(np.where(delta > 0, delta, np.where(np.isnan(delta), np.nan, 0.0)), 1.0 / window, gain_state)
+    loss = smooth(np.where(delta < 0, -delta, np.where(np.isnan(delta), np.nan, 0.0)), 1.0 / window, loss_state)
+    return rsi_from(gain, loss), gain, loss
+
+
+def rsi_from(gain, loss):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(loss == 0, np.where(gain == 0, 50.0, 100.0), 100.0 - 100.0 / (1.0 + gain / loss))
+
+
+def rsi(values, window):
+    return rsi_parts(values, window)[0]
@@ -0,0 +1,356 @@
+"""
+Columnar, memory-mapped store of daily OHLCV bars.
+
+Layout of the store directory::
+
+    meta.json      {"version": 1, "dtype": "<f8", "capacity": <symbol slots>, "fields": [...]}
+    symbols.json   symbol of every slot, in slot order (the symbol index)
+    dates.bin      int32 days since 1970-01-01, one per stored trading day
+    <field>.bin    one row of ``capacity`` values per stored day
+    actions.json   corporate actions: [{"symbol", "ex_date", "ratio"}, ...]
+    bars/          weekly/monthly/... bars maintained from the days (``bars``)
+
+Field files are day-major, so appending a day appends one row and never
+touches history; readers map them with ``np.memmap`` and see the usual
+``symbols x days`` orientation through a transposed view, so every worker
+shares the same page-cache pages and only the days a clause reads are ever
+paged in. ``dates.bin`` is written last: a day exists for readers only once
+its date is there, and a half-written row from an interrupted append is
+simply overwritten by the next one.
+
+A new symbol takes the next free slot. Only when the slots run out are the
+field files rewritten, with twice the capacity.
+
+Prices are stored as traded. Splits, bonuses and dividends are recorded in
+``actions.json`` and applied by ``StorePanel`` as an overlay when a field is
+read. ``ratio`` multiplies prices before the ex-date (0.5 for a 1:2 split)
+and divides volumes, and rows without an action in the window are never
+copied.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from .bars import TIMEFRAMES, read_layers, rebuild_layer, update_layers, version_files, write_json
+from .panel import AGGREGATES, Panel, Periods, aggregate_bars
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+VERSION = 1
+DTYPE = "<f8"
+FIELDS = ("open", "high", "low", "close", "volume", "market_cap")
+PRICE_FIELDS = ("open", "high", "low", "close")
+INITIAL_CAPACITY = 4096
+
+
+class StoreError(Exception):
+    pass
+
+
+def _day_number(day):
+    return int(np.datetime64(day, "D").astype(np.int64))
+
+
+class Actions:
+    """Corporate-action adjustment factors, per symbol."""
+
+    def __init__(self, actions=()):
+        self.by_symbol = {}
+        for action in actions:
+            self.by_symbol.setdefault(action["symbol"], []).append(
+                (np.datetime64(action["ex_date"], "D"), float(action["ratio"]))
+            )
+        self.key = tuple(sorted((s, str(ex), r) for s, found in self.by_symbol.items() for ex, r in found))
+
+    def __bool__(self):
+        return bool(self.by_symbol)
+
+    def factors(self, symbol, dates):
+        """Price multiplier for each of ``dates``, or ``None`` if all are 1."""
+        actions = [(ex, ratio) for ex, ratio in self.by_symbol.get(symbol, ()) if ex > dates[0]]
+        if not actions:
+            return None
+        factor = np.ones(len(dates))
+        for ex_date, ratio in actions:
+            factor[:np.searchsorted(dates, ex_date)] *= ratio
+        return factor
+
+
+class StorePanel(Panel):
+    """
+    A ``Panel`` over memory-mapped store fields with adjustments applied on
+    read. Coarse bars come from the store's bar ``layers``; only a period
+    the panel holds part of (its first, or its last when the panel ends
+    before the store does) and symbols with corporate actions are
+    aggregated from the daily values.
+    """
+
+    def __init__(self, symbols, dates, fields, actions, path=None, layers=None, offset=0):
+        super().__init__(symbols, dates, fields)
+        self.actions = actions
+        self.path = path
+        self.layers = layers or {}
+        # Store index of the panel's first day.
+        self.offset = offset
+        # Adjusted values change whenever an action takes effect.
+        self.lineage = (path, actions.key)
+        self._adjusted = {}
+        self._factors = None
+
+    def factors(self):
+        """``[(row, price factor), ...]`` for the symbols with an action in the panel."""
+        if self._factors is None:
+            self._factors = []
+            if self.actions and len(self.dates):
+                for row, symbol in enumerate(self.symbols):
+                    factor = self.actions.factors(symbol, self.dates)
+                    if factor is not None:
+                        self._factors.append((row, factor))
+        return self._factors
+
+    def field(self, name):
+        if name not in self._adjusted:
+            self._adjusted[name] = self._adjust(name, self.fields[name])
+        return self._adjusted[name]
+
+    def _adjust(self, name, raw):
+        if name not in PRICE_FIELDS + ("volume",) or not self.factors():
+            return raw
+        adjusted = np.array(raw)
+        for row, factor in self.factors():
+            adjusted[row] = raw[row] * factor if name in PRICE_FIELDS else raw[row] / factor
+        return adjusted
+
+    def bars(self, name, timeframe):
+        layer = self.layers.get(timeframe)
+        if layer is None or name not in layer.fields or not len(self.dates):
+            return super().bars(name, timeframe)
+        key = (name, timeframe)
+        if key not in self._bars:
+            self._bars[key] = self._stored_bars(layer, name, timeframe)
+        return self._bars[key]
+
+    def _stored_bars(self, layer, name, timeframe):
+        first, last = self.offset, self.offset + len(self.dates) - 1
+        p0, p1 = layer.period_of(first), layer.period_of(last)
+        periods = self.periods(timeframe)
+        bars = layer.fields[name][p0:p1 + 1].T
+        partial = []
+        if layer.starts[p0] != first:
+            partial.append(0)
+        if layer.last_day(p1) != last:
+            partial.append(len(periods) - 1)
+        # Stored period-major; rolling windows run along periods, so copy
+        # to symbol-major once rather than striding through the file.
+        bars = np.array(bars, order="C")
+        rows = [row for row, _ in self.factors()] if name in PRICE_FIELDS + ("volume",) else []
+        how = AGGREGATES.get(name, "last")
+        daily = self.field(name)
+        for col in partial:
+            days = daily[:, periods.starts[col]:periods.ends[col] + 1]
+            bars[:, col] = aggregate_bars(days, Periods(np.zeros(days.shape[1])), how)[:, 0]
+        if rows:
+            bars[rows] = aggregate_bars(daily[rows], periods, how)
+        return bars
+
+    def window(self, start, end):
+        if (start, end) == (0, len(self.dates)):
+            return self
+        return StorePanel(
+            self.symbols, self.dates[start:end],
+            {k: v[:, start:end] for k, v in self.fields.items()}, self.actions, self.path,
+            self.layers, self.offset + start,
+        )
+
+
+class OHLCVStore:
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    def exists(self):
+        return os.path.exists(self.file("meta.json"))
+
+    # -- reading --
+
+    def meta(self):
+        with open(self.file("meta.json")) as fh:
+            return json.load(fh)
+
+    def symbols(self):
+        with open(self.file("symbols.json")) as fh:
+            return json.load(fh)
+
+    def actions(self):
+        try:
+            with open(self.file("actions.json")) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return []
+
+    def dates(self):
+        days = np.fromfile(self.file("dates.bin"), dtype="<i4")
+        return days.astype("datetime64[D]")
+
+    def version(self):
+        """Changes whenever a day, symbol or corporate action is added."""
+        files = [self.file(name) for name in ("dates.bin", "symbols.json", "actions.json", "meta.json")]
+        return tuple(
+            os.stat(name).st_mtime_ns if os.path.exists(name) else 0
+            for name in files + version_files(self.path)
+        )
+
+    def panel(self):
+        """A ``StorePanel`` over every stored day, backed by read-only memmaps."""
+        if not self.exists():
+            raise StoreError(f"No OHLCV store at {self.path}")
+        meta = self.meta()
+        symbols = self.symbols()
+        dates = self.dates()
+        fields = {}
+        for name in meta["fields"]:
+            if not len(dates):
+                fields[name] = np.empty((len(symbols), 0))
+                continue
+            rows = np.memmap(self.file(f"{name}.bin"), dtype=meta["dtype"], mode="r",
+                             shape=(len(dates), meta["capacity"]))
+            fields[name] = rows[:, :len(symbols)].T
+        # Actions announced for days not stored yet must not move today's prices.
+        last = dates[-1] if len(dates) else None
+        actions = [a for a in self.actions() if last is not None and np.datetime64(a["ex_date"], "D") <= last]
+        layers = read_layers(self.path, meta, len(dates), len(symbols))
+        return StorePanel(symbols, dates, fields, Actions(actions), self.path, layers)
+
+    # -- writing --
+
+    @contextmanager
+    def write_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock, open(self.file(".lock"), "a") as fh:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def create(self, capacity=INITIAL_CAPACITY):
+        with self.write_lock():
+            if self.exists():
+                return
+            for name in FIELDS:
+                open(self.file(f"{name}.bin"), "wb").close()
+            open(self.file("dates.bin"), "wb").close()
+            write_json(self.file("symbols.json"), [])
+            write_json(self.file("meta.json"), {
+                "version": VERSION, "dtype": DTYPE, "capacity": capacity, "fields": list(FIELDS),
+            })
+
+    def append_day(self, day, bars):
+        """
+        Store one trading day. ``bars`` maps symbol -> {field: value}; fields
+        a symbol lacks are NaN, except ``market_cap``, which is carried
+        forward from the previous day scaled by the change in close.
+        """
+        if not self.exists():
+            self.create()
+        with self.write_lock():
+            meta = self.meta()
+            symbols = self.symbols()
+            days = np.fromfile(self.file("dates.bin"), dtype="<i4")
+            number = _day_number(day)
+            if len(days) and number <= days[-1]:
+                raise StoreError(f"{day} is not after the last stored day {days[-1].astype('datetime64[D]')}")
+
+            slots = {symbol: i for i, symbol in enumerate(symbols)}
+            for symbol in bars:
+                if symbol not in slots:
+                    slots[symbol] = len(symbols)
+                    symbols.append(symbol)
+            if len(symbols) > meta["capacity"]:
+                meta = self._grow(meta, len(days), max(len(symbols), meta["capacity"] * 2))
+
+            capacity, dtype = meta["capacity"], np.dtype(meta["dtype"])
+            rows = {name: np.full(capacity, np.nan, dtype=dtype) for name in meta["fields"]}
+            for symbol, values in bars.items():
+                for name, value in values.items():
+                    if name in rows and value is not None:
+                        rows[name][slots[symbol]] = value
+            if "market_cap" in rows and len(days):
+                self._carry_market_cap(meta, len(days), rows, day, slots)
+
+            for name, row in rows.items():
+                with open(self.file(f"{name}.bin"), "r+b") as fh:
+                    fh.seek(len(days) * capacity * dtype.itemsize)
+                    fh.write(row.tobytes())
+                    fh.truncate()
+                    fh.flush()
+                    os.fsync(fh.fileno())
+            write_json(self.file("symbols.json"), symbols)
+            with open(self.file("dates.bin"), "ab") as fh:
+                fh.write(np.array([number], dtype="<i4").tobytes())
+                fh.flush()
+                os.fsync(fh.fileno())
+            update_layers(self.path, meta, np.append(days, number).astype("datetime64[D]"), rows)
+
+    def _carry_market_cap(self, meta, days, rows, day, slots):
+        shape = (days, meta["capacity"])
+        previous = {
+            name: np.memmap(self.file(f"{name}.bin"), dtype=meta["dtype"], mode="r", shape=shape)[-1]
+            for name in ("market_cap", "close")
+        }
+        # A split going ex today moves the close but not the market cap.
+        ratio = np.ones(meta["capacity"])
+        for action in self.actions():
+            if action["ex_date"] == str(np.datetime64(day, "D")) and action["symbol"] in slots:
+                ratio[slots[action["symbol"]]] = action["ratio"]
+        missing = np.isnan(rows["market_cap"])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            carried = previous["market_cap"] * rows["close"] / (previous["close"] * ratio)
+        rows["market_cap"][missing] = carried[missing]
+
+    def _grow(self, meta, days, capacity):
+        dtype = np.dtype(meta["dtype"])
+        for name in meta["fields"]:
+            old = np.fromfile(self.file(f"{name}.bin"), dtype=dtype, count=days * meta["capacity"])
+            new = np.full((days, capacity), np.nan, dtype=dtype)
+            new[:, :meta["capacity"]] = old.reshape(days, meta["capacity"])
+            tmp = self.file(f"{name}.bin.tmp")
+            new.tofile(tmp)
+            os.replace(tmp, self.file(f"{name}.bin"))
+        meta = dict(meta, capacity=capacity)
+        write_json(self.file("meta.json"), meta)
+        return meta
+
+    def rebuild_bars(self):
+        """Recompute every bar layer from the daily files."""
+        with self.write_lock():
+            meta, dates = self.meta(), self.dates()
+            for timeframe in TIMEFRAMES:
+                rebuild_layer(self.path, meta, dates, timeframe)
+
+    def add_actions(self, actions):
+        """Record corporate actions (dicts with symbol, ex_date, ratio)."""
+        with self.write_lock():
+            stored = self.actions()
+            seen = {(a["symbol"], a["ex_date"]) for a in stored}
+            for action in actions:
+                action = {
+                    "symbol": action["symbol"],
+                    "ex_date": str(np.datetime64(action["ex_date"], "D")),
+                    "ratio": float(action["ratio"]),
+                }
+                if (action["symbol"], action["ex_date"]) not in seen:
+                    stored.append(action)
+                    seen.add((action["symbol"], action["ex_date"]))
+            write_json(self.file("actions.json"), stored)
@@ -0,0 +1,140 @@
+"""
+Screener result exports.
+
+Exports are generated from the cached or persisted result the page was
+rendered from, never from a fresh scan. Text formats stream in chunks;
+Arrow streams record batches; Parquet (which needs a footer) is built in
+memory. Every export carries an ETag and Last-Modified derived from the
+run, so a repeat download of the same run is answered with 304.
+
+pyarrow is only imported when an Arrow or Parquet export is requested.
+"""
+import csv
+import io
+import json
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .rows import CSV_HEADER
+from .scans import entry_version
+
+CHUNK_ROWS = 500
+
+
+def _chunks(rows, size=CHUNK_ROWS):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def csv_chunks(rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(CSV_HEADER)
+    for chunk in _chunks(rows):
+        writer.writerows(row.as_tuple() for row in chunk)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def jsonl_chunks(rows):
+    for chunk in _chunks(rows):
+        yield "".join(json.dumps(row.as_dict()) + "\n" for row in chunk)
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("rank", pa.int64()),
+        ("stock_name", pa.string()),
+        ("percent_change", pa.float64()),
+        ("current_price", pa.float64()),
+        ("trade_volume", pa.int64()),
+    ])
+
+
+def _arrow_batch(rows, schema):
+    import pyarrow as pa
+
+    columns = list(zip(*(row.as_tuple() for row in rows))) or [[] for _ in schema]
+    return pa.record_batch([pa.array(col, type=f.type) for col, f in zip(columns, schema)], schema=schema)
+
+
+def arrow_chunks(rows):
+    # Import (and fail) before the response starts streaming.
+    schema = _arrow_schema()
+    return _arrow_stream(rows, schema)
+
+
+def _arrow_stream(rows, schema):
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for chunk in _chunks(rows):
+            writer.write_batch(_arrow_batch(chunk, schema))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+def parquet_chunks(rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema()
+    table = pa.Table.from_batches([_arrow_batch(rows, schema)], schema=schema)
+    sink = io.BytesIO()
+    pq.write_table(table, sink)
+    yield sink.getvalue()
+
+
+# format -> (content type, file extension, chunk generator, streamed)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv", csv_chunks, True),
+    "jsonl": ("application/jsonl", "jsonl", jsonl_chunks, True),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow", arrow_chunks, True),
+    "parquet": ("application/vnd.apache.parquet", "parquet", parquet_chunks, False),
+}
+
+
+def run_etag(screener_key, entry, fmt):
+    return f'"{screener_key}-{entry_version(entry)}-{fmt}"'
+
+
+async def _aiter(iterable):
+    for item in iterable:
+        yield item
+
+
+def export_response(request, screener_key, entry, fmt="csv", asynchronous=False):
+    """
+    Response exporting ``entry``'s rows as ``fmt``, or 304 if the client
+    already holds this run. ``asynchronous`` streams through an async
+    iterator, as ASGI views should.
+    """
+    content_type, extension, chunks, streamed = EXPORT_FORMATS[fmt]
+    etag = run_etag(screener_key, entry, fmt)
+    last_modified = int(entry["fetched_at"])
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        content = chunks(entry["rows"])
+        if streamed:
+            response = StreamingHttpResponse(
+                _aiter(content) if asynchronous else content, content_type=content_type
+            )
+        else:
+            response = HttpResponse(b"".join(content), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{screener_key}_stocks.{extension}"'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,124 @@
+"""
+Run several screeners at once and merge their results.
+
+Each screener goes through the normal cache/database/scan pipeline on a
+bounded pool, so warm screeners return immediately and cold ones scan in
+parallel. A screener that errors or exceeds the timeout is reported as
+such without holding back the others; a timed-out scan keeps running and
+still fills the cache for the next request.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from .scans import aget_screener_result, get_screener_result, last_updated
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "FANOUT_MAX_WORKERS", 8),
+            thread_name_prefix="fanout",
+        )
+    return _executor
+
+
+def _ok(key, screener, entry, started):
+    return {
+        "key": key,
+        "name": screener["name"],
+        "status": "ok",
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "last_updated": last_updated(entry).isoformat(),
+        "fetched_at": entry["fetched_at"],
+        "run_id": entry.get("run_id"),
+        "stale": entry.get("stale", False),
+        "rows": entry["rows"],
+    }
+
+
+def _failed(key, screener, status, error, started):
+    return {
+        "key": key,
+        "name": screener["name"],
+        "status": status,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "error": error,
+        "rows": [],
+    }
+
+
+def run_many(screeners, timeout=None):
+    """
+    Run every screener in ``screeners`` (key -> definition) concurrently and
+    return one outcome dict per screener, in input order.
+    """
+    started = time.perf_counter()
+    pool = get_executor()
+    futures = {
+        key: pool.submit(get_screener_result, key, screener["condition"])
+        for key, screener in screeners.items()
+    }
+    wait(futures.values(), timeout=timeout)
+
+    outcomes = []
+    for key, future in futures.items():
+        screener = screeners[key]
+        if not future.done():
+            outcomes.append(_failed(key, screener, "timeout", f"no result after {timeout}s", started))
+        elif future.exception() is not None:
+            e = future.exception()
+            outcomes.append(_failed(key, screener, "error", f"{e.__class__.__name__}: {e}", started))
+        else:
+            outcomes.append(_ok(key, screener, future.result(), started))
+    return outcomes
+
+
+async def arun_many(screeners, timeout=None, max_concurrency=None):
+    """Async ``run_many``: at most ``max_concurrency`` screeners in flight."""
+    semaphore = asyncio.Semaphore(max_concurrency or getattr(settings, "FANOUT_MAX_WORKERS", 8))
+
+    async def run_one(key, screener):
+        started = time.perf_counter()
+        try:
+            async with semaphore:
+                # Shielded so a timed-out scan still completes and fills the cache.
+                task = asyncio.ensure_future(aget_screener_result(key, screener["condition"]))
+                entry = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            return _failed(key, screener, "timeout", f"no result after {timeout}s", started)
+        except Exception as e:
+            return _failed(key, screener, "error", f"{e.__class__.__name__}: {e}", started)
+        return _ok(key, screener, entry, started)
+
+    tasks = [asyncio.ensure_future(run_one(k, s)) for k, s in screeners.items()]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        # If one raised or the request was cancelled, cancel the rest and wait
+        # for them to release the semaphore. Their shielded scans carry on.
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def confluence(outcomes):
+    """
+    Per-symbol hit counts across all outcomes, most confluent first, built
+    in a single pass over every returned row.
+    """
+    by_symbol = {}
+    for outcome in outcomes:
+        for row in outcome["rows"]:
+            symbol = row.stock_name
+            hit = by_symbol.get(symbol)
+            if hit is None:
+                hit = by_symbol[symbol] = {"symbol": symbol, "hits": 0, "screeners": []}
+            hit["hits"] += 1
+            hit["screeners"].append(outcome["key"])
+    return sorted(by_symbol.values(), key=lambda h: (-h["hits"], h["symbol"]))
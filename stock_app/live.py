@@ -0,0 +1,162 @@
+"""
+Live screener updates over Server-Sent Events.
+
+Under ASGI, ``async_views.screener_stream`` keeps one response open per
+client, subscribed to some screener keys. Each event loop runs a single
+watcher task per subscribed screener. Every ``POLL_INTERVAL`` seconds it
+looks the screener up through the screener cache, the same way a page
+load does, so refreshes stay coalesced across processes. When a new run
+appears, the watcher encodes one ``update`` event holding the run's delta
+(``stock_app.changes``) and hands those same bytes to every subscriber.
+
+Every subscriber has a queue of ``QUEUE_SIZE`` events. When a client falls
+behind, it loses its oldest events, so it cannot hold memory or slow the
+other subscribers down. Each event names the run it follows (``since``),
+so the client sees the gap and refetches with ``?since=``. A watcher stops
+once its last subscriber has gone.
+"""
+import asyncio
+import json
+import logging
+import weakref
+
+from django.conf import settings
+
+from . import changes, metrics
+from .scans import aget_screener_result, entry_version
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Seconds between cache lookups per watched screener.
+    "POLL_INTERVAL": 5,
+    # Events held for a subscriber before its oldest are dropped.
+    "QUEUE_SIZE": 16,
+    # Seconds of silence before a comment line keeps proxies from closing the stream.
+    "KEEPALIVE": 15,
+    # Screeners one stream may subscribe to.
+    "MAX_SCREENERS": 20,
+    # Milliseconds browsers wait before reconnecting.
+    "RETRY": 5000,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "LIVE_UPDATES", {}))
+    return config
+
+
+def encode_event(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+def update_event(screener_key, entry):
+    """The ``update`` event for ``entry``'s run: what changed since the run before it."""
+    data = changes.payload(entry, entry.get("previous_run_id"), entry.get("delta") or changes.EMPTY)
+    data.update(
+        run=entry_version(entry),
+        screener=screener_key,
+        fetched_at=entry["fetched_at"],
+        stale=bool(entry.get("stale")),
+    )
+    return encode_event("update", data, data["run"])
+
+
+class Subscriber:
+    def __init__(self, keys, size):
+        self.keys = keys
+        self.queue = asyncio.Queue(size)
+        self.dropped = 0
+
+    def offer(self, screener_key, message):
+        """Queue ``message``, dropping the oldest queued event if the client is behind."""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            metrics.inc("live_events_dropped_total", screener=screener_key)
+        self.queue.put_nowait(message)
+
+
+class Hub:
+    """Watchers and subscribers of one event loop."""
+
+    def __init__(self, config=None):
+        self.config = config or get_config()
+        # screener key -> set of Subscriber
+        self.subscribers = {}
+        # screener key -> watcher task
+        self.watchers = {}
+        # screener key -> the last update event, for new subscribers
+        self.latest = {}
+
+    def subscribe(self, screeners):
+        """Subscribe to ``screeners`` (key -> condition), starting their watchers as needed."""
+        subscriber = Subscriber(list(screeners), self.config["QUEUE_SIZE"])
+        for key, condition in screeners.items():
+            self.subscribers.setdefault(key, set()).add(subscriber)
+            if key in self.latest:
+                subscriber.offer(key, self.latest[key])
+            if key not in self.watchers:
+                self.watchers[key] = asyncio.create_task(self._watch(key, condition))
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        # Watchers notice they have no subscribers left and stop themselves,
+        # so a refresh in progress is never cancelled.
+        for key in subscriber.keys:
+            subscribers = self.subscribers.get(key)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self.subscribers[key]
+
+    def publish(self, screener_key, message):
+        self.latest[screener_key] = message
+        for subscriber in list(self.subscribers.get(screener_key, ())):
+            subscriber.offer(screener_key, message)
+
+    async def _watch(self, screener_key, condition):
+        seen = None
+        while self.subscribers.get(screener_key):
+            try:
+                entry = await aget_screener_result(screener_key, condition)
+            except Exception as e:
+                logger.warning("Live update of %s failed: %s", screener_key, e)
+            else:
+                if entry_version(entry) != seen:
+                    seen = entry_version(entry)
+                    self.publish(screener_key, update_event(screener_key, entry))
+            await asyncio.sleep(self.config["POLL_INTERVAL"])
+        del self.watchers[screener_key]
+        self.latest.pop(screener_key, None)
+
+    async def events(self, screeners):
+        """The event stream of one client subscribed to ``screeners``."""
+        subscriber = self.subscribe(screeners)
+        try:
+            yield f"retry: {self.config['RETRY']}\n\n".encode("ascii")
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), self.config["KEEPALIVE"])
+                except asyncio.TimeoutError:
+                    message = b": keepalive\n\n"
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub():
+    """The ``Hub`` of the running event loop (asyncio tasks cannot be shared between loops)."""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = Hub()
+    return hub
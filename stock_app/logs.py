@@ -0,0 +1,43 @@
+"""
+Structured (JSON lines) logging.
+
+``settings.LOGGING`` routes records through ``RequestContextFilter``, which
+adds the id of the request being served and the screener it is about.
+``JsonFormatter`` then writes each record as one JSON object, including
+any ``extra=`` fields, so a request's lines can be found by ``request_id``
+and slow requests grouped by ``screener``.
+"""
+import json
+import logging
+from datetime import datetime, timezone
+
+from . import metrics
+from .middleware import current_request_id
+
+# Attributes every LogRecord has; anything else came in through ``extra``.
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class RequestContextFilter(logging.Filter):
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            record.request_id = current_request_id()
+        if not hasattr(record, "screener"):
+            record.screener = metrics.current_screener() or None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and key not in payload:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
@@ -0,0 +1,120 @@
+"""
+Replay a screener over past trading days on the local OHLCV store.
+
+Each day in the range is scanned as of its close (no later bar is read)
+in chunked sweeps across a process pool (``stock_app.engine.backtest``).
+Prints forward-return statistics for each horizon against the universe;
+``--hits`` writes every day's hit list with the symbols' forward returns.
+
+    python manage.py backtest_screener vcp_minervini --start 2022-01-01
+    python manage.py backtest_screener vcp_minervini --horizons 5,20 --hits hits.csv
+    python manage.py backtest_screener vcp_minervini --json
+"""
+import csv
+import json
+import os
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from stock_app import engine
+from stock_app.engine.backtest import DEFAULT_HORIZONS
+from stock_app.screeners import SCREENER_CONDITIONS
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Dates are YYYY-MM-DD, got {value!r}")
+
+
+def _horizons(value):
+    try:
+        horizons = sorted({int(h) for h in value.split(",") if h.strip()})
+    except ValueError:
+        raise CommandError(f"Horizons are trading days, e.g. 5,20,60; got {value!r}")
+    if not horizons or horizons[0] < 1:
+        raise CommandError("Horizons must be positive")
+    return horizons
+
+
+def _pct(value):
+    return "-" if value is None else f"{value * 100:.2f}%"
+
+
+class Command(BaseCommand):
+    help = "Backtest a screener on the local OHLCV store: daily hits and forward returns."
+
+    def add_arguments(self, parser):
+        parser.add_argument("screener", help="Screener key, e.g. vcp_minervini.")
+        parser.add_argument("--start", help="First day (YYYY-MM-DD; default a year before --end).")
+        parser.add_argument("--end", help="Last day (YYYY-MM-DD; default the last stored day).")
+        parser.add_argument("--horizons", default=",".join(map(str, DEFAULT_HORIZONS)),
+                            help="Forward-return horizons in trading days (default %(default)s).")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="Processes to spread the days over (default %(default)s).")
+        parser.add_argument("--chunk-days", type=int,
+                            help="Days per sweep (default: the range split evenly across workers).")
+        parser.add_argument("--hits", help="Write each day's hits with forward returns to this CSV.")
+        parser.add_argument("--json", action="store_true", help="Print the statistics as JSON.")
+
+    def handle(self, *args, **options):
+        screener = SCREENER_CONDITIONS.get(options["screener"])
+        if screener is None:
+            raise CommandError(f"Unknown screener: {options['screener']}")
+        horizons = _horizons(options["horizons"])
+        try:
+            node = engine.compile_clause(screener["condition"]["scan_clause"])
+            panel = engine.get_panel()
+        except (engine.ClauseSyntaxError, engine.UnsupportedClause) as e:
+            raise CommandError(str(e))
+        if not len(panel.dates):
+            raise CommandError("The OHLCV store has no days yet")
+
+        end = _date(options["end"]) if options["end"] else panel.dates[-1].item()
+        start = _date(options["start"]) if options["start"] else end - timedelta(days=365)
+        started = time.perf_counter()
+        try:
+            result = engine.backtest(node, panel, start, end, horizons, options["workers"], options["chunk_days"])
+        except (ValueError, engine.UnsupportedClause, engine.StoreError) as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        if options["hits"]:
+            self.write_hits(options["hits"], result)
+        stats = result.stats()
+        stats["screener"] = options["screener"]
+        stats["elapsed_s"] = round(elapsed, 2)
+        if options["json"]:
+            self.stdout.write(json.dumps(stats, indent=2))
+            return
+
+        self.stdout.write(
+            f"{screener['name']}: {stats['start']} to {stats['end']}, {stats['days']} days in {elapsed:.1f}s\n"
+            f"  {stats['hits']} hits on {stats['days_with_hits']} days "
+            f"({stats['mean_hits_per_day']} per day, {stats['symbols']} symbols)"
+        )
+        self.stdout.write(f"  {'horizon':>8} {'signals':>8} {'mean':>8} {'median':>8} {'win':>8} "
+                          f"{'universe':>9} {'excess':>8}")
+        for horizon, row in stats["horizons"].items():
+            self.stdout.write(
+                f"  {str(horizon) + 'd':>8} {row['signals']:>8} {_pct(row['mean']):>8} {_pct(row['median']):>8} "
+                f"{_pct(row['win_rate']):>8} {_pct(row['universe']):>9} {_pct(row['excess']):>8}"
+            )
+
+    def write_hits(self, path, result):
+        panel = result.panel
+        row_of = {symbol: i for i, symbol in enumerate(panel.symbols)}
+        with open(path, "w", newline="") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(["date", "rank", "symbol", "percent_change", "close", "volume"]
+                            + [f"return_{h}d" for h in result.horizons])
+            for j, _ in result.hit_days():
+                day = result.dates[j]
+                for row in engine.matched_rows(panel, result.hits[:, j], day):
+                    returns = [result.returns[h][row_of[row.stock_name], j] for h in result.horizons]
+                    writer.writerow([day, row.rank, row.stock_name, row.percent_change, row.current_price,
+                                     row.trade_volume] + ["" if np.isnan(r) else round(float(r), 6) for r in returns])
@@ -0,0 +1,142 @@
+"""
+Append one trading day of end-of-day bars to the local OHLCV store.
+
+Reads an NSE bhavcopy CSV (the classic ``cmDDMMMYYYYbhav.csv`` or the
+UDiFF ``BhavCopy_NSE_CM_...csv`` layout) and appends it as a new day; history
+is never rewritten. Market caps (crores) can be given per symbol. Symbols
+without one carry the previous day's value forward, scaled by their change
+in close. Corporate actions are recorded separately and applied when the
+store is read. Weekly/monthly/... bars are updated along with each day;
+``--rebuild-bars`` recomputes them from the daily bars.
+
+    python manage.py ingest_eod cm02JAN2025bhav.csv
+    python manage.py ingest_eod bhav.csv --market-cap mcap.csv
+    python manage.py ingest_eod --actions actions.csv      # symbol,ex_date,ratio
+    python manage.py ingest_eod --rebuild-bars
+"""
+import csv
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from stock_app.engine import StoreError, get_store
+
+# store field -> accepted column names, classic bhavcopy first
+COLUMNS = {
+    "symbol": ("SYMBOL", "TckrSymb"),
+    "series": ("SERIES", "SctySrs"),
+    "open": ("OPEN", "OpnPric"),
+    "high": ("HIGH", "HghPric"),
+    "low": ("LOW", "LwPric"),
+    "close": ("CLOSE", "ClsPric"),
+    "volume": ("TOTTRDQTY", "TtlTradgVol"),
+    "date": ("TIMESTAMP", "TradDt"),
+}
+DATE_FORMATS = ("%d-%b-%Y", "%Y-%m-%d", "%d-%m-%Y", "%d %b %Y")
+DEFAULT_SERIES = ("EQ", "BE", "BZ")
+
+
+def parse_date(value):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt).date()
+        except ValueError:
+            continue
+    raise CommandError(f"Unrecognised date: {value!r}")
+
+
+def _column(row, field):
+    for name in COLUMNS[field]:
+        if name in row:
+            return row[name].strip()
+    return None
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def read_bhavcopy(path, series=DEFAULT_SERIES):
+    """``(trading day, {symbol: {field: value}})`` from a bhavcopy file."""
+    days = set()
+    bars = {}
+    with open(path, newline="") as fh:
+        reader = csv.DictReader(fh)
+        reader.fieldnames = [name.strip() for name in reader.fieldnames or []]
+        for row in reader:
+            symbol = _column(row, "symbol")
+            if not symbol or (series and _column(row, "series") not in series):
+                continue
+            day = _column(row, "date")
+            if day:
+                days.add(day)
+            bars[symbol] = {
+                field: _number(_column(row, field))
+                for field in ("open", "high", "low", "close", "volume")
+            }
+    if len(days) > 1:
+        raise CommandError(f"{path} holds more than one trading day: {sorted(days)}")
+    return (parse_date(days.pop()) if days else None), bars
+
+
+def read_pairs(path, columns):
+    with open(path, newline="") as fh:
+        return [dict(zip(columns, row)) for row in csv.reader(fh) if row and not row[0].startswith("#")]
+
+
+class Command(BaseCommand):
+    help = "Append a day of NSE end-of-day bars to the local OHLCV store."
+
+    def add_arguments(self, parser):
+        parser.add_argument("bhavcopy", nargs="?", help="Bhavcopy CSV for one trading day.")
+        parser.add_argument("--date", help="Trading day (YYYY-MM-DD) if the file has no date column.")
+        parser.add_argument("--series", action="append",
+                            help=f"Series to keep (repeatable; default {', '.join(DEFAULT_SERIES)}).")
+        parser.add_argument("--market-cap", help="CSV of symbol,market cap in crores.")
+        parser.add_argument("--actions", help="CSV of symbol,ex_date,ratio corporate actions to record.")
+        parser.add_argument("--rebuild-bars", action="store_true",
+                            help="Recompute the weekly/monthly/quarterly/yearly bars from the daily bars.")
+
+    def handle(self, *args, **options):
+        if not options["bhavcopy"] and not options["actions"] and not options["rebuild_bars"]:
+            raise CommandError("Give a bhavcopy file, --actions or --rebuild-bars.")
+        store = get_store()
+
+        if options["rebuild_bars"]:
+            if not store.exists():
+                raise CommandError(f"No OHLCV store at {store.path}")
+            store.rebuild_bars()
+            self.stdout.write(f"Rebuilt bars for {len(store.dates())} days")
+
+        if options["actions"]:
+            actions = read_pairs(options["actions"], ("symbol", "ex_date", "ratio"))
+            actions = [a for a in actions if a["symbol"].lower() != "symbol"]
+            try:
+                store.add_actions(actions)
+            except (KeyError, ValueError) as e:
+                raise CommandError(f"Bad corporate action: {e}")
+            self.stdout.write(f"Recorded {len(actions)} corporate actions")
+
+        if not options["bhavcopy"]:
+            return
+        day, bars = read_bhavcopy(options["bhavcopy"], tuple(options["series"] or DEFAULT_SERIES))
+        if options["date"]:
+            day = parse_date(options["date"])
+        if day is None:
+            raise CommandError("The file has no date column; pass --date.")
+        if not bars:
+            raise CommandError("No bars found (check --series).")
+
+        if options["market_cap"]:
+            for pair in read_pairs(options["market_cap"], ("symbol", "market_cap")):
+                if pair["symbol"] in bars:
+                    bars[pair["symbol"]]["market_cap"] = _number(pair.get("market_cap"))
+
+        try:
+            store.append_day(day, bars)
+        except StoreError as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"Stored {len(bars)} symbols for {day} in {store.path}")
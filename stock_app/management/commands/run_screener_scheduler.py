@@ -0,0 +1,193 @@
+"""
+Keep every screener's cached result warm so page loads never wait on Chartink.
+
+Each screener is rescanned shortly before its cache entry would go stale:
+by default at ``REFRESH_FACTOR`` x its TTL for the current market phase
+(see ``settings.SCREENER_CACHE``), or at a fixed interval from
+``settings.SCREENER_SCHEDULE["INTERVALS"]``. Scans run on a bounded thread
+pool and every next run time gets random jitter so the catalogue does not
+hit Chartink in lockstep. Screeners on the local engine are not jittered:
+whichever are due together are rescanned as one shared batch
+(``stock_app.engine.batch``).
+
+When the market phase changes, due times are re-derived from each
+screener's last run with the new phase's TTL, so the short open-market TTL
+applies from 09:15 rather than once the pre-open interval runs out. Nothing
+is scanned on weekends or ``settings.NSE_HOLIDAYS``; due screeners wait for
+the next session.
+
+Recorded runs older than ``RETENTION_DAYS`` are pruned every
+``PRUNE_INTERVAL`` seconds (and after ``--once``), keeping the latest run
+of each screener.
+
+    python manage.py run_screener_scheduler
+    python manage.py run_screener_scheduler --once --screener epo_intraday
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from stock_app.market import is_trading_day, market_phase, now_ist
+from stock_app.models import SOURCE_LOCAL, ScreenerRun
+from stock_app.scans import refresh_local_screeners, refresh_screener, screener_source
+from stock_app.screener_cache import screener_cache
+from stock_app.screeners import SCREENER_CONDITIONS
+
+DEFAULTS = {
+    "MAX_WORKERS": 4,
+    "JITTER": 10,
+    "REFRESH_FACTOR": 0.9,
+    # Fixed cadences in seconds, e.g. {"epo_intraday": 60}.
+    "INTERVALS": {},
+    # Days of run history to keep; None keeps everything.
+    "RETENTION_DAYS": 30,
+    "PRUNE_INTERVAL": 60 * 60,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "SCREENER_SCHEDULE", {}))
+    return config
+
+
+class Command(BaseCommand):
+    help = "Rescan all screeners on a market-aware cadence and keep the shared cache warm."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--screener", action="append", dest="screeners",
+                            help="Only schedule this screener key (repeatable).")
+        parser.add_argument("--workers", type=int, help="Maximum concurrent scans.")
+        parser.add_argument("--jitter", type=float, help="Maximum random delay added to each run, in seconds.")
+        parser.add_argument("--once", action="store_true", help="Scan every screener once and exit.")
+
+    def handle(self, *args, **options):
+        self.config = get_config()
+        if options["workers"]:
+            self.config["MAX_WORKERS"] = options["workers"]
+        if options["jitter"] is not None:
+            self.config["JITTER"] = options["jitter"]
+
+        keys = options["screeners"] or list(SCREENER_CONDITIONS)
+        unknown = [k for k in keys if k not in SCREENER_CONDITIONS]
+        if unknown:
+            raise CommandError(f"Unknown screener(s): {', '.join(unknown)}")
+
+        with ThreadPoolExecutor(max_workers=self.config["MAX_WORKERS"]) as pool:
+            if options["once"]:
+                done = self.run_batch(keys)
+                list(pool.map(self.run_screener, [key for key in keys if key not in done]))
+                self.prune()
+                return
+            self.loop(pool, keys)
+
+    def interval_for(self, key, now=None):
+        interval = self.config["INTERVALS"].get(key)
+        if interval is None:
+            interval = screener_cache.ttl_for(key, now) * self.config["REFRESH_FACTOR"]
+        return interval
+
+    def jitter(self, key):
+        if screener_source(key) == SOURCE_LOCAL:
+            return 0
+        return random.uniform(0, self.config["JITTER"])
+
+    def loop(self, pool, keys):
+        self.start(keys)
+        self.stdout.write(f"Scheduling {len(keys)} screeners ({self.phase} market)")
+        while True:
+            self.tick(pool)
+            time.sleep(1)
+
+    def start(self, keys):
+        clock = now_ist()
+        now = clock.timestamp()
+        self.phase = market_phase(clock)
+        self.next_run = {key: now + self.jitter(key) for key in keys}
+        self.last_run = {}
+        self.running = {}
+        self.prune_at = now
+
+    def tick(self, pool):
+        """Prune if due, reschedule finished scans and submit the ones now due."""
+        clock = now_ist()
+        now = clock.timestamp()
+        if now >= self.prune_at:
+            self.prune()
+            self.prune_at = now + self.config["PRUNE_INTERVAL"]
+        for key, future in list(self.running.items()):
+            if future.done():
+                del self.running[key]
+                self.last_run[key] = now
+                self.next_run[key] = now + self.interval_for(key, clock) + self.jitter(key)
+
+        phase = market_phase(clock)
+        if phase != self.phase:
+            # Due times above used the old phase's TTL; a shorter one now
+            # applies from the last run instead.
+            self.phase = phase
+            self.stdout.write(f"Market phase: {phase}")
+            for key, ran_at in self.last_run.items():
+                if key not in self.running:
+                    at = ran_at + self.interval_for(key, clock) + self.jitter(key)
+                    self.next_run[key] = min(self.next_run[key], at)
+        if not is_trading_day(clock.date()):
+            return
+
+        due = [key for key, at in self.next_run.items() if at <= now and key not in self.running]
+        local = [key for key in due if screener_source(key) == SOURCE_LOCAL]
+        if len(local) > 1:
+            batch = pool.submit(self.run_batch_then_rest, local)
+            self.running.update(dict.fromkeys(local, batch))
+        for key in due:
+            if key not in self.running:
+                self.running[key] = pool.submit(self.run_screener, key)
+
+    def prune(self):
+        days = self.config["RETENTION_DAYS"]
+        if days is None:
+            return
+        try:
+            deleted = ScreenerRun.objects.prune(timezone.now() - timedelta(days=days))
+        except Exception as e:
+            self.stderr.write(f"prune: {e.__class__.__name__}: {e}")
+            return
+        if deleted:
+            self.stdout.write(f"Pruned {deleted} runs older than {days} days")
+
+    def run_batch(self, keys):
+        """Rescan the local-engine screeners among ``keys`` together; returns those done."""
+        started = time.monotonic()
+        try:
+            entries = refresh_local_screeners({key: SCREENER_CONDITIONS[key]["condition"] for key in keys})
+        except Exception as e:
+            self.stderr.write(f"local batch: {e.__class__.__name__}: {e}")
+            return set()
+        elapsed = time.monotonic() - started
+        for key, entry in entries.items():
+            self.stdout.write(f"{key}: {len(entry['rows'])} rows")
+        if entries:
+            self.stdout.write(f"{len(entries)} local screeners in {elapsed:.2f}s")
+        return set(entries)
+
+    def run_batch_then_rest(self, keys):
+        done = self.run_batch(keys)
+        for key in keys:
+            if key not in done:
+                self.run_screener(key)
+
+    def run_screener(self, key):
+        condition = SCREENER_CONDITIONS[key]["condition"]
+        started = time.monotonic()
+        try:
+            entry = refresh_screener(key, condition)
+        except Exception as e:
+            self.stderr.write(f"{key}: {e.__class__.__name__}: {e}")
+            return
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"{key}: {len(entry['rows'])} rows in {elapsed:.2f}s")
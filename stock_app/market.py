@@ -0,0 +1,48 @@
+"""
+NSE session helpers.
+
+All times are in Asia/Kolkata. The market phase drives cache lifetimes:
+results go stale quickly while the cash market is trading and stay
+valid for hours once it has closed.
+"""
+from datetime import date, datetime, time
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+
+IST = ZoneInfo('Asia/Kolkata')
+
+PRE_OPEN_START = time(9, 0)
+MARKET_OPEN = time(9, 15)
+MARKET_CLOSE = time(15, 30)
+
+PHASE_PRE_OPEN = "pre_open"
+PHASE_OPEN = "open"
+PHASE_CLOSED = "closed"
+
+
+def now_ist():
+    return datetime.now(IST)
+
+
+def nse_holidays():
+    """Exchange holidays from ``settings.NSE_HOLIDAYS`` (ISO date strings)."""
+    return {date.fromisoformat(d) for d in getattr(settings, "NSE_HOLIDAYS", [])}
+
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in nse_holidays()
+
+
+def market_phase(now=None):
+    """Return the NSE session phase ("pre_open", "open" or "closed") at ``now``."""
+    now = (now or now_ist()).astimezone(IST)
+    if not is_trading_day(now.date()):
+        return PHASE_CLOSED
+
+    t = now.time()
+    if PRE_OPEN_START <= t < MARKET_OPEN:
+        return PHASE_PRE_OPEN
+    if MARKET_OPEN <= t < MARKET_CLOSE:
+        return PHASE_OPEN
+    return PHASE_CLOSED
@@ -0,0 +1,254 @@
+"""
+Request and upstream metrics in the Prometheus text format.
+
+Histograms and counters are kept in memory per process and labelled with
+the screener being served, which the scan pipeline sets with
+``screener(key)`` (a context variable, so it follows the request through
+threads handed work by ``sync_to_async`` and through async tasks).
+
+Gunicorn runs several workers, and a scrape reaches only one of them. With
+``settings.METRICS_DIR`` set, a background thread in each process writes
+its values to ``<pid>.json`` there every ``METRICS_FLUSH_INTERVAL``
+seconds, so requests never wait on the disk, and ``render()`` sums the
+files of every live process. Files left by workers that have exited are
+deleted at the next scrape. Without ``METRICS_DIR`` each process reports
+only its own values.
+"""
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+ROW_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# name -> (type, help, label names, buckets)
+METRICS = {
+    "http_request_duration_seconds": (
+        "histogram", "Time to serve a request, by view.", ("view", "method", "status", "screener"), LATENCY_BUCKETS,
+    ),
+    "screener_stage_duration_seconds": (
+        "histogram", "Time spent in each stage of producing a screener result.", ("screener", "stage"),
+        LATENCY_BUCKETS,
+    ),
+    "screener_rows": ("histogram", "Rows returned by a scan.", ("screener", "source"), ROW_BUCKETS),
+    "screener_cache_requests_total": (
+        "counter", "Screener result lookups by outcome (hit, stale, miss, fallback).", ("screener", "result"), None,
+    ),
+    "screener_errors_total": ("counter", "Failed scans by exception class.", ("screener", "error"), None),
+    "live_events_dropped_total": (
+        "counter", "Live update events dropped for subscribers that fell behind.", ("screener",), None,
+    ),
+}
+
+_screener = contextvars.ContextVar("screener", default="")
+
+
+def current_screener():
+    return _screener.get()
+
+
+@contextmanager
+def screener(key):
+    """Label the metrics recorded inside the block with screener ``key``."""
+    token = _screener.set(key or "")
+    try:
+        yield
+    finally:
+        _screener.reset(token)
+
+
+def _label_key(name, labels):
+    names = METRICS[name][2]
+    if "screener" in names and "screener" not in labels:
+        labels = dict(labels, screener=current_screener())
+    return json.dumps([str(labels.get(label, "")) for label in names])
+
+
+def _alive(pid):
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _flush_loop(ref, interval):
+    # Holds the registry weakly so the thread ends along with it.
+    while True:
+        time.sleep(interval)
+        registry = ref()
+        if registry is None:
+            return
+        try:
+            registry.flush()
+        except OSError:
+            pass  # Try again at the next interval.
+        del registry
+
+
+class Registry:
+    def __init__(self, directory=None, flush_interval=5):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        # name -> {label key: value}, a histogram value being
+        # [count per bucket..., +Inf count, sum]
+        self.values = {name: {} for name in METRICS}
+        self._flusher = None
+
+    def _owned(self):
+        if os.getpid() != self.pid:
+            # Forked (gunicorn --preload): the parent's values are its own.
+            self._reset()
+
+    def observe(self, name, value, **labels):
+        _, _, _, buckets = METRICS[name]
+        key = _label_key(name, labels)
+        with self._lock:
+            self._owned()
+            series = self.values[name].get(key)
+            if series is None:
+                series = self.values[name][key] = [0] * (len(buckets) + 1) + [0.0]
+            series[bisect.bisect_left(buckets, value)] += 1
+            series[-1] += value
+        self._maybe_flush()
+
+    def inc(self, name, amount=1, **labels):
+        key = _label_key(name, labels)
+        with self._lock:
+            self._owned()
+            self.values[name][key] = self.values[name].get(key, 0) + amount
+        self._maybe_flush()
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def stage(self, stage):
+        """Time a stage of the current screener's scan."""
+        return self.timer("screener_stage_duration_seconds", stage=stage)
+
+    # -- sharing between processes --
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def _maybe_flush(self):
+        if not self.directory or self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=_flush_loop, args=(weakref.ref(self), self.flush_interval),
+                    name="metrics-flush", daemon=True,
+                )
+                self._flusher.start()
+
+    def flush(self):
+        if not self.directory:
+            return
+        with self._lock:
+            self._owned()
+            data = json.dumps(self.values)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self._path(f"{self.pid}.tmp")
+        with open(tmp, "w") as fh:
+            fh.write(data)
+        os.replace(tmp, self._path(self.pid))
+
+    def collect(self):
+        """Every process's values, summed."""
+        if not self.directory:
+            with self._lock:
+                self._owned()
+                return json.loads(json.dumps(self.values))
+        self.flush()
+        total = {name: {} for name in METRICS}
+        for filename in os.listdir(self.directory):
+            pid = filename.split(".")[0]
+            if pid.isdigit() and int(pid) != self.pid and not _alive(int(pid)):
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+                continue
+            if not filename.endswith(".json") or ".tmp" in filename:
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as fh:
+                    values = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            for name, series in values.items():
+                if name not in total:
+                    continue
+                for key, value in series.items():
+                    have = total[name].get(key)
+                    if have is None:
+                        total[name][key] = value
+                    elif isinstance(value, list):
+                        total[name][key] = [a + b for a, b in zip(have, value)]
+                    else:
+                        total[name][key] = have + value
+        return total
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        values = self.collect()
+        lines = []
+        for name, (kind, help_text, label_names, buckets) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(values[name].items()):
+                labels = list(zip(label_names, json.loads(key)))
+                if kind == "counter":
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ["+Inf"], value[:-1]):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else _number(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(value[-1])}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry(getattr(settings, "METRICS_DIR", None), getattr(settings, "METRICS_FLUSH_INTERVAL", 5))
+observe = registry.observe
+inc = registry.inc
+timer = registry.timer
+stage = registry.stage
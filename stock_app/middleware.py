@@ -0,0 +1,112 @@
+"""
+Per-request telemetry.
+
+``RequestTelemetryMiddleware`` gives every request an id, the incoming
+``X-Request-ID`` if there is one, and returns it in the same header. Log
+records made while serving the request carry the id (``stock_app.logs``).
+The middleware labels the request's metrics with the screener it is
+about (the ``screener_key`` URL argument or the ``screener_name``
+parameter; anything not in the registry is ``"other"``, so clients cannot
+create metric series at will) and records its duration in ``http_request_duration_seconds``
+and one JSON access log line.
+"""
+import contextvars
+import logging
+import re
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.urls import Resolver404, resolve
+
+from . import metrics
+from .screeners import SCREENER_KEYS
+
+logger = logging.getLogger("stock_app.requests")
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Incoming ids are trusted only if they look like ids.
+REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+FORM_CONTENT_TYPES = ("application/x-www-form-urlencoded", "multipart/form-data")
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def _request_context(request):
+    """``(request id, view name, screener key)`` for ``request``."""
+    incoming = request.headers.get(REQUEST_ID_HEADER, "")
+    request_id = incoming if REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return request_id, "unmatched", ""
+    screener = match.kwargs.get("screener_key") or request.GET.get("screener_name", "")
+    if not screener and request.method == "POST" and request.content_type in FORM_CONTENT_TYPES:
+        screener = request.POST.get("screener_name", "")
+    if screener and screener not in SCREENER_KEYS:
+        screener = "other"
+    return request_id, match.url_name or match.view_name, screener
+
+
+class RequestTelemetryMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        request_id, view, screener = _request_context(request)
+        token = _request_id.set(request_id)
+        started = time.perf_counter()
+        status = 500
+        try:
+            with metrics.screener(screener):
+                response = self.get_response(request)
+            status = response.status_code
+        finally:
+            self._finish(token, request, view, screener, status, started)
+        response[REQUEST_ID_HEADER] = request_id
+        return response
+
+    async def __acall__(self, request):
+        request_id, view, screener = _request_context(request)
+        token = _request_id.set(request_id)
+        started = time.perf_counter()
+        status = 500
+        try:
+            with metrics.screener(screener):
+                response = await self.get_response(request)
+            status = response.status_code
+        finally:
+            self._finish(token, request, view, screener, status, started)
+        response[REQUEST_ID_HEADER] = request_id
+        return response
+
+    @staticmethod
+    def _finish(token, request, view, screener, status, started):
+        elapsed = time.perf_counter() - started
+        metrics.observe(
+            "http_request_duration_seconds", elapsed,
+            view=view, method=request.method if request.method in METHODS else "other",
+            status=status, screener=screener,
+        )
+        logger.info(
+            "%s %s %s", request.method, request.path, status,
+            extra={
+                "view": view, "screener": screener, "status": status,
+                "duration_ms": round(elapsed * 1000, 1),
+            },
+        )
+        _request_id.reset(token)
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.4 on 2026-10-18 17:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScreenerRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('screener', models.CharField(max_length=64)),
+                ('condition_hash', models.CharField(max_length=16)),
+                ('run_time', models.DateTimeField()),
+                ('row_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['screener', 'run_time'], name='stock_app_s_screene_0dad66_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScreenerHit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('screener', models.CharField(max_length=64)),
+                ('run_time', models.DateTimeField()),
+                ('symbol', models.CharField(max_length=32)),
+                ('rank', models.PositiveIntegerField()),
+                ('percent_change', models.FloatField(null=True)),
+                ('close', models.FloatField(null=True)),
+                ('volume', models.BigIntegerField(null=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hits', to='stock_app.screenerrun')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['screener', 'run_time'], name='stock_app_s_screene_625a2f_idx'), models.Index(fields=['symbol', 'run_time'], name='stock_app_s_symbol_8a881b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-18 17:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='screenerrun',
+            name='source',
+            field=models.CharField(choices=[('chartink', 'Chartink'), ('local', 'Local engine')], default='chartink', max_length=16),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.4 on 2026-10-18 17:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock_app', '0002_screenerrun_source'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='screenerrun',
+            name='delta',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='screenerrun',
+            name='previous',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='stock_app.screenerrun'),
+        ),
+    ]
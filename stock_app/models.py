@@ -1,3 +1,141 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import OuterRef, Subquery
 
-# Create your models here.
+from . import changes
+from .rows import StockRow
+
+SOURCE_CHARTINK = "chartink"
+SOURCE_LOCAL = "local"
+SOURCE_CHOICES = [
+    (SOURCE_CHARTINK, "Chartink"),
+    (SOURCE_LOCAL, "Local engine"),
+]
+
+
+class ScreenerRunQuerySet(models.QuerySet):
+    def latest_for(self, screener, condition_hash):
+        return (
+            self.filter(screener=screener, condition_hash=condition_hash)
+            .order_by("-run_time")
+            .first()
+        )
+
+    def ranks(self, screener, run_id):
+        """``{symbol: rank}`` of run ``run_id`` of ``screener``, or ``None`` if there is none."""
+        if not self.filter(pk=run_id, screener=screener).exists():
+            return None
+        return dict(ScreenerHit.objects.filter(run_id=run_id).values_list("symbol", "rank"))
+
+    @transaction.atomic
+    def record(self, screener, condition_hash, rows, run_time, source=SOURCE_CHARTINK):
+        """
+        Store one scan and its hits; ``rows`` are ``StockRow`` objects. The
+        run keeps its delta from the previous run of the same condition.
+        """
+        previous = self.latest_for(screener, condition_hash)
+        delta = None
+        if previous is not None:
+            delta = changes.diff(self.ranks(screener, previous.pk), changes.ranks(rows))
+        run = self.create(
+            screener=screener,
+            condition_hash=condition_hash,
+            run_time=run_time,
+            row_count=len(rows),
+            source=source,
+            previous=previous,
+            delta=delta,
+        )
+        ScreenerHit.objects.bulk_create(
+            [ScreenerHit.from_row(run, row) for row in rows],
+            batch_size=1000,
+        )
+        return run
+
+    def prune(self, before):
+        """
+        Delete runs recorded before ``before`` and their hits, except the
+        latest run of each screener and condition, which is still served
+        after a cache flush. Returns the number of runs deleted.
+        """
+        latest = (
+            ScreenerRun.objects.filter(screener=OuterRef("screener"), condition_hash=OuterRef("condition_hash"))
+            .order_by("-run_time")
+            .values("pk")[:1]
+        )
+        old = self.filter(run_time__lt=before).exclude(pk=Subquery(latest))
+        # One DELETE for the hits instead of collecting them for the cascade.
+        ScreenerHit.objects.filter(run__in=old.values("pk")).delete()
+        return old.delete()[1].get(ScreenerRun._meta.label, 0)
+
+
+class ScreenerRun(models.Model):
+    screener = models.CharField(max_length=64)
+    condition_hash = models.CharField(max_length=16)
+    run_time = models.DateTimeField()
+    row_count = models.PositiveIntegerField(default=0)
+    source = models.CharField(max_length=16, choices=SOURCE_CHOICES, default=SOURCE_CHARTINK)
+    # The run before this one and what changed since (stock_app.changes);
+    # both empty for the first run of a condition.
+    previous = models.ForeignKey("self", null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    delta = models.JSONField(null=True, blank=True)
+
+    objects = ScreenerRunQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["screener", "run_time"]),
+        ]
+
+    def __str__(self):
+        return f"{self.screener} @ {self.run_time:%Y-%m-%d %H:%M}"
+
+    def rows(self):
+        return [hit.as_row() for hit in self.hits.order_by("rank")]
+
+
+class ScreenerHitQuerySet(models.QuerySet):
+    def first_seen(self, symbol, screener):
+        """When ``symbol`` first appeared in ``screener`` (``None`` if never)."""
+        return (
+            self.filter(symbol=symbol, screener=screener)
+            .aggregate(first=models.Min("run_time"))["first"]
+        )
+
+
+class ScreenerHit(models.Model):
+    run = models.ForeignKey(ScreenerRun, on_delete=models.CASCADE, related_name="hits")
+    # Denormalised from the run so symbol history never needs a join.
+    screener = models.CharField(max_length=64)
+    run_time = models.DateTimeField()
+    symbol = models.CharField(max_length=32)
+    rank = models.PositiveIntegerField()
+    percent_change = models.FloatField(null=True)
+    close = models.FloatField(null=True)
+    volume = models.BigIntegerField(null=True)
+
+    objects = ScreenerHitQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["screener", "run_time"]),
+            models.Index(fields=["symbol", "run_time"]),
+        ]
+
+    def __str__(self):
+        return f"{self.symbol} in {self.screener}"
+
+    @classmethod
+    def from_row(cls, run, row):
+        return cls(
+            run=run,
+            screener=run.screener,
+            run_time=run.run_time,
+            symbol=row.stock_name,
+            rank=row.rank,
+            percent_change=row.percent_change,
+            close=row.current_price,
+            volume=row.trade_volume,
+        )
+
+    def as_row(self):
+        return StockRow(self.rank, self.symbol, self.percent_change, self.close, self.volume)
@@ -0,0 +1,312 @@
+"""
+Guards around calls to Chartink.
+
+Every request the Chartink clients make goes through one ``Upstream``:
+
+* a token bucket shared by all worker processes (a small state file under
+  an ``fcntl`` lock, like ``SingleFlight``) spaces requests out to
+  ``RATE`` per second with bursts of ``BURST``;
+* each attempt has connect/read timeouts, and the whole call, waits and
+  retries included, has a ``DEADLINE``;
+* 429s, 5xx responses, timeouts and connection errors are retried with
+  full-jitter exponential backoff (honouring ``Retry-After``) while the
+  deadline allows;
+* a circuit breaker counts calls that did not end in a 2xx or 3xx
+  response: those that still failed after their retries, got another
+  error status, raised, or found no request slot in time (``RateLimited``).
+  ``BREAKER_THRESHOLD`` of them in a row open it, and calls then fail
+  at once with ``CircuitOpen`` for ``BREAKER_RESET`` seconds before a
+  single trial call is let through.
+
+Failing fast is what keeps tail latency bounded during an incident: the
+screener cache answers a failed or refused refresh with the last good
+result, marked stale (see ``ScreenerCache.get_or_fetch``).
+"""
+import asyncio
+import logging
+import os
+import random
+import struct
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Requests per second across all workers, and the burst allowed.
+    "RATE": 2.0,
+    "BURST": 5,
+    # Seconds per attempt to connect and to wait for a response.
+    "CONNECT_TIMEOUT": 3.05,
+    "READ_TIMEOUT": 10,
+    # Retries after the first attempt, and the backoff before each.
+    "RETRIES": 2,
+    "BACKOFF_BASE": 0.5,
+    "BACKOFF_CAP": 4,
+    # Seconds a whole call (rate limit waits and retries included) may take.
+    "DEADLINE": 20,
+    "BREAKER_THRESHOLD": 5,
+    "BREAKER_RESET": 30,
+    # Directory for the shared token bucket state.
+    "STATE_DIR": None,
+}
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "CHARTINK_RESILIENCE", {}))
+    return config
+
+
+class RateLimited(Exception):
+    """No request slot is free within the call's deadline."""
+
+
+class CircuitOpen(Exception):
+    """Chartink has been failing; calls are refused for ``retry_after`` more seconds."""
+
+    def __init__(self, message, retry_after=0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    ``rate`` tokens per second up to ``burst``, shared through ``path`` by
+    every process using the same file. A token is reserved ahead when
+    none is free, so waiters are served in order without polling.
+    """
+
+    _STATE = struct.Struct("<dd")
+
+    def __init__(self, rate, burst, path=None):
+        self.rate = rate
+        self.burst = burst
+        self.path = path
+        self._lock = threading.Lock()
+        self._tokens, self._stamp = float(burst), time.time()
+
+    def reserve(self, max_wait):
+        """
+        Reserve a token and return the seconds until it is due. Nothing is
+        reserved if that would be more than ``max_wait``.
+        """
+        with self._lock:
+            if self.path is None or fcntl is None:
+                return self._reserve_local(max_wait)
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a+b") as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                fh.seek(0)
+                raw = fh.read(self._STATE.size)
+                state = self._STATE.unpack(raw) if len(raw) == self._STATE.size else (float(self.burst), time.time())
+                wait, state = self._take(state, max_wait)
+                fh.seek(0)
+                fh.truncate()
+                fh.write(self._STATE.pack(*state))
+                return wait
+
+    def _reserve_local(self, max_wait):
+        wait, (self._tokens, self._stamp) = self._take((self._tokens, self._stamp), max_wait)
+        return wait
+
+    def _take(self, state, max_wait):
+        tokens, stamp = state
+        now = time.time()
+        tokens = min(float(self.burst), tokens + max(now - stamp, 0) * self.rate) - 1
+        wait = -tokens / self.rate if tokens < 0 else 0.0
+        if wait > max_wait:
+            # Leave the bucket as it was: this caller gives up.
+            return wait, state
+        return wait, (tokens, now)
+
+    def acquire(self, max_wait):
+        wait = self.reserve(max_wait)
+        if wait > max_wait:
+            raise RateLimited(f"No Chartink request slot within {max_wait:.1f}s")
+        if wait:
+            time.sleep(wait)
+
+    async def aacquire(self, max_wait):
+        # flock() blocks while another process holds the state file.
+        wait = await asyncio.to_thread(self.reserve, max_wait)
+        if wait > max_wait:
+            raise RateLimited(f"No Chartink request slot within {max_wait:.1f}s")
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """Per-process breaker: closed, open for ``reset_after`` seconds, then one trial call."""
+
+    def __init__(self, threshold, reset_after):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        # When the current trial call started; a trial that never reports
+        # back (cancelled, rate limited) stops blocking after reset_after.
+        self._trial_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+    def before(self):
+        """Raise ``CircuitOpen`` unless a call may go ahead."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            now = time.monotonic()
+            remaining = self.opened_at + self.reset_after - now
+            if self._trial_at is not None:
+                remaining = max(remaining, self._trial_at + self.reset_after - now)
+            if remaining > 0:
+                raise CircuitOpen(f"Chartink is failing; retrying in {remaining:.0f}s", remaining)
+            self._trial_at = now
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_at = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_at is not None or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.warning("Chartink circuit opened after %d failed calls", self.failures)
+                self.opened_at = time.monotonic()
+                self._trial_at = None
+
+
+def backoff(attempt, base, cap):
+    """Full-jitter exponential backoff before retry ``attempt`` (0-based)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_after(response):
+    """Seconds from a ``Retry-After`` header, if it holds a number."""
+    try:
+        return max(float(response.headers.get("Retry-After")), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class Upstream:
+    """
+    Rate limit, timeouts, retries and circuit breaking for one upstream.
+    ``call(send)`` and ``acall(asend)`` take a function of the per-attempt
+    ``(connect, read)`` timeout that makes one request and returns its
+    response; exceptions in ``transient`` count as retryable failures.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or get_config()
+        state_dir = self.config["STATE_DIR"] or os.path.join(tempfile.gettempdir(), "stock_app_locks")
+        self.bucket = TokenBucket(self.config["RATE"], self.config["BURST"], os.path.join(state_dir, "chartink.bucket"))
+        self.breaker = CircuitBreaker(self.config["BREAKER_THRESHOLD"], self.config["BREAKER_RESET"])
+
+    def timeout(self, deadline):
+        remaining = max(deadline - time.monotonic(), 0.1)
+        return (min(self.config["CONNECT_TIMEOUT"], remaining), min(self.config["READ_TIMEOUT"], remaining))
+
+    def _retry_delay(self, attempt, response, deadline):
+        """Seconds to wait before the next attempt, or ``None`` to give up."""
+        if attempt >= self.config["RETRIES"]:
+            return None
+        if response is not None and response.status_code not in RETRY_STATUSES:
+            # Any other error status would come back the same.
+            return None
+        delay = backoff(attempt, self.config["BACKOFF_BASE"], self.config["BACKOFF_CAP"])
+        if response is not None and response.status_code == 429:
+            delay = max(delay, retry_after(response) or 0)
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def _succeeded(self, response, error):
+        if error is None and 200 <= response.status_code < 400:
+            self.breaker.success()
+            return True
+        return False
+
+    def call(self, send, transient=()):
+        self.breaker.before()
+        deadline = time.monotonic() + self.config["DEADLINE"]
+        for attempt in range(self.config["RETRIES"] + 1):
+            response = error = None
+            try:
+                self.bucket.acquire(deadline - time.monotonic())
+            except Exception:
+                self.breaker.failure()
+                raise
+            try:
+                response = send(self.timeout(deadline))
+            except transient as e:
+                error = e
+            except Exception:
+                self.breaker.failure()
+                raise
+            if self._succeeded(response, error):
+                return response
+            delay = self._retry_delay(attempt, response, deadline)
+            if delay is None:
+                break
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+        return self._failed(response, error)
+
+    async def acall(self, asend, transient=()):
+        self.breaker.before()
+        deadline = time.monotonic() + self.config["DEADLINE"]
+        for attempt in range(self.config["RETRIES"] + 1):
+            response = error = None
+            try:
+                await self.bucket.aacquire(deadline - time.monotonic())
+            except Exception:
+                self.breaker.failure()
+                raise
+            try:
+                response = await asend(self.timeout(deadline))
+            except transient as e:
+                error = e
+            except Exception:
+                self.breaker.failure()
+                raise
+            if self._succeeded(response, error):
+                return response
+            delay = self._retry_delay(attempt, response, deadline)
+            if delay is None:
+                break
+            if response is not None:
+                await response.aclose()
+            await asyncio.sleep(delay)
+        return self._failed(response, error)
+
+    def _failed(self, response, error):
+        self.breaker.failure()
+        if error is not None:
+            raise error
+        # The caller's raise_for_status reports the status.
+        return response
+
+    def stats(self):
+        return {"breaker": self.breaker.state, "failures": self.breaker.failures}
+
+
+upstream = Upstream()
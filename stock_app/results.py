@@ -0,0 +1,135 @@
+"""
+Server-side paging, sorting and filtering of a screener result.
+
+A result is an immutable snapshot (one cached/persisted run), so pages are
+addressed by an opaque cursor holding the run version and an offset. A
+cursor from an older run is rejected instead of silently mixing rows from
+two runs.
+"""
+import base64
+import json
+
+from . import changes
+from .scans import entry_version
+
+# ?sort= value -> StockRow attribute
+SORT_FIELDS = {
+    "rank": "rank",
+    "change": "percent_change",
+    "volume": "trade_volume",
+    "price": "current_price",
+}
+# ?min_<name>= / ?max_<name>= -> StockRow attribute
+FILTER_FIELDS = {
+    "rank": "rank",
+    "change": "percent_change",
+    "volume": "trade_volume",
+    "price": "current_price",
+}
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+class StaleCursor(Exception):
+    pass
+
+
+def encode_cursor(version, offset):
+    raw = json.dumps([version, offset]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor, version):
+    try:
+        cursor_version, offset = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        offset = int(offset)
+    except (ValueError, TypeError):
+        raise ValueError("Malformed cursor")
+    if offset < 0:
+        raise ValueError("Malformed cursor")
+    if cursor_version != version:
+        raise StaleCursor("Results were refreshed; restart from the first page")
+    return offset
+
+
+def parse_filters(params):
+    """``[(attr, lower, upper), ...]`` from min_*/max_* query parameters."""
+    filters = []
+    for name, attr in FILTER_FIELDS.items():
+        lower, upper = params.get(f"min_{name}"), params.get(f"max_{name}")
+        if lower is None and upper is None:
+            continue
+        try:
+            lower = float(lower) if lower not in (None, "") else None
+            upper = float(upper) if upper not in (None, "") else None
+        except ValueError:
+            raise ValueError(f"min_{name}/max_{name} must be numbers")
+        filters.append((attr, lower, upper))
+    return filters
+
+
+def parse_sort(params):
+    sort = params.get("sort", "rank")
+    descending = sort.startswith("-")
+    name = sort.lstrip("-")
+    if name not in SORT_FIELDS:
+        raise ValueError(f"Unknown sort field: {name}")
+    return SORT_FIELDS[name], descending
+
+
+def apply(rows, filters=(), sort=("rank", False)):
+    for attr, lower, upper in filters:
+        rows = [
+            row for row in rows
+            if getattr(row, attr) is not None
+            and (lower is None or getattr(row, attr) >= lower)
+            and (upper is None or getattr(row, attr) <= upper)
+        ]
+
+    attr, descending = sort
+    if attr == "rank" and not descending:
+        return list(rows)
+    # Missing values always sort last.
+    present = [row for row in rows if getattr(row, attr) is not None]
+    missing = [row for row in rows if getattr(row, attr) is None]
+    present.sort(key=lambda row: getattr(row, attr), reverse=descending)
+    return present + missing
+
+
+def query(entry, params):
+    """Rows of ``entry`` filtered and sorted per the query parameters."""
+    return apply(entry["rows"], parse_filters(params), parse_sort(params))
+
+
+def page(entry, params):
+    """
+    One page of results as a JSON-ready dict. Raises ``ValueError`` for bad
+    parameters and ``StaleCursor`` when the run has changed.
+    """
+    version = entry_version(entry)
+    rows = query(entry, params)
+
+    try:
+        limit = min(int(params.get("limit", DEFAULT_LIMIT)), MAX_LIMIT)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        # A page of no rows would hand back a cursor to the same offset.
+        raise ValueError("limit must be at least 1")
+    cursor = params.get("cursor")
+    offset = decode_cursor(cursor, version) if cursor else 0
+
+    end = offset + limit
+    new = changes.entered(entry)
+    return {
+        "run": version,
+        "total": len(rows),
+        # "new": entered the screener in this run.
+        "results": [dict(row.as_dict(), new=row.stock_name in new) for row in rows[offset:end]],
+        "next_cursor": encode_cursor(version, end) if end < len(rows) else None,
+    }
+
+
+def symbols(entry, params):
+    """Every matching symbol, for the copy-symbols actions."""
+    return [row.stock_name for row in query(entry, params)]
@@ -0,0 +1,74 @@
+"""
+Screener result rows.
+
+Chartink returns one dict per stock with a dozen keys; the app only ever
+uses five. ``normalise`` filters, renames and type-coerces them in a single
+pass into ``StockRow`` objects, which use ``__slots__`` and pickle as a
+plain tuple so cached results stay small. This replaces building a pandas
+DataFrame per request.
+"""
+
+# Chartink key -> StockRow attribute, CSV header.
+FIELDS = [
+    ("sr", "rank", "Rank"),
+    ("nsecode", "stock_name", "Stock Symbol"),
+    ("per_chg", "percent_change", "Percent Change"),
+    ("close", "current_price", "Current Price"),
+    ("volume", "trade_volume", "Trade Volume"),
+]
+CSV_HEADER = [header for _, _, header in FIELDS]
+
+
+class StockRow:
+    __slots__ = [attr for _, attr, _ in FIELDS]
+
+    def __init__(self, rank, stock_name, percent_change, current_price, trade_volume):
+        self.rank = rank
+        self.stock_name = stock_name
+        self.percent_change = percent_change
+        self.current_price = current_price
+        self.trade_volume = trade_volume
+
+    def __reduce__(self):
+        return (StockRow, self.as_tuple())
+
+    def __eq__(self, other):
+        return isinstance(other, StockRow) and self.as_tuple() == other.as_tuple()
+
+    def __repr__(self):
+        return f"StockRow({self.rank}, {self.stock_name!r})"
+
+    def as_tuple(self):
+        return (self.rank, self.stock_name, self.percent_change, self.current_price, self.trade_volume)
+
+    def as_dict(self):
+        return {
+            "rank": self.rank,
+            "stock_name": self.stock_name,
+            "percent_change": self.percent_change,
+            "current_price": self.current_price,
+            "trade_volume": self.trade_volume,
+        }
+
+
+def _coerce(value, cast):
+    if value is None or value == "":
+        return None
+    if cast is int:
+        return int(float(value))
+    return cast(value)
+
+
+def normalise(raw_rows):
+    """Yield a ``StockRow`` for every Chartink row that has all required keys."""
+    for raw in raw_rows:
+        try:
+            yield StockRow(
+                int(raw["sr"]),
+                raw["nsecode"],
+                _coerce(raw["per_chg"], float),
+                _coerce(raw["close"], float),
+                _coerce(raw["volume"], int),
+            )
+        except (KeyError, TypeError, ValueError):
+            continue
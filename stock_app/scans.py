@@ -0,0 +1,201 @@
+"""
+Screener scan pipeline shared by the views and the scheduler.
+
+A scan result is an "entry" dict::
+
+    {"rows": [StockRow, ...], "fetched_at": <epoch seconds>, "run_id": <ScreenerRun pk>,
+     "previous_run_id": <pk or None>, "delta": <changes since that run or None>}
+
+Every upstream scan is persisted as a ``ScreenerRun`` so the latest run can
+be served from the database after a cache flush or restart, and so symbol
+history can be queried later. The ``a``-prefixed coroutines are the
+async-view equivalents; only their ORM calls go through ``sync_to_async``.
+
+Each screener is scanned either on Chartink or by the local engine
+(``stock_app.engine``), per ``settings.SCREENER_SOURCES``. The scheduler
+refreshes all local screeners in one shared engine pass
+(``refresh_local_screeners``). ``as_of_result`` replays a screener on a
+past day's close with the engine, for the as-of views. The engine (and
+NumPy) is imported by the functions that use it, so workers that only
+serve Chartink screeners never load it.
+"""
+import logging
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import changes, metrics
+from .chartink import async_client as chartink_async_client, client as chartink_client
+from .market import IST, MARKET_CLOSE
+from .models import SOURCE_CHARTINK, SOURCE_LOCAL, ScreenerRun
+from .rows import normalise
+from .screener_cache import condition_hash, screener_cache
+
+logger = logging.getLogger(__name__)
+
+
+def screener_source(screener_key):
+    """"local" or "chartink" for this screener."""
+    sources = getattr(settings, "SCREENER_SOURCES", {})
+    return sources.get(screener_key, getattr(settings, "SCREENER_SOURCE", SOURCE_CHARTINK))
+
+
+def local_screener_rows(screener_key, condition):
+    """Rows from the local engine, or ``None`` if it cannot run this clause."""
+    from . import engine
+
+    try:
+        with metrics.stage("local_scan"):
+            return engine.scan_rows(condition)
+    except (engine.UnsupportedClause, engine.ClauseSyntaxError) as e:
+        logger.warning("Scanning %s on Chartink: %s", screener_key, e)
+        return None
+
+
+def fetch_screener_rows(condition):
+    data = chartink_client.scan(condition)
+    with metrics.stage("normalise"):
+        return list(normalise(data))
+
+
+def record_scan(screener_key, condition, rows, source):
+    """Record a finished scan and return its entry."""
+    metrics.observe("screener_rows", len(rows), screener=screener_key, source=source)
+    run_time = datetime.now(IST)
+    with metrics.stage("record"):
+        run = ScreenerRun.objects.record(screener_key, condition_hash(condition), rows, run_time, source)
+    return run_entry(run, rows)
+
+
+def run_entry(run, rows):
+    return {
+        "rows": rows,
+        "fetched_at": run.run_time.timestamp(),
+        "run_id": run.pk,
+        "previous_run_id": run.previous_id,
+        "delta": run.delta,
+    }
+
+
+def scan_screener(screener_key, condition):
+    """Scan now (Chartink or the local engine) and record the run."""
+    source, rows = SOURCE_LOCAL, None
+    if screener_source(screener_key) == SOURCE_LOCAL:
+        rows = local_screener_rows(screener_key, condition)
+    if rows is None:
+        source, rows = SOURCE_CHARTINK, fetch_screener_rows(condition)
+    return record_scan(screener_key, condition, rows, source)
+
+
+async def ascan_screener(screener_key, condition):
+    source, rows = SOURCE_LOCAL, None
+    if screener_source(screener_key) == SOURCE_LOCAL:
+        # CPU bound; keep it off the event loop and the shared sync thread.
+        rows = await sync_to_async(local_screener_rows, thread_sensitive=False)(screener_key, condition)
+    if rows is None:
+        data = await chartink_async_client.scan(condition)
+        with metrics.stage("normalise"):
+            source, rows = SOURCE_CHARTINK, list(normalise(data))
+    return await sync_to_async(record_scan)(screener_key, condition, rows, source)
+
+
+def load_latest_run(screener_key, condition):
+    """The most recent recorded run for this exact condition, or ``None``."""
+    run = ScreenerRun.objects.latest_for(screener_key, condition_hash(condition))
+    if run is None:
+        return None
+    return run_entry(run, run.rows())
+
+
+def get_screener_result(screener_key, condition):
+    """Cache first, then the latest recorded run, then a live scan."""
+    with metrics.screener(screener_key):
+        return screener_cache.get_or_fetch(screener_key, condition, scan_screener, load_latest_run)
+
+
+async def aget_screener_result(screener_key, condition):
+    with metrics.screener(screener_key):
+        return await screener_cache.aget_or_fetch(
+            screener_key, condition, ascan_screener, load_latest_run, scan_screener
+        )
+
+
+def refresh_screener(screener_key, condition):
+    with metrics.screener(screener_key):
+        return screener_cache.refresh(screener_key, condition, scan_screener)
+
+
+def refresh_local_screeners(screeners):
+    """
+    Rescan the local-engine screeners among ``screeners`` (key -> condition)
+    in one shared pass (``engine.scan_batch``), recording and caching each.
+    Returns ``{key: entry}`` for the screeners it ran; the rest (other
+    sources, clauses the engine cannot run) are left to ``refresh_screener``.
+    """
+    local = {key: condition for key, condition in screeners.items() if screener_source(key) == SOURCE_LOCAL}
+    if not local:
+        return {}
+    from . import engine
+
+    try:
+        found, errors = engine.scan_batch(local)
+    except engine.UnsupportedClause as e:
+        logger.warning("Local screeners not scanned: %s", e)
+        return {}
+    for key, e in errors.items():
+        logger.warning("Scanning %s on Chartink: %s", key, e)
+
+    entries = {}
+    for key, rows in found.items():
+        def fetch(screener_key, condition, rows=rows):
+            return record_scan(screener_key, condition, rows, SOURCE_LOCAL)
+        entries[key] = screener_cache.refresh(key, local[key], fetch)
+    return entries
+
+
+def as_of_result(screener_key, condition, day):
+    """
+    The local engine's scan as of the close of ``day`` (the last trading
+    day on or before it), as an entry with that day under ``"as_of"``.
+    Replays are neither cached nor recorded. Raises
+    ``engine.UnsupportedClause``/``engine.ClauseSyntaxError`` if the engine
+    cannot run the clause and ``ValueError`` if the store starts later.
+    """
+    from . import engine
+
+    panel = engine.get_panel()
+    traded = panel.dates[panel.day_index(day)].item()
+    rows = engine.scan_rows(condition, day=traded)
+    closed = datetime.combine(traded, MARKET_CLOSE, tzinfo=IST)
+    return {"rows": rows, "fetched_at": closed.timestamp(), "run_id": None, "as_of": traded}
+
+
+def delta_since(screener_key, entry, since):
+    """
+    What changed in ``entry``'s run since run ``since`` of the same
+    screener: the stored delta when ``since`` is the run before it,
+    otherwise a diff against that run's recorded hits. Raises
+    ``changes.UnknownRun`` if there is no such run and ``ValueError`` for
+    entries that are not recorded runs (as-of replays).
+    """
+    run_id = entry.get("run_id")
+    if run_id is None:
+        raise ValueError("since cannot be used with as_of")
+    if since == run_id:
+        return changes.EMPTY
+    if since == entry.get("previous_run_id") and entry.get("delta") is not None:
+        return entry["delta"]
+    previous = ScreenerRun.objects.ranks(screener_key, since)
+    if previous is None:
+        raise changes.UnknownRun(f"No run {since} of {screener_key}; fetch the full results")
+    return changes.diff(previous, changes.ranks(entry["rows"]))
+
+
+def last_updated(entry):
+    return datetime.fromtimestamp(entry["fetched_at"], IST)
+
+
+def entry_version(entry):
+    """Identifies the run an entry came from (its run id, else its fetch time)."""
+    return entry.get("run_id") or int(entry["fetched_at"] * 1000)
@@ -0,0 +1,288 @@
+"""
+Shared result cache for Chartink screener scans.
+
+Entries are keyed by screener key plus a hash of its ``condition``
+(``screeners.condition_hash``) so an edited scan clause never serves
+results computed for the old one. Each
+worker keeps a small in-process LRU in front of a Django cache alias
+(file based or Redis, see ``settings.CACHES``) that all workers share.
+
+Freshness is decided per read from the entry's ``fetched_at`` and the
+TTL for the current market phase:
+
+* younger than the TTL           -> served as is
+* older, but within STALE_GRACE  -> served, and refreshed in the background
+* anything else                  -> loaded from ``load`` (the database) if
+                                    given, otherwise fetched inline
+
+If that inline fetch fails (Chartink down, or its circuit breaker open),
+the last good result is served however old, with ``"stale": True``, and
+the error is only raised when there is none.
+
+Every refresh goes through a ``SingleFlight`` so a cold key only ever
+causes one upstream scan, however many threads and workers ask for it.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from . import metrics
+from .market import market_phase
+from .screeners import condition_hash
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ALIAS": "screener",
+    # Seconds a result stays fresh, per market phase.
+    "TTL": {
+        "pre_open": 120,
+        "open": 60,
+        "closed": 6 * 60 * 60,
+    },
+    # Per-screener overrides, e.g. {"epo_intraday": {"open": 30}}.
+    "SCREENER_TTL": {},
+    # How long past its TTL an entry may still be served while it refreshes.
+    "STALE_GRACE": 24 * 60 * 60,
+    "LOCAL_MAX_ENTRIES": 64,
+    # Directory for the cross-process single-flight lock files.
+    "LOCK_DIR": None,
+    # Seconds to wait for another worker's scan before fetching anyway.
+    "LOCK_TIMEOUT": 30,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "SCREENER_CACHE", {}))
+    return config
+
+
+# Bump when the shape of cached entries changes.
+ENTRY_VERSION = 2
+
+
+def cache_key(screener_key, condition):
+    return f"screener:v{ENTRY_VERSION}:{screener_key}:{condition_hash(condition)}"
+
+
+class LRUCache:
+    """A small thread-safe LRU map used as the per-process front cache."""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ScreenerCache:
+    """Two-level (local LRU + shared Django cache) screener result cache."""
+
+    def __init__(self, config=None):
+        self.config = config or get_config()
+        self.local = LRUCache(self.config["LOCAL_MAX_ENTRIES"])
+        self.flight = SingleFlight(self.config["LOCK_DIR"], self.config["LOCK_TIMEOUT"])
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.config["ALIAS"]]
+
+    def ttl_for(self, screener_key, now=None):
+        phase = market_phase(now)
+        overrides = self.config["SCREENER_TTL"].get(screener_key, {})
+        return overrides.get(phase, self.config["TTL"][phase])
+
+    def get(self, screener_key, condition):
+        """Return the cached entry (``{"rows", "fetched_at", ...}``) or ``None``."""
+        key = cache_key(screener_key, condition)
+        entry = self.local.get(key)
+        if entry is not None and self._age(entry) < self.ttl_for(screener_key):
+            return entry
+
+        shared_entry = self.shared.get(key)
+        if shared_entry is not None:
+            self.local.set(key, shared_entry)
+            return shared_entry
+        return entry
+
+    def set(self, screener_key, condition, entry):
+        key = cache_key(screener_key, condition)
+        entry = dict(entry)
+        entry.setdefault("fetched_at", time.time())
+        timeout = self.ttl_for(screener_key) + self.config["STALE_GRACE"]
+        self.shared.set(key, entry, timeout)
+        self.local.set(key, entry)
+        return entry
+
+    def delete(self, screener_key, condition):
+        key = cache_key(screener_key, condition)
+        self.shared.delete(key)
+        self.local.delete(key)
+
+    def get_or_fetch(self, screener_key, condition, fetch, load=None):
+        """
+        Return the result entry for a screener, calling
+        ``fetch(screener_key, condition)`` only when there is no usable
+        cached or loaded result. ``fetch`` and ``load`` return entry dicts
+        with at least ``rows``.
+        """
+        entry = self.lookup(screener_key, condition, load)
+        if self.usable(screener_key, condition, entry, fetch):
+            return entry
+        metrics.inc("screener_cache_requests_total", screener=screener_key, result="miss")
+        try:
+            return self.refresh(screener_key, condition, fetch)
+        except Exception as e:
+            return self.last_good(screener_key, entry, e)
+
+    async def aget_or_fetch(self, screener_key, condition, afetch, load=None, fetch=None):
+        """
+        ``get_or_fetch`` for async views: ``afetch`` is a coroutine function.
+        Cache and ``load`` access run via ``sync_to_async``; stale entries are
+        refreshed on a background thread with the sync ``fetch``.
+        """
+        entry = await sync_to_async(self.lookup)(screener_key, condition, load)
+        if self.usable(screener_key, condition, entry, fetch):
+            return entry
+        metrics.inc("screener_cache_requests_total", screener=screener_key, result="miss")
+        try:
+            return await self.arefresh(screener_key, condition, afetch)
+        except Exception as e:
+            return self.last_good(screener_key, entry, e)
+
+    @staticmethod
+    def last_good(screener_key, entry, error):
+        """``entry`` marked stale, standing in for a failed refresh; re-raises ``error`` without one."""
+        metrics.inc("screener_errors_total", screener=screener_key, error=type(error).__name__)
+        if entry is None:
+            raise error
+        logger.warning("Serving stale %s after failed refresh: %s", screener_key, error)
+        metrics.inc("screener_cache_requests_total", screener=screener_key, result="fallback")
+        return dict(entry, stale=True)
+
+    def lookup(self, screener_key, condition, load=None):
+        """The cached entry, falling back to ``load`` and caching what it returns."""
+        entry = self.get(screener_key, condition)
+        if entry is None and load is not None:
+            entry = load(screener_key, condition)
+            if entry is not None:
+                entry = self.set(screener_key, condition, entry)
+        return entry
+
+    def usable(self, screener_key, condition, entry, fetch=None):
+        """
+        Whether ``entry`` can be served now. Stale-but-graced entries are
+        usable and trigger a background refresh when ``fetch`` is given.
+        """
+        if entry is None:
+            return False
+        age = self._age(entry)
+        ttl = self.ttl_for(screener_key)
+        if age < ttl:
+            metrics.inc("screener_cache_requests_total", screener=screener_key, result="hit")
+            return True
+        if age < ttl + self.config["STALE_GRACE"]:
+            metrics.inc("screener_cache_requests_total", screener=screener_key, result="stale")
+            if fetch is not None:
+                self.refresh_in_background(screener_key, condition, fetch)
+            return True
+        return False
+
+    def refresh(self, screener_key, condition, fetch):
+        """Fetch and store a fresh result, coalescing concurrent refreshes of one key."""
+        key = cache_key(screener_key, condition)
+        current = self.shared.get(key)
+        seen = current["fetched_at"] if current is not None else 0
+
+        def recheck():
+            # Another worker may have stored a newer result while we waited.
+            entry = self.shared.get(key)
+            if entry is not None and entry["fetched_at"] > seen:
+                self.local.set(key, entry)
+                return entry
+            return None
+
+        def run():
+            return self.set(screener_key, condition, fetch(screener_key, condition))
+
+        return self.flight.do(key, run, recheck)
+
+    async def arefresh(self, screener_key, condition, afetch):
+        key = cache_key(screener_key, condition)
+        current = await self.shared.aget(key)
+        seen = current["fetched_at"] if current is not None else 0
+
+        async def recheck():
+            entry = await self.shared.aget(key)
+            if entry is not None and entry["fetched_at"] > seen:
+                self.local.set(key, entry)
+                return entry
+            return None
+
+        async def run():
+            entry = await afetch(screener_key, condition)
+            return await sync_to_async(self.set)(screener_key, condition, entry)
+
+        return await self.flight.ado(key, run, recheck)
+
+    def refresh_in_background(self, screener_key, condition, fetch):
+        key = cache_key(screener_key, condition)
+        with self._refreshing_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                with metrics.screener(screener_key):
+                    self.refresh(screener_key, condition, fetch)
+            except Exception as e:
+                logger.warning("Background refresh of %s failed: %s", screener_key, e)
+                metrics.inc("screener_errors_total", screener=screener_key, error=type(e).__name__)
+            finally:
+                with self._refreshing_lock:
+                    self._refreshing.discard(key)
+                connections.close_all()
+
+        threading.Thread(target=run, name=f"refresh-{screener_key}", daemon=True).start()
+
+    @staticmethod
+    def _age(entry):
+        return time.time() - entry["fetched_at"]
+
+
+screener_cache = ScreenerCache()
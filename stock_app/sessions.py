@@ -0,0 +1,139 @@
+"""
+Cached ``user_sessions`` store (``SESSION_ENGINE = 'stock_app.sessions'``).
+
+``user_sessions.backends.db`` reads the session row on every request and
+rewrites the whole row whenever the client's IP or user agent differs from
+the stored one. This store works like Django's ``cached_db``. Reads come
+from ``SESSION_CACHE_ALIAS``, a cache shared by every worker so that a
+logout takes effect everywhere, and the database is only read on a cache
+miss. Data changes are still written through to both.
+
+Device tracking (the user, IP, user agent and last activity shown on the
+sessions page) is kept up to date with one narrow ``UPDATE`` of those
+columns. It runs when the IP or user agent changes, or when the recorded
+activity is more than ``SESSION_ACTIVITY_INTERVAL`` seconds old, so an
+active session costs at most one write per interval.
+
+Deleting a session row (the sessions page's "log out" buttons,
+``clearsessions``) evicts its cached copy, so a revoked session stops
+working at once rather than when its cache entry expires.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete
+from django.utils import timezone
+from user_sessions.backends.db import SessionStore as DBStore
+
+KEY_PREFIX = "stock_app.sessions."
+DEFAULT_ACTIVITY_INTERVAL = 300
+
+
+class SessionStore(DBStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None, user_agent=None, ip=None):
+        self._cache = caches[settings.SESSION_CACHE_ALIAS]
+        super().__init__(session_key, user_agent, ip)
+
+    @property
+    def cache_key(self):
+        return self.cache_key_prefix + self._get_or_create_session_key()
+
+    def load(self):
+        try:
+            cached = self._cache.get(self.cache_key)
+        except Exception:
+            # Invalid keys raise on some backends; start a new session.
+            cached = None
+        if cached is None:
+            cached = self._load_from_db()
+        if cached is not None:
+            self.user_id = cached["user_id"]
+            # _track() reads the expiry from the data.
+            self._session_cache = cached["data"]
+            if self._track(cached):
+                return cached["data"]
+        self.user_id = None
+        self._session_key = None
+        self.create()
+        return {}
+
+    def _load_from_db(self):
+        session = Session.objects.filter(session_key=self.session_key, expire_date__gt=timezone.now()).first()
+        if session is None:
+            return None
+        cached = {
+            "data": self.decode(session.session_data),
+            "user_id": session.user_id,
+            "user_agent": session.user_agent,
+            "ip": session.ip,
+            "activity": session.last_activity.timestamp(),
+            "expire_date": session.expire_date,
+        }
+        self._cache.set(self.cache_key, cached, self.get_expiry_age(expiry=session.expire_date))
+        return cached
+
+    def _track(self, cached):
+        """
+        Record this request's IP, user agent and activity, at most once per
+        interval. Returns False if the session row has been deleted.
+        """
+        interval = getattr(settings, "SESSION_ACTIVITY_INTERVAL", DEFAULT_ACTIVITY_INTERVAL)
+        now = time.time()
+        if (
+            self.user_agent == cached["user_agent"]
+            and self.ip == cached["ip"]
+            and now - cached["activity"] < interval
+        ):
+            return True
+        updated = Session.objects.filter(session_key=self.session_key).update(
+            user_agent=self.user_agent, ip=self.ip, last_activity=timezone.now(),
+        )
+        if not updated:
+            self._cache.delete(self.cache_key)
+            return False
+        cached.update(user_agent=self.user_agent, ip=self.ip, activity=now)
+        self._cache.set(self.cache_key, cached, self.get_expiry_age(expiry=cached["expire_date"]))
+        return True
+
+    def exists(self, session_key):
+        if session_key and (self.cache_key_prefix + session_key) in self._cache:
+            return True
+        return super().exists(session_key)
+
+    def save(self, must_create=False):
+        super().save(must_create)
+        self._cache.set(self.cache_key, {
+            "data": self._get_session(no_load=must_create),
+            "user_id": self.user_id,
+            "user_agent": self.user_agent,
+            "ip": self.ip,
+            "activity": time.time(),
+            "expire_date": self.get_expiry_date(),
+        }, self.get_expiry_age())
+
+    def delete(self, session_key=None):
+        super().delete(session_key)
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self._cache.delete(self.cache_key_prefix + session_key)
+
+    def flush(self):
+        self.clear()
+        self.delete(self.session_key)
+        self._session_key = None
+
+
+# At the bottom, like user_sessions.backends.db, to avoid a circular import.
+from user_sessions.models import Session  # noqa: E402 isort:skip
+
+
+def evict(sender, instance, **kwargs):
+    caches[settings.SESSION_CACHE_ALIAS].delete(KEY_PREFIX + instance.session_key)
+
+
+post_delete.connect(evict, sender=Session, dispatch_uid="stock_app.sessions.evict")
@@ -0,0 +1,161 @@
+"""
+Single-flight request coalescing.
+
+``SingleFlight.do(key, fn)`` guarantees that at most one call of ``fn`` runs
+per key at a time:
+
+* threads in the same process wait on the leader and share its result;
+* other processes (gunicorn workers) serialise on an ``fcntl`` file lock
+  and, once they get it, call ``recheck()`` so they can pick up the result
+  the previous holder just stored instead of fetching again.
+
+``SingleFlight.ado(key, afn)`` is the coroutine counterpart: tasks on the
+same event loop share one call, which runs in a task of its own so that
+cancelling the caller that started it does not cancel it for the rest. The
+file lock is acquired in a worker thread so waiting never blocks the loop.
+
+On platforms without ``fcntl`` only the in-process half applies.
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def _consume(task):
+    # The callers may all have been cancelled; nobody else will look.
+    if not task.cancelled():
+        task.exception()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, lock_dir=None, lock_timeout=30.0, poll_interval=0.05):
+        self.lock_dir = lock_dir or os.path.join(tempfile.gettempdir(), "stock_app_locks")
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._async_calls = weakref.WeakKeyDictionary()
+
+    def do(self, key, fn, recheck=None):
+        """
+        Run ``fn()`` once for ``key`` across threads and processes.
+
+        ``recheck()`` is called after the cross-process lock is acquired; a
+        non-``None`` return value is used instead of calling ``fn``.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            with self.process_lock(key):
+                result = recheck() if recheck is not None else None
+                if result is None:
+                    result = fn()
+            call.result = result
+            return result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key, fn, recheck=None):
+        """Coroutine version of ``do``; ``fn`` and ``recheck`` are coroutine functions."""
+        loop = asyncio.get_running_loop()
+        calls = self._async_calls.setdefault(loop, {})
+        task = calls.get(key)
+        if task is None:
+            task = calls[key] = loop.create_task(self._arun(calls, key, fn, recheck))
+            task.add_done_callback(_consume)
+        return await asyncio.shield(task)
+
+    async def _arun(self, calls, key, fn, recheck):
+        try:
+            fh = await self._aacquire(key)
+            try:
+                result = await recheck() if recheck is not None else None
+                if result is None:
+                    result = await fn()
+            finally:
+                self._release(fh)
+            return result
+        finally:
+            del calls[key]
+
+    async def _aacquire(self, key):
+        acquiring = asyncio.get_running_loop().run_in_executor(None, self._acquire, key)
+        try:
+            return await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The thread carries on; release the lock as soon as it has it.
+            acquiring.add_done_callback(self._release_acquired)
+            raise
+
+    @contextmanager
+    def process_lock(self, key):
+        """
+        Hold an exclusive file lock for ``key``. Gives up waiting after
+        ``lock_timeout`` seconds and proceeds unlocked rather than stall the
+        request behind a wedged worker.
+        """
+        fh = self._acquire(key)
+        try:
+            yield
+        finally:
+            self._release(fh)
+
+    def _acquire(self, key):
+        if fcntl is None:
+            return None
+
+        os.makedirs(self.lock_dir, exist_ok=True)
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest() + ".lock"
+        fh = open(os.path.join(self.lock_dir, name), "a")
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fh
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    # Proceed unlocked; closing drops our claim on the file.
+                    fh.close()
+                    return None
+                time.sleep(self.poll_interval)
+
+    def _release_acquired(self, future):
+        if not future.cancelled() and future.exception() is None:
+            self._release(future.result())
+
+    def _release(self, fh):
+        if fh is not None:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+            fh.close()
@@ -0,0 +1,202 @@
+function closeModal() {
+  document.getElementById('modal')?.classList.remove('active');
+  window.scrollTo(0, 0);
+}
+function copyTable() {
+  const table = document.querySelector("table");
+  if (!table) return alert("No table to copy.");
+  let range = document.createRange();
+  range.selectNode(table);
+  window.getSelection().removeAllRanges();
+  window.getSelection().addRange(range);
+  document.execCommand("copy");
+  window.getSelection().removeAllRanges();
+  alert("📋 Table copied to clipboard!");
+}
+function downloadCSV() {
+  const modal = document.getElementById('modal');
+  if (!modal) return alert("No table to download.");
+  window.location = modal.dataset.downloadUrl + "&format=csv";
+}
+function copySymbols() {
+  fetchSymbols({}).then(symbols => {
+    if (!symbols) return;
+    navigator.clipboard.writeText(symbols.join(", ")).then(() => {
+      alert("📄 Symbols copied!");
+    });
+  });
+}
+
+function copySelectedSymbols() {
+    const checkboxes = document.querySelectorAll('.symbol-checkbox:checked');
+    const symbols = Array.from(checkboxes).map(cb => cb.value);
+
+    if (symbols.length === 0) {
+        alert("No symbols selected.");
+        return;
+    }
+
+    navigator.clipboard.writeText(symbols.join(', ')).then(() => {
+        alert(`Copied ${symbols.length} symbol(s) to clipboard.`);
+    });
+}
+
+function copyRangeSymbols() {
+  const start = parseInt(document.getElementById('rangeStart').value);
+  const end = parseInt(document.getElementById('rangeEnd').value);
+
+  if (isNaN(start) || isNaN(end) || start < 1 || end < start) {
+    alert("Please enter a valid range.");
+    return;
+  }
+
+  fetchSymbols({ min_rank: start, max_rank: end }).then(symbols => {
+    if (!symbols) return;
+    if (symbols.length === 0) {
+      alert(`No symbols found in range ${start} to ${end}`);
+      return;
+    }
+    navigator.clipboard.writeText(symbols.join(", ")).then(() => {
+      alert(`Copied ${symbols.length} symbol(s) from Rank ${start} to ${end}`);
+    });
+  });
+}
+
+// Results are paged, sorted and filtered by the server; the first page is
+// rendered with the template and the rest loaded as the table scrolls.
+const results = {
+  modal: document.getElementById('modal'),
+  sort: "rank",
+  cursor: null,
+  loading: false,
+};
+
+function filterParams(extra) {
+  const params = new URLSearchParams();
+  const form = document.getElementById('resultFilters');
+  if (form) {
+    new FormData(form).forEach((value, key) => { if (value !== "") params.set(key, value); });
+  }
+  Object.entries(extra || {}).forEach(([key, value]) => params.set(key, value));
+  return params;
+}
+
+function withParams(url, params) {
+  return url + (url.includes("?") ? "&" : "?") + params;
+}
+
+function fetchSymbols(extra) {
+  if (!results.modal) { alert("No table to copy."); return Promise.resolve(null); }
+  const params = filterParams(extra);
+  return fetch(withParams(results.modal.dataset.symbolsUrl, params))
+    .then(r => r.json())
+    .then(data => {
+      if (data.error) { alert(data.error); return null; }
+      return data.symbols;
+    });
+}
+
+function renderRow(row) {
+  const tr = document.createElement("tr");
+  const rank = document.createElement("td");
+  rank.className = "rank-cell";
+  rank.dataset.rank = row.rank;
+  const checkbox = document.createElement("input");
+  checkbox.type = "checkbox";
+  checkbox.className = "symbol-checkbox";
+  checkbox.value = row.stock_name;
+  rank.append(checkbox, String(row.rank));
+  tr.append(rank);
+  [row.stock_name, row.percent_change + "%", row.current_price, row.trade_volume].forEach(value => {
+    const td = document.createElement("td");
+    td.textContent = value;
+    tr.append(td);
+  });
+  if (row.new) {
+    const badge = document.createElement("span");
+    badge.className = "new-badge";
+    badge.textContent = "NEW";
+    tr.cells[1].append(badge);
+  }
+  return tr;
+}
+
+function loadResults(reset) {
+  if (!results.modal || results.loading) return;
+  if (!reset && !results.cursor) return;
+  const params = filterParams({ sort: results.sort });
+  if (!reset) params.set("cursor", results.cursor);
+
+  results.loading = true;
+  fetch(withParams(results.modal.dataset.resultsUrl, params))
+    .then(r => r.json().then(data => ({ status: r.status, data })))
+    .then(({ status, data }) => {
+      results.loading = false;
+      if (status === 409) return loadResults(true);
+      if (data.error) return alert(data.error);
+      const body = document.getElementById("resultsBody");
+      if (reset) body.replaceChildren();
+      data.results.forEach(row => body.append(renderRow(row)));
+      results.cursor = data.next_cursor;
+      document.getElementById("resultCount").textContent =
+        `Showing ${body.rows.length} of ${data.total}`;
+    })
+    .catch(() => { results.loading = false; });
+}
+
+function describeChanges(data) {
+  return `Since the previous run: ${data.entered.length} new, ${data.exited.length} dropped, ${data.moved.length} moved.`;
+}
+
+// Under ASGI the open screener is pushed an "update" event for each new
+// run; the page then reloads its first page of rows instead of the whole
+// page. Each event names the run it follows, so if events were missed the
+// changes are fetched with ?since= from the run this page shows.
+function subscribe(url) {
+  let run = results.modal.dataset.run;
+  new EventSource(url).addEventListener("update", event => {
+    const data = JSON.parse(event.data);
+    if (String(data.run) === run) return;
+    const shown = run;
+    run = String(data.run);
+    document.getElementById("lastUpdated").textContent = new Date(data.fetched_at * 1000)
+      .toLocaleTimeString("en-IN", { timeZone: "Asia/Kolkata", hour: "2-digit", minute: "2-digit" }) + " IST";
+    const summary = document.getElementById("changeSummary");
+    if (String(data.since) === shown) {
+      summary.textContent = describeChanges(data);
+    } else {
+      fetch(withParams(results.modal.dataset.resultsUrl, "since=" + encodeURIComponent(shown)))
+        .then(r => r.ok ? r.json() : null)
+        .then(changes => { summary.textContent = changes ? describeChanges(changes) : "Updated."; });
+    }
+    loadResults(true);
+  });
+}
+
+if (results.modal) {
+  results.cursor = results.modal.dataset.nextCursor || null;
+
+  document.getElementById('resultFilters').addEventListener("submit", event => {
+    event.preventDefault();
+    loadResults(true);
+  });
+
+  document.querySelectorAll("th.sortable").forEach(th => {
+    th.addEventListener("click", () => {
+      const field = th.dataset.sort;
+      results.sort = results.sort === field ? "-" + field : field;
+      document.querySelectorAll("th.sortable").forEach(other => other.classList.remove("asc", "desc"));
+      th.classList.add(results.sort.startsWith("-") ? "desc" : "asc");
+      loadResults(true);
+    });
+  });
+
+  if (results.modal.dataset.liveUrl) subscribe(results.modal.dataset.liveUrl);
+
+  const sentinel = document.getElementById("loadMoreSentinel");
+  if (sentinel) {
+    new IntersectionObserver(entries => {
+      if (entries.some(e => e.isIntersecting)) loadResults(false);
+    }, { root: document.getElementById("scrollableResults") }).observe(sentinel);
+  }
+}
@@ -0,0 +1,20 @@
+"""
+Static files storage.
+
+``collectstatic`` gives every file a content-hashed name and writes gzip
+and brotli copies next to it. WhiteNoise serves the hashed names with a
+ten-year ``immutable`` lifetime, so browsers keep the page's CSS and JS
+until a deploy changes them.
+
+Until ``collectstatic`` has written its manifest (development, tests),
+``{% static %}`` uses the plain names, which WhiteNoise finds in the apps'
+static directories (``WHITENOISE_USE_FINDERS``).
+"""
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
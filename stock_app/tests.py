@@ -1,3 +1,1429 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import pickle
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+import brotli
+import numpy as np
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from user_sessions.models import Session
+
+from . import async_views, changes, chartink, combine, fanout, live, results, screeners, views
+
+from .engine import (
+    Batch, Evaluator, IndicatorCache, OHLCVStore, Panel, StoreError, UnsupportedClause, backtest, evaluate, get_panel,
+    parse, scan_rows,
+)
+from .engine.dsl import (
+    BoolOp, ClauseSyntaxError, Compare, Field, Indicator, Not, Num, Offset, canonical, fields, walk,
+)
+from .exports import csv_chunks
+from .management.commands import run_screener_scheduler
+from .market import IST
+from .metrics import Registry
+from .middleware import _request_context
+from .models import ScreenerHit, ScreenerRun
+from .resilience import DEFAULTS as RESILIENCE_DEFAULTS, CircuitOpen, RateLimited, TokenBucket, Upstream
+from .rows import StockRow, normalise
+from .scans import delta_since, entry_version, load_latest_run, record_scan
+from .screener_cache import DEFAULTS as CACHE_DEFAULTS, ScreenerCache, screener_cache
+from .screeners import SCREENER_CONDITIONS, condition_hash
+from .sessions import KEY_PREFIX, SessionStore
+from .singleflight import SingleFlight
+
+# Every cache alias the views touch, in memory.
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "sessions": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "sessions-tests"},
+    "screener": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "screener-tests"},
+    "template_fragments": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "fragments-tests"},
+}
+
+
+SHAREHOLDING_SCREENERS = {
+    "promoter_stake_increase",
+    "retail_stake_increase",
+    "fii_dii_stake_increase",
+    "consistent_mf_fii_accumulation",
+}
+
+
+def make_panel(close, volume=None, market_cap=None, start="2024-01-01"):
+    close = np.asarray(close, dtype=float)
+    dates = np.busday_offset(start, np.arange(close.shape[1]), roll="forward")
+    fields = {
+        "open": close,
+        "high": close * 1.01,
+        "low": close * 0.99,
+        "close": close,
+        "volume": np.ones_like(close) * 10000 if volume is None else np.asarray(volume, dtype=float),
+    }
+    if market_cap is not None:
+        fields["market_cap"] = np.asarray(market_cap, dtype=float)
+    return Panel([f"S{i}" for i in range(close.shape[0])], dates, fields)
+
+
+def random_panel(symbols=50, days=1200, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (symbols, days)), axis=1))
+    close[:5, :days // 2] = np.nan  # recent listings
+    volume = rng.integers(1000, 10**6, (symbols, days)).astype(float)
+    volume[np.isnan(close)] = np.nan
+    return make_panel(close, volume, rng.uniform(50, 5000, symbols))
+
+
+class ScanClauseConformanceTests(SimpleTestCase):
+    """Every shipped scan clause must parse and run on the local engine."""
+
+    def test_every_clause_parses(self):
+        for key, screener in SCREENER_CONDITIONS.items():
+            with self.subTest(screener=key):
+                node = parse(screener["condition"]["scan_clause"])
+                self.assertIsInstance(node, (BoolOp, Compare, Not))
+
+    def test_every_price_clause_evaluates(self):
+        panel = random_panel()
+        for key, screener in SCREENER_CONDITIONS.items():
+            node = parse(screener["condition"]["scan_clause"])
+            with self.subTest(screener=key):
+                if key in SHAREHOLDING_SCREENERS:
+                    with self.assertRaises(UnsupportedClause):
+                        evaluate(node, panel)
+                    continue
+                mask = evaluate(node, panel)
+                self.assertEqual(mask.shape, (len(panel.symbols),))
+                self.assertEqual(mask.dtype, bool)
+
+    def test_shareholding_fields_keep_their_words(self):
+        clause = SCREENER_CONDITIONS["fii_dii_stake_increase"]["condition"]["scan_clause"]
+        self.assertEqual(
+            fields(parse(clause)),
+            {"foreign institutional investors percentage", "mutual funds or uti percentage"},
+        )
+
+
+class ScreenerRegistryTests(SimpleTestCase):
+    def test_clauses_are_collapsed_and_hashed_once(self):
+        self.assertEqual(screeners.normalise_clause(" ( {cash} (\n  latest close > 1\n) ) "),
+                         "( {cash} ( latest close > 1 ) )")
+        for bad in ("( latest close > 1", "latest close > 1 )", '( "close )', "  "):
+            with self.assertRaises(ValueError):
+                screeners.normalise_clause(bad)
+        for screener in SCREENER_CONDITIONS.values():
+            condition = screener["condition"]
+            self.assertEqual(condition_hash(condition), condition_hash(dict(condition)))
+            self.assertNotIn("  ", condition["scan_clause"])
+
+    def test_categories_must_name_known_screeners(self):
+        definitions = {"a": {"name": "A", "condition": {"scan_clause": "( latest close > 1 )"}}}
+        with self.assertRaises(ImproperlyConfigured):
+            screeners.build(definitions, {"All": ["a", "b"]})
+
+
+class ScanClauseParserTests(SimpleTestCase):
+    def test_offsets_and_window_functions(self):
+        node = parse("latest close >= 1 day ago max( 252 , latest high ) * 0.75")
+        self.assertEqual(node.left, Offset("day", 0, Field("close")))
+        max_high = Offset("day", 1, Indicator("max", 252, Offset("day", 0, Field("high"))))
+        self.assertEqual(node.right.left, max_high)
+        self.assertEqual(node.right.right, Num(0.75))
+
+    def test_series_functions_take_series_then_period(self):
+        node = parse("latest ema( close,50 ) > weekly sma( weekly volume , 10 )")
+        self.assertEqual(node.left, Offset("day", 0, Indicator("ema", 50, Field("close"))))
+        self.assertEqual(
+            node.right,
+            Offset("week", 0, Indicator("sma", 10, Offset("week", 0, Field("volume")))),
+        )
+
+    def test_count_not_and_segments(self):
+        node = parse("( {cash} ( latest count( 5, 1 where latest close > 1 day ago close ) = 0 "
+                     "and( {cash} not( 250 days ago close > 0 ) ) ) )")
+        self.assertEqual(node.op, "and")
+        self.assertEqual(node.items[0].left.expr.name, "count")
+        self.assertIsInstance(node.items[1], Not)
+
+    def test_quoted_expression_uses_candles(self):
+        node = parse('weekly "close - 1 candle ago close" > 0')
+        candle = [n for n in walk(node) if isinstance(n, Offset) and n.timeframe is None]
+        self.assertEqual(candle, [Offset(None, 1, Field("close"))])
+
+    def test_arithmetic_precedence(self):
+        node = parse("1 + 2 * 3 > 6")
+        self.assertEqual(node.left.op, "+")
+        self.assertEqual(node.left.right.op, "*")
+
+    def test_syntax_errors(self):
+        for clause in ("latest close >", "latest close > 1 )", "( latest close > 1", "latest foo > 1",
+                       "latest close and latest open", "max( 1.5 , latest high ) > 1"):
+            with self.subTest(clause=clause), self.assertRaises(ClauseSyntaxError):
+                parse(clause)
+
+    def test_canonical_form(self):
+        node = canonical(parse("( 20 < latest close and ( latest close > 20 and weekly sma( weekly close , 10 ) > 0 ) )"))
+        self.assertEqual(node, BoolOp("and", (
+            Compare(">", Field("close"), Num(20)),
+            Compare(">", Offset("week", 0, Indicator("sma", 10, Field("close"))), Num(0)),
+        )))
+        self.assertEqual(canonical(parse("1 day ago close > 0")).left, Offset("day", 1, Field("close")))
+
+
+class EvaluatorTests(SimpleTestCase):
+    def test_latest_and_days_ago(self):
+        panel = make_panel([[10, 11, 12], [10, 9, 8]])
+        mask = evaluate(parse("latest close > 1 day ago close"), panel)
+        self.assertEqual(mask.tolist(), [True, False])
+
+    def test_rolling_max_with_offset(self):
+        panel = make_panel([[5, 9, 7, 8, 10], [5, 9, 7, 8, 8.5]])
+        mask = evaluate(parse("latest close > 1 day ago max( 3 , latest close )"), panel)
+        self.assertEqual(mask.tolist(), [True, False])
+
+    def test_missing_history_is_false(self):
+        close = np.full((2, 10), 50.0)
+        close[1, :6] = np.nan
+        panel = make_panel(close)
+        mask = evaluate(parse("not( 8 days ago close > 0 )"), panel)
+        self.assertEqual(mask.tolist(), [False, True])
+
+    def test_count(self):
+        panel = make_panel([[1, 2, 3, 4, 5], [5, 4, 3, 4, 3]])
+        node = parse("latest count( 4 , 1 where latest close > 1 day ago close ) >= 3")
+        self.assertEqual(evaluate(node, panel).tolist(), [True, False])
+
+    def test_weekly_bar_is_built_so_far(self):
+        # 2024-01-01 is a Monday: one full week, then Monday and Tuesday.
+        close = [[10, 11, 12, 13, 14, 20, 15]]
+        panel = make_panel(close)
+        self.assertTrue(evaluate(parse("weekly high = latest max( 2 , latest high )"), panel)[0])
+        self.assertTrue(evaluate(parse("1 week ago close = 14"), panel)[0])
+        self.assertTrue(evaluate(parse("weekly volume = 20000"), panel)[0])
+
+    def test_as_of_day(self):
+        panel = make_panel([[10, 11, 12, 11]])
+        self.assertTrue(evaluate(parse("latest close > 1 day ago close"), panel, day="2024-01-03")[0])
+        self.assertFalse(evaluate(parse("latest close > 1 day ago close"), panel)[0])
+
+    def test_market_cap_needs_data(self):
+        panel = make_panel([[10, 11]])
+        with self.assertRaises(UnsupportedClause):
+            evaluate(parse("market cap > 100"), panel)
+        panel = make_panel([[10, 11], [10, 11]], market_cap=[50, 500])
+        self.assertEqual(evaluate(parse("market cap > 100"), panel).tolist(), [False, True])
+
+    def test_scan_rows_orders_by_change(self):
+        panel = make_panel([[10, 11], [10, 15], [10, 9]])
+        rows = scan_rows({"scan_clause": "latest close > 0"}, panel)
+        self.assertEqual([row.stock_name for row in rows], ["S1", "S0", "S2"])
+        self.assertEqual([row.rank for row in rows], [1, 2, 3])
+        self.assertEqual(rows[0].percent_change, 50.0)
+
+
+class BatchTests(SimpleTestCase):
+    def test_batch_matches_single_scans(self):
+        panel = random_panel()
+        batch = Batch({key: s["condition"]["scan_clause"] for key, s in SCREENER_CONDITIONS.items()})
+        self.assertLess(batch.stats()["unique_nodes"], batch.stats()["nodes"])
+        masks, errors = batch.evaluate(panel)
+        self.assertEqual(set(errors), SHAREHOLDING_SCREENERS)
+        self.assertTrue(all(isinstance(e, UnsupportedClause) for e in errors.values()))
+        for key, mask in masks.items():
+            with self.subTest(screener=key):
+                expected = evaluate(parse(SCREENER_CONDITIONS[key]["condition"]["scan_clause"]), panel)
+                np.testing.assert_array_equal(mask, expected)
+
+    def test_syntax_errors_are_per_clause(self):
+        masks, errors = Batch({"ok": "latest close > 0", "bad": "latest close >"}).evaluate(make_panel([[1, 2]]))
+        self.assertEqual(masks["ok"].tolist(), [True])
+        self.assertIsInstance(errors["bad"], ClauseSyntaxError)
+
+
+class IndicatorCacheTests(SimpleTestCase):
+    CLAUSE = ("latest ema( close,20 ) > latest sma( close,50 ) and latest close > 1 day ago max( 60 , latest high ) * 0.8 "
+              "and latest rsi( 14 ) > 40")
+
+    def test_cached_and_extended_match_recomputed(self):
+        panel = random_panel(symbols=30, days=600)
+        node = parse(self.CLAUSE)
+        cache = IndicatorCache()
+        for end in range(590, 600):
+            if end == 591:
+                first_day_misses = cache.misses
+            day_panel = panel.window(0, end)
+            cached = Evaluator(day_panel, cache)
+            fresh = Evaluator(day_panel)
+            for indicator in {n for n in walk(node) if isinstance(n, Indicator)}:
+                with self.subTest(end=end, indicator=indicator.name):
+                    np.testing.assert_allclose(
+                        cached.value(indicator, "day").live, fresh.value(indicator, "day").live, rtol=1e-4,
+                    )
+            np.testing.assert_array_equal(evaluate(node, day_panel, cache=cache), evaluate(node, day_panel))
+        stats = cache.stats()
+        # Later days only extend the first day's series.
+        self.assertEqual(stats["misses"], first_day_misses)
+        self.assertGreater(stats["extensions"], 0)
+        self.assertGreater(stats["hits"], 0)
+
+    def test_lru_is_bounded_by_bytes(self):
+        panel = random_panel(symbols=10, days=300)
+        cache = IndicatorCache(max_bytes=10 * 8 * 3)
+        for window in (5, 10, 15, 20):
+            evaluate(parse(f"latest sma( close,{window} ) > 0"), panel, cache=cache)
+        stats = cache.stats()
+        self.assertEqual(stats["entries"], 3)
+        self.assertEqual(stats["evictions"], 1)
+        self.assertLessEqual(stats["bytes"], cache.max_bytes)
+
+
+class BacktestTests(SimpleTestCase):
+    CLAUSE = "latest close > latest ema( close,50 ) and weekly close > 1 week ago high and latest volume > 100000"
+
+    def test_sweep_matches_daily_scans(self):
+        panel = random_panel(symbols=30, days=700)
+        node = parse(self.CLAUSE)
+        for workers, chunk_days in ((1, None), (1, 17), (2, 40)):
+            with self.subTest(workers=workers, chunk_days=chunk_days):
+                result = backtest(node, panel, panel.dates[600], panel.dates[-1], (1, 20), workers, chunk_days)
+                self.assertEqual(result.hits.shape, (30, 100))
+                for j, day in enumerate(result.dates):
+                    np.testing.assert_array_equal(result.hits[:, j], evaluate(node, panel, day))
+
+    def test_forward_returns(self):
+        panel = make_panel([[10, 11, 12, 11, 10], [10, 10, 10, 10, 10]])
+        result = backtest(parse("latest close > 1 day ago close"), panel, horizons=(1, 2))
+        self.assertEqual(result.hits[0].tolist(), [False, True, True, False, False])
+        np.testing.assert_allclose(result.returns[1][0], [0.1, 1 / 11, -1 / 12, -1 / 11, np.nan])
+        stats = result.stats()["horizons"][2]
+        self.assertEqual(stats["signals"], 2)
+        self.assertAlmostEqual(stats["mean"], (0 + -1 / 6) / 2)
+        self.assertEqual(stats["win_rate"], 0.0)
+
+
+class OHLCVStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = OHLCVStore(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_append_reads_back_as_memmap(self):
+        self.store.append_day("2025-01-01", {"A": {"close": 10, "volume": 5}, "B": {"close": 20}})
+        self.store.append_day("2025-01-02", {"A": {"close": 11}, "C": {"close": 30}})
+        panel = self.store.panel()
+        self.assertEqual(panel.symbols, ["A", "B", "C"])
+        self.assertEqual([str(d) for d in panel.dates], ["2025-01-01", "2025-01-02"])
+        np.testing.assert_array_equal(panel.field("close"), [[10, 11], [20, np.nan], [np.nan, 30]])
+        self.assertIsInstance(panel.field("close").base, np.memmap)
+
+    def test_history_is_append_only(self):
+        self.store.append_day("2025-01-02", {"A": {"close": 10}})
+        with self.assertRaises(StoreError):
+            self.store.append_day("2025-01-02", {"A": {"close": 11}})
+        with self.assertRaises(StoreError):
+            self.store.append_day("2025-01-01", {"A": {"close": 11}})
+
+    def test_capacity_grows(self):
+        self.store.create(capacity=2)
+        self.store.append_day("2025-01-01", {"A": {"close": 1}, "B": {"close": 2}})
+        self.store.append_day("2025-01-02", {s: {"close": i} for i, s in enumerate("ABCDE")})
+        panel = self.store.panel()
+        self.assertEqual(len(panel.symbols), 5)
+        np.testing.assert_array_equal(panel.field("close")[:, 0], [1, 2, np.nan, np.nan, np.nan])
+
+    def test_corporate_actions_are_an_overlay(self):
+        self.store.append_day("2025-01-01", {"A": {"close": 100, "volume": 10, "market_cap": 500}})
+        self.store.add_actions([{"symbol": "A", "ex_date": "2025-01-02", "ratio": 0.5}])
+        self.store.append_day("2025-01-02", {"A": {"close": 55, "volume": 30}})
+        panel = self.store.panel()
+        np.testing.assert_array_equal(panel.field("close"), [[50, 55]])
+        np.testing.assert_array_equal(panel.field("volume"), [[20, 30]])
+        np.testing.assert_array_equal(panel.fields["close"], [[100, 55]])
+        self.assertAlmostEqual(panel.field("market_cap")[0, 1], 550)
+
+    def test_coarse_bars_follow_trading_days(self):
+        # 2025-01-06 is a Monday; the Monday after is a holiday.
+        days = ["2025-01-06", "2025-01-07", "2025-01-08", "2025-01-09", "2025-01-10",
+                "2025-01-14", "2025-01-15", "2025-01-16", "2025-01-17", "2025-01-20"]
+        for i, day in enumerate(days):
+            self.store.append_day(day, {"A": {"open": i, "high": 10 + i, "low": i, "close": i + 1, "volume": 1}})
+        panel = self.store.panel()
+        layer = panel.layers["week"]
+        self.assertEqual(layer.starts.tolist(), [0, 5, 9])
+        np.testing.assert_array_equal(panel.bars("open", "week"), [[0, 5, 9]])
+        np.testing.assert_array_equal(panel.bars("volume", "week"), [[5, 4, 1]])
+        # As of Wednesday of the short week, its bar is built from Tuesday and Wednesday.
+        as_of = panel.until("2025-01-15")
+        np.testing.assert_array_equal(as_of.bars("high", "week"), [[14, 16]])
+        np.testing.assert_array_equal(as_of.bars("close", "month"), [[7]])
+
+        stored = {tf: np.array(panel.layers[tf].fields["volume"]) for tf in panel.layers}
+        self.store.rebuild_bars()
+        for tf, bars in stored.items():
+            np.testing.assert_array_equal(bars, self.store.panel().layers[tf].fields["volume"])
+
+    def test_ingest_eod_command(self):
+        path = os.path.join(self.tmp.name, "bhav.csv")
+        with open(path, "w") as fh:
+            fh.write("SYMBOL,SERIES,OPEN,HIGH,LOW,CLOSE,LAST,PREVCLOSE,TOTTRDQTY,TOTTRDVAL,TIMESTAMP\n"
+                     "AAA,EQ,10,12,9,11,11,10,100,1,02-JAN-2025\n"
+                     "BBB,N1,10,12,9,11,11,10,100,1,02-JAN-2025\n")
+        store_dir = os.path.join(self.tmp.name, "store")
+        with override_settings(OHLCV_STORE_DIR=store_dir):
+            call_command("ingest_eod", path, stdout=io.StringIO())
+            panel = get_panel()
+        self.assertEqual(panel.symbols, ["AAA"])
+        np.testing.assert_array_equal(panel.field("high"), [[12]])
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None, body=b"", data=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+        self.data = data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+    def json(self):
+        return {"data": self.data}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise ConnectionError(self.status_code)
+
+    def close(self):
+        pass
+
+
+class FakeChartinkSession:
+    """Hands out a new CSRF token per page load and accepts only the latest one."""
+
+    def __init__(self, token_statuses=()):
+        self.cookies = {"XSRF-TOKEN": "cookie"}
+        self.tokens = []
+        self.posts = []
+        self.token_statuses = list(token_statuses)
+
+    def get(self, url, stream=False, timeout=None):
+        self.tokens.append(f"token-{len(self.tokens) + 1}")
+        head = f'<html><head><meta name="csrf-token" content="{self.tokens[-1]}"></head>'
+        return FakeResponse(200, body=head.encode() + b"<body>" + b"x" * 100000)
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        self.posts.append(headers.get("x-csrf-token"))
+        if self.token_statuses:
+            return FakeResponse(self.token_statuses.pop(0))
+        return FakeResponse(200, data=[{"nsecode": "AAA"}])
+
+
+class ResilienceTests(SimpleTestCase):
+    def upstream(self, **config):
+        config = {**RESILIENCE_DEFAULTS, "RATE": 1000, "BACKOFF_BASE": 0.001, "STATE_DIR": tempfile.mkdtemp(), **config}
+        return Upstream(config)
+
+    def test_retries_transient_failures(self):
+        upstream = self.upstream()
+        replies = [ConnectionError("reset"), FakeResponse(503), FakeResponse(200)]
+
+        def send(timeout):
+            reply = replies.pop(0)
+            if isinstance(reply, Exception):
+                raise reply
+            return reply
+
+        self.assertEqual(upstream.call(send, (ConnectionError,)).status_code, 200)
+        self.assertEqual(replies, [])
+        self.assertEqual(upstream.breaker.failures, 0)
+
+    def test_error_statuses_and_other_exceptions_are_failures(self):
+        upstream = self.upstream()
+        sent = []
+
+        def send(timeout):
+            sent.append(timeout)
+            return FakeResponse(404)
+
+        # Returned for the caller's raise_for_status, without retrying.
+        self.assertEqual(upstream.call(send).status_code, 404)
+        self.assertEqual((len(sent), upstream.breaker.failures), (1, 1))
+
+        def broken(timeout):
+            raise ValueError("bad URL")
+
+        with self.assertRaises(ValueError):
+            upstream.call(broken, (ConnectionError,))
+        with self.assertRaises(ValueError):
+            asyncio.run(upstream.acall(broken))
+        self.assertEqual(upstream.breaker.failures, 3)
+
+    def test_breaker_fails_fast_then_tries_again(self):
+        upstream = self.upstream(RETRIES=0, BREAKER_THRESHOLD=2, BREAKER_RESET=0.05)
+        sent = []
+
+        def send(timeout):
+            sent.append(timeout)
+            return FakeResponse(502)
+
+        for _ in range(2):
+            self.assertEqual(upstream.call(send).status_code, 502)
+        with self.assertRaises(CircuitOpen):
+            upstream.call(send)
+        self.assertEqual(len(sent), 2)
+        time.sleep(0.06)
+        self.assertEqual(upstream.call(lambda timeout: FakeResponse(200)).status_code, 200)
+        self.assertEqual(upstream.breaker.state, "closed")
+
+    def test_rate_limited_calls_open_the_breaker(self):
+        upstream = self.upstream(RATE=0.001, BURST=1, DEADLINE=0.1, BREAKER_THRESHOLD=2)
+        self.assertEqual(upstream.call(lambda timeout: FakeResponse(200)).status_code, 200)
+        for _ in range(2):
+            with self.assertRaises(RateLimited):
+                upstream.call(lambda timeout: FakeResponse(200))
+        with self.assertRaises(CircuitOpen):
+            upstream.call(lambda timeout: FakeResponse(200))
+
+    def test_async_acquire_reserves_off_the_event_loop(self):
+        bucket = TokenBucket(10, 1, os.path.join(tempfile.mkdtemp(), "bucket"))
+        reserve, threads = bucket.reserve, []
+
+        def recording_reserve(max_wait):
+            threads.append(threading.get_ident())
+            return reserve(max_wait)
+
+        bucket.reserve = recording_reserve
+        asyncio.run(bucket.aacquire(1))
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+    def test_token_bucket_is_shared_through_its_file(self):
+        path = os.path.join(tempfile.mkdtemp(), "bucket")
+        first, second = TokenBucket(10, 2, path), TokenBucket(10, 2, path)
+        self.assertEqual(first.reserve(1), 0)
+        self.assertEqual(second.reserve(1), 0)
+        self.assertAlmostEqual(first.reserve(1), 0.1, delta=0.02)
+        # Too long a wait reserves nothing.
+        self.assertGreater(second.reserve(0.01), 0.01)
+        self.assertAlmostEqual(second.reserve(1), 0.2, delta=0.02)
+
+    def test_failed_refresh_serves_last_good_result(self):
+        cache = ScreenerCache(dict(CACHE_DEFAULTS, ALIAS="default", TTL={"pre_open": 0, "open": 0, "closed": 0},
+                                   STALE_GRACE=0))
+        cache.delete("key", {})
+
+        def down(screener_key, condition):
+            raise CircuitOpen("down", 30)
+
+        with self.assertRaises(CircuitOpen):
+            cache.get_or_fetch("key", {}, down)
+        cache.set("key", {}, {"rows": ["old"], "fetched_at": time.time() - 60})
+        entry = cache.get_or_fetch("key", {}, down)
+        self.assertEqual(entry["rows"], ["old"])
+        self.assertTrue(entry["stale"])
+
+
+class ScreenerCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.fetched = []
+        caches["default"].clear()
+
+    def cache(self, ttl=60, grace=60):
+        return ScreenerCache(dict(CACHE_DEFAULTS, ALIAS="default", TTL={"pre_open": ttl, "open": ttl, "closed": ttl},
+                                  STALE_GRACE=grace, LOCK_DIR=tempfile.mkdtemp()))
+
+    def fetch(self, screener_key, condition):
+        self.fetched.append(condition)
+        return {"rows": [f"row {len(self.fetched)}"]}
+
+    def test_miss_fetches_then_hits(self):
+        cache = self.cache()
+        self.assertEqual(cache.get_or_fetch("key", {"scan_clause": "a"}, self.fetch)["rows"], ["row 1"])
+        self.assertEqual(cache.get_or_fetch("key", {"scan_clause": "a"}, self.fetch)["rows"], ["row 1"])
+        # Another worker's process-local cache is empty, the shared one is not.
+        self.assertEqual(self.cache().get_or_fetch("key", {"scan_clause": "a"}, self.fetch)["rows"], ["row 1"])
+        self.assertEqual(len(self.fetched), 1)
+
+    def test_changed_condition_misses(self):
+        cache = self.cache()
+        cache.get_or_fetch("key", {"scan_clause": "a"}, self.fetch)
+        entry = cache.get_or_fetch("key", {"scan_clause": "b"}, self.fetch)
+        self.assertEqual(entry["rows"], ["row 2"])
+        self.assertEqual(self.fetched, [{"scan_clause": "a"}, {"scan_clause": "b"}])
+
+    def test_load_is_used_before_fetch(self):
+        cache = self.cache()
+        entry = cache.get_or_fetch("key", {}, self.fetch, load=lambda key, condition: {"rows": ["saved"]})
+        self.assertEqual(entry["rows"], ["saved"])
+        self.assertEqual(self.fetched, [])
+        self.assertEqual(cache.get("key", {})["rows"], ["saved"])
+
+    def test_stale_entry_is_served_while_it_refreshes(self):
+        cache = self.cache(ttl=10, grace=60)
+        cache.set("key", {}, {"rows": ["old"], "fetched_at": time.time() - 30})
+        entry = cache.get_or_fetch("key", {}, self.fetch)
+        self.assertEqual(entry["rows"], ["old"])
+        self.assertNotIn("stale", entry)
+
+        deadline = time.monotonic() + 5
+        while cache.get("key", {})["rows"] == ["old"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(cache.get("key", {})["rows"], ["row 1"])
+        self.assertEqual(len(self.fetched), 1)
+
+    def test_expired_entry_is_fetched_inline(self):
+        cache = self.cache(ttl=10, grace=10)
+        cache.set("key", {}, {"rows": ["old"], "fetched_at": time.time() - 30})
+        self.assertEqual(cache.get_or_fetch("key", {}, self.fetch)["rows"], ["row 1"])
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_misses_fetch_once(self):
+        caches["default"].clear()
+        cache = ScreenerCache(dict(CACHE_DEFAULTS, ALIAS="default", LOCK_DIR=tempfile.mkdtemp()))
+        fetched, entries = [], []
+
+        def fetch(screener_key, condition):
+            fetched.append(screener_key)
+            time.sleep(0.1)
+            return {"rows": ["row"]}
+
+        threads = [
+            threading.Thread(target=lambda: entries.append(cache.get_or_fetch("key", {}, fetch)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(fetched, ["key"])
+        self.assertEqual([entry["rows"] for entry in entries], [["row"]] * 8)
+
+    def test_followers_share_the_leaders_error(self):
+        flight = SingleFlight(tempfile.mkdtemp())
+        started, errors = threading.Event(), []
+
+        def fail():
+            started.set()
+            time.sleep(0.1)
+            raise ConnectionError("down")
+
+        def call(fn):
+            try:
+                flight.do("key", fn)
+            except ConnectionError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call, args=(fail,))
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=call, args=(lambda: self.fail("follower ran"),))
+        follower.start()
+        leader.join()
+        follower.join()
+        self.assertEqual(len(errors), 2)
+        self.assertIs(errors[0], errors[1])
+
+    def test_recheck_result_is_used_instead_of_fn(self):
+        # What a worker sees after the lock holder in another process stored a result.
+        flight = SingleFlight(tempfile.mkdtemp())
+        self.assertEqual(flight.do("key", lambda: self.fail("fn ran"), recheck=lambda: "stored"), "stored")
+        self.assertEqual(flight.do("key", lambda: "fetched", recheck=lambda: None), "fetched")
+
+    def test_async_callers_share_one_call(self):
+        flight = SingleFlight(tempfile.mkdtemp())
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "row"
+
+        async def main():
+            return await asyncio.gather(*(flight.ado("key", fetch) for _ in range(5)))
+
+        self.assertEqual(asyncio.run(main()), ["row"] * 5)
+        self.assertEqual(calls, [1])
+
+    def test_cancelling_the_first_async_caller_leaves_the_call_running(self):
+        flight = SingleFlight(tempfile.mkdtemp())
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "row"
+
+        async def main():
+            first = asyncio.create_task(flight.ado("key", fetch))
+            await asyncio.sleep(0.01)
+            second = asyncio.create_task(flight.ado("key", fetch))
+            await asyncio.sleep(0)
+            first.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await first
+            return await second
+
+        self.assertEqual(asyncio.run(main()), "row")
+        self.assertEqual(calls, [1])
+
+    def test_lock_taken_after_the_call_is_cancelled_is_released(self):
+        lock_dir = tempfile.mkdtemp()
+        flight = SingleFlight(lock_dir, poll_interval=0.01)
+        release = self.enterContext(mock.patch.object(flight, "_release", wraps=flight._release))
+        other = SingleFlight(lock_dir, lock_timeout=0)
+        held = other._acquire("key")
+        self.assertIsNotNone(held)
+
+        async def main():
+            asyncio.create_task(flight.ado("key", lambda: self.fail("fn ran")))
+            await asyncio.sleep(0.05)
+            # Returning cancels the call while its thread waits for the lock.
+            threading.Timer(0.05, other._release, args=(held,)).start()
+
+        asyncio.run(main())
+        (fh,), _ = release.call_args
+        self.assertTrue(fh.closed)
+        fh = other._acquire("key")
+        self.assertIsNotNone(fh)
+        other._release(fh)
+
+
+class ChartinkClientTests(SimpleTestCase):
+    def setUp(self):
+        # Keep the shared rate limit and breaker out of it.
+        config = {**RESILIENCE_DEFAULTS, "RATE": 1000, "STATE_DIR": tempfile.mkdtemp()}
+        self.enterContext(mock.patch.object(chartink, "upstream", Upstream(config)))
+
+    def chartink_client(self, session):
+        client = chartink.ChartinkClient("https://chartink.test/screener/process")
+        client._session = session
+        return client
+
+    def test_token_is_fetched_once_and_reused(self):
+        session = FakeChartinkSession()
+        client = self.chartink_client(session)
+        for _ in range(3):
+            self.assertEqual(client.scan({"scan_clause": "x"}), [{"nsecode": "AAA"}])
+        self.assertEqual(session.tokens, ["token-1"])
+        self.assertEqual(session.posts, ["token-1"] * 3)
+
+    def test_rejected_token_is_refetched_once(self):
+        for status in chartink.TOKEN_REJECTED:
+            with self.subTest(status=status):
+                session = FakeChartinkSession([status])
+                client = self.chartink_client(session)
+                self.assertEqual(client.scan({"scan_clause": "x"}), [{"nsecode": "AAA"}])
+                self.assertEqual(session.tokens, ["token-1", "token-2"])
+                self.assertEqual(session.posts, ["token-1", "token-2"])
+                # The cookie paired with the old token goes with it.
+                self.assertEqual(session.cookies, {})
+
+    def test_second_rejection_is_raised(self):
+        session = FakeChartinkSession([419, 419])
+        with self.assertRaises(ConnectionError):
+            self.chartink_client(session).scan({"scan_clause": "x"})
+        self.assertEqual(len(session.posts), 2)
+
+    def test_token_scan_stops_at_the_head(self):
+        chunks = iter([b'<head><meta content="abc" name="csrf-token">', b"</head>", b"never read"])
+        self.assertEqual(chartink.find_csrf_token(chunks), "abc")
+        self.assertEqual(list(chunks), [b"</head>", b"never read"])
+        self.assertIsNone(chartink.find_csrf_token([b"<head>", b"</head>", b'<meta name="csrf-token" content="late">']))
+
+
+class RowTests(SimpleTestCase):
+    def test_normalise_coerces_and_skips_incomplete_rows(self):
+        raw = [
+            {"sr": "1", "nsecode": "AAA", "name": "A Ltd", "per_chg": "2.5", "close": 101, "volume": "1200.0"},
+            {"sr": 2, "nsecode": "BBB", "per_chg": "", "close": None, "volume": ""},
+            {"sr": 3, "nsecode": "CCC", "per_chg": 1, "close": 5},
+            {"sr": "x", "nsecode": "DDD", "per_chg": 1, "close": 5, "volume": 1},
+            {"sr": 5, "nsecode": "EEE", "per_chg": "n/a", "close": 5, "volume": 1},
+        ]
+        self.assertEqual([row.as_tuple() for row in normalise(raw)],
+                         [(1, "AAA", 2.5, 101.0, 1200), (2, "BBB", None, None, None)])
+
+    def test_rows_pickle_as_tuples(self):
+        row = StockRow(1, "AAA", 2.5, 101.0, 1200)
+        data = pickle.dumps(row)
+        self.assertEqual(pickle.loads(data), row)
+        self.assertNotIn(b"stock_name", data)
+        self.assertFalse(hasattr(row, "__dict__"))
+
+    def test_csv_export(self):
+        rows = [StockRow(1, "AAA", 2.5, 101.0, 1200), StockRow(2, "BBB", None, None, None)]
+        self.assertEqual("".join(csv_chunks(rows)), "Rank,Stock Symbol,Percent Change,Current Price,Trade Volume\n"
+                                                    "1,AAA,2.5,101.0,1200\n2,BBB,,,\n")
+
+
+class MetricsTests(SimpleTestCase):
+    def test_processes_are_summed_in_text_format(self):
+        directory = tempfile.mkdtemp()
+        registry = Registry(directory)
+        registry.observe("screener_stage_duration_seconds", 0.02, screener="vcp", stage="scan_post")
+        registry.observe("screener_stage_duration_seconds", 0.3, screener="vcp", stage="scan_post")
+        registry.inc("screener_errors_total", screener="vcp", error="ReadTimeout")
+        registry.flush()
+        # A second worker that recorded the same.
+        with open(os.path.join(directory, f"{registry.pid}.json")) as src:
+            with open(os.path.join(directory, "1.json"), "w") as dst:
+                dst.write(src.read())
+        text = registry.render()
+        self.assertIn('screener_stage_duration_seconds_bucket{screener="vcp",stage="scan_post",le="0.025"} 2', text)
+        self.assertIn('screener_stage_duration_seconds_bucket{screener="vcp",stage="scan_post",le="+Inf"} 4', text)
+        self.assertIn('screener_stage_duration_seconds_count{screener="vcp",stage="scan_post"} 4', text)
+        self.assertIn('screener_errors_total{screener="vcp",error="ReadTimeout"} 2', text)
+        self.assertIn("# TYPE screener_rows histogram", text)
+
+    def test_files_of_exited_processes_are_dropped(self):
+        directory = tempfile.mkdtemp()
+        registry = Registry(directory)
+        registry.inc("screener_errors_total", screener="vcp", error="ReadTimeout")
+        exited = subprocess.Popen(["true"])
+        exited.wait()
+        with open(os.path.join(directory, f"{exited.pid}.json"), "w") as fh:
+            json.dump({"screener_errors_total": {'["vcp", "ReadTimeout"]': 5}}, fh)
+        self.assertIn('screener_errors_total{screener="vcp",error="ReadTimeout"} 1', registry.render())
+        self.assertEqual(os.listdir(directory), [f"{registry.pid}.json"])
+
+    def test_values_are_flushed_off_the_recording_thread(self):
+        registry = Registry(tempfile.mkdtemp(), flush_interval=0.01)
+        flush, flushed, threads = registry.flush, threading.Event(), []
+
+        def recording_flush():
+            threads.append(threading.get_ident())
+            flush()
+            flushed.set()
+
+        self.enterContext(mock.patch.object(registry, "flush", recording_flush))
+        registry.inc("screener_errors_total", screener="vcp", error="ReadTimeout")
+        self.assertTrue(flushed.wait(1))
+        self.assertNotIn(threading.get_ident(), threads)
+        self.assertTrue(os.path.exists(os.path.join(registry.directory, f"{registry.pid}.json")))
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_request_id_is_echoed(self):
+        response = self.client.get("/metrics", headers={"X-Request-ID": "req-1", "Authorization": "Bearer secret"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Request-ID"], "req-1")
+        self.assertNotEqual(self.client.get("/metrics", headers={"X-Request-ID": "bad id!"})["X-Request-ID"], "bad id!")
+
+    def test_endpoint_is_closed_by_default(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+        with override_settings(METRICS_TOKEN="secret"):
+            self.assertEqual(self.client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code, 401)
+
+    def test_unknown_screener_labels_are_folded(self):
+        factory = RequestFactory()
+        self.assertEqual(_request_context(factory.get("/download/", {"screener_name": "vcp_tightness"}))[2], "vcp_tightness")
+        self.assertEqual(_request_context(factory.get("/download/", {"screener_name": "bogus"}))[2], "other")
+        self.assertEqual(_request_context(factory.get("/api/screeners/bogus/results/"))[2], "other")
+
+
+class IndexQueryTests(SimpleTestCase):
+    def query(self, data, get=""):
+        return views.index_query(RequestFactory().post(f"/{get}", data))
+
+    def test_parses_what_both_index_views_fetch(self):
+        context, query = views.index_query(RequestFactory().get("/", {"category": "Special category"}))
+        self.assertIsNone(query)
+        self.assertEqual(context["grid_version"], views.grid_version("Special category"))
+
+        context, query = self.query({"screener_name": "vcp_tightness"}, "?as_of=2024-03-01")
+        self.assertEqual(query, {"screener": "vcp_tightness", "condition": SCREENER_CONDITIONS["vcp_tightness"]["condition"],
+                                 "as_of": date(2024, 3, 1)})
+        self.assertEqual(context["selected_screener_name"], SCREENER_CONDITIONS["vcp_tightness"]["name"])
+
+        context, query = self.query({"expression": "vcp_tightness & ipo_base"})
+        self.assertEqual(query["expression"].keys, ["vcp_tightness", "ipo_base"])
+        self.assertEqual(context["expression"], "vcp_tightness AND ipo_base")
+
+        for data, get, error in (({"screener_name": "bogus"}, "", "Unknown screener: bogus"),
+                                 ({"screener_name": "vcp_tightness"}, "?as_of=soon", "as_of must be a date"),
+                                 ({"expression": "vcp_tightness AND"}, "", "Expected a screener")):
+            context, query = self.query(data, get)
+            self.assertIsNone(query)
+            self.assertIn(error, context["scan_error"])
+            self.assertEqual(context["stock_list"], [])
+
+
+class AsyncViewTests(SimpleTestCase):
+    """The async views answer exactly as the sync ones do."""
+
+    ENTRY = {
+        "rows": [StockRow(rank, symbol, 1.5, 10.0 * rank, 100) for rank, symbol in enumerate("ABC", 1)],
+        "fetched_at": 1700000000.0, "run_id": 7, "previous_run_id": None, "delta": None,
+    }
+
+    def setUp(self):
+        self.fetched = []
+
+        def fetch(screener_key, condition):
+            self.fetched.append(screener_key)
+            return self.ENTRY
+
+        async def afetch(screener_key, condition):
+            return fetch(screener_key, condition)
+
+        self.enterContext(mock.patch.object(views, "get_screener_result", fetch))
+        self.enterContext(mock.patch.object(async_views, "aget_screener_result", afetch))
+
+    def both(self, view, path, data=None, user=None, **kwargs):
+        user = user or User(username="u")
+        request = RequestFactory().get(path, data)
+        request.user = user
+        arequest = AsyncRequestFactory().get(path, data)
+
+        async def auser():
+            return user
+
+        arequest.auser = auser
+        return getattr(views, view)(request, **kwargs), asyncio.run(getattr(async_views, view)(arequest, **kwargs))
+
+    def test_results_api(self):
+        for data in ({"limit": 2}, {"sort": "-price", "limit": 1}, {"limit": 0}):
+            sync, async_ = self.both("screener_results", "/api/screeners/vcp_tightness/results/", data,
+                                     screener_key="vcp_tightness")
+            with self.subTest(data=data):
+                self.assertEqual(async_.status_code, sync.status_code)
+                self.assertEqual(json.loads(async_.content), json.loads(sync.content))
+        self.assertEqual(self.fetched, ["vcp_tightness"] * 6)
+
+        for response in self.both("screener_results", "/api/screeners/bogus/results/", screener_key="bogus"):
+            self.assertEqual(response.status_code, 404)
+        for response in self.both("screener_results", "/api/screeners/vcp_tightness/results/",
+                                  user=AnonymousUser(), screener_key="vcp_tightness"):
+            self.assertEqual(response.status_code, 302)
+
+    def test_download(self):
+        sync, async_ = self.both("download_csv", "/download/", {"screener_name": "vcp_tightness"})
+
+        async def content(response):
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        self.assertEqual(asyncio.run(content(async_)), b"".join(sync.streaming_content))
+        self.assertEqual(async_["ETag"], sync["ETag"])
+        for response in self.both("download_csv", "/download/", {"screener_name": "vcp_tightness", "format": "xls"}):
+            self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ALLOWED_HOSTS=["*"])
+class ScreenerRunTests(TestCase):
+    def test_unknown_screeners_are_not_scanned(self):
+        response = self.client.get("/download/", {"screener_name": "totally_bogus"})
+        self.assertEqual(response.status_code, 404)
+        self.client.force_login(User.objects.create_user("u", password="p"))
+        self.assertContains(self.client.post("/", {"screener_name": "totally_bogus"}), "Unknown screener: totally_bogus")
+        self.assertFalse(ScreenerRun.objects.exists())
+
+    def test_latest_run_is_loaded_per_condition(self):
+        rows = [StockRow(1, "A", 2.5, 10.0, 500), StockRow(2, "B", None, 20.0, None)]
+        self.assertIsNone(load_latest_run("vcp", {"scan_clause": "x"}))
+        record_scan("vcp", {"scan_clause": "x"}, rows[:1], "chartink")
+        recorded = record_scan("vcp", {"scan_clause": "x"}, rows, "chartink")
+        record_scan("vcp", {"scan_clause": "y"}, rows[1:], "chartink")
+
+        entry = load_latest_run("vcp", {"scan_clause": "x"})
+        self.assertEqual(entry["rows"], rows)
+        self.assertEqual((entry["run_id"], entry["fetched_at"]), (recorded["run_id"], recorded["fetched_at"]))
+        self.assertEqual(load_latest_run("vcp", {"scan_clause": "y"})["rows"], rows[1:])
+
+    def test_first_seen_and_admin(self):
+        now = timezone.now()
+        rows = [StockRow(1, "A", 1.0, 10.0, 5)]
+        for days in (3, 1):
+            ScreenerRun.objects.record("vcp", "h", rows, now - timedelta(days=days))
+        self.assertEqual(ScreenerHit.objects.first_seen("A", "vcp"), now - timedelta(days=3))
+        self.assertIsNone(ScreenerHit.objects.first_seen("A", "ipo"))
+
+        self.client.force_login(User.objects.create_superuser("admin", password="p"))
+        for url in ("/admin/stock_app/screenerrun/", "/admin/stock_app/screenerhit/?q=A"):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_prune_keeps_recent_runs_and_the_latest_of_each_screener(self):
+        now = timezone.now()
+        rows = [StockRow(1, "A", 1.0, 10.0, 5), StockRow(2, "B", 1.0, 10.0, 5)]
+        old = [ScreenerRun.objects.record("vcp", "h", rows, now - timedelta(days=d)) for d in (40, 35)]
+        recent = ScreenerRun.objects.record("vcp", "h", rows, now)
+        only = ScreenerRun.objects.record("ipo", "h", rows, now - timedelta(days=90))
+
+        self.assertEqual(ScreenerRun.objects.prune(now - timedelta(days=30)), 2)
+        self.assertEqual(set(ScreenerRun.objects.values_list("pk", flat=True)), {recent.pk, only.pk})
+        self.assertFalse(ScreenerHit.objects.filter(run_id__in=[run.pk for run in old]).exists())
+        self.assertEqual(ScreenerHit.objects.count(), 4)
+        self.assertEqual(ScreenerRun.objects.prune(now - timedelta(days=30)), 0)
+
+
+class SchedulerTests(TestCase):
+    KEYS = list(SCREENER_CONDITIONS)[:2]
+
+    def command(self, **config):
+        command = run_screener_scheduler.Command(stdout=io.StringIO(), stderr=io.StringIO())
+        command.config = dict(run_screener_scheduler.get_config(), **config)
+        return command
+
+    def test_interval_follows_the_ttl_unless_fixed(self):
+        first, second = self.KEYS
+        command = self.command(INTERVALS={first: 45}, REFRESH_FACTOR=0.5)
+        self.assertEqual(command.interval_for(first), 45)
+        self.assertEqual(command.interval_for(second), screener_cache.ttl_for(second) * 0.5)
+
+    def test_only_chartink_screeners_are_jittered(self):
+        first, second = self.KEYS
+        command = self.command(JITTER=5)
+        with override_settings(SCREENER_SOURCE="chartink", SCREENER_SOURCES={second: "local"}):
+            self.assertTrue(all(0 <= command.jitter(first) <= 5 for _ in range(20)))
+            self.assertEqual(command.jitter(second), 0)
+
+    @override_settings(SCREENER_SOURCE="chartink", SCREENER_SOURCES={})
+    def test_once_scans_the_named_screeners(self):
+        scanned = []
+
+        def refresh(key, condition):
+            scanned.append((key, condition))
+            return {"rows": [StockRow(1, "A", 1.0, 10.0, 5)]}
+
+        self.enterContext(mock.patch.object(run_screener_scheduler, "refresh_screener", refresh))
+        out = io.StringIO()
+        call_command("run_screener_scheduler", "--once", *(f"--screener={key}" for key in self.KEYS), stdout=out)
+        self.assertCountEqual(scanned, [(key, SCREENER_CONDITIONS[key]["condition"]) for key in self.KEYS])
+        self.assertIn(f"{self.KEYS[0]}: 1 rows", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("run_screener_scheduler", "--once", "--screener=totally_bogus")
+
+    @override_settings(SCREENER_SOURCE="chartink", SCREENER_SOURCES={}, NSE_HOLIDAYS=["2024-06-04"])
+    def test_phase_changes_and_non_trading_days(self):
+        clock, scanned = [], []
+
+        def refresh(key, condition):
+            scanned.append(clock[-1].strftime("%a %H:%M:%S"))
+            return {"rows": []}
+
+        class Pool:
+            def submit(self, fn, *args):
+                future = Future()
+                future.set_result(fn(*args))
+                return future
+
+        self.enterContext(mock.patch.object(run_screener_scheduler, "now_ist", lambda: clock[-1]))
+        self.enterContext(mock.patch.object(run_screener_scheduler, "refresh_screener", refresh))
+        command = self.command(JITTER=0, INTERVALS={}, RETENTION_DAYS=None)
+
+        # Monday 2024-06-03: one pre-open scan, then the open TTL applies from 09:15.
+        clock.append(datetime(2024, 6, 3, 9, 14, tzinfo=IST))
+        command.start(["epo_intraday"])
+        for seconds in (0, 1, 30, 60, 61, 90):
+            clock.append(clock[0] + timedelta(seconds=seconds))
+            command.tick(Pool())
+        self.assertEqual(scanned, ["Mon 09:14:00", "Mon 09:15:00", "Mon 09:15:30"])
+
+        # Tuesday is a holiday and the next session is Wednesday's pre-open.
+        for at in (datetime(2024, 6, 4, 10, 0), datetime(2024, 6, 4, 23, 0), datetime(2024, 6, 5, 9, 0)):
+            clock.append(at.replace(tzinfo=IST))
+            command.tick(Pool())
+        self.assertEqual(scanned[3:], ["Wed 09:00:00"])
+
+
+@override_settings(
+    ALLOWED_HOSTS=["*"],
+    CACHES=LOCMEM_CACHES,
+)
+class ExportTests(TestCase):
+    KEY = "vcp_tightness"
+
+    def setUp(self):
+        self.condition = SCREENER_CONDITIONS[self.KEY]["condition"]
+        # More rows than one streamed chunk.
+        self.rows = [StockRow(rank, f"SYM{rank}", 0.5, 100.0 + rank, 1000) for rank in range(1, 1201)]
+        self.record()
+
+    def record(self):
+        # Served from the recorded run, without a scan.
+        screener_cache.delete(self.KEY, self.condition)
+        self.addCleanup(screener_cache.delete, self.KEY, self.condition)
+        return record_scan(self.KEY, self.condition, self.rows, "chartink")
+
+    def download(self, fmt="csv", **extra):
+        return self.client.get("/download/", {"screener_name": self.KEY, "format": fmt}, **extra)
+
+    def content(self, response):
+        if response.is_async:  # ASYNC_VIEWS
+            async def collect():
+                return b"".join([chunk async for chunk in response])
+            return asyncio.run(collect())
+        return b"".join(response)
+
+    def test_csv(self):
+        response = self.download()
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(response["Content-Disposition"], f'attachment; filename="{self.KEY}_stocks.csv"')
+        lines = self.content(response).decode().splitlines()
+        self.assertEqual(lines[0], "Rank,Stock Symbol,Percent Change,Current Price,Trade Volume")
+        self.assertEqual(lines[1:], [",".join(map(str, row.as_tuple())) for row in self.rows])
+
+    def test_repeat_download_of_a_run_is_not_modified(self):
+        etag = self.download()["ETag"]
+        response = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertNotEqual(self.download("jsonl")["ETag"], etag)
+
+        self.record()
+        response = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_other_formats(self):
+        response = self.download("jsonl")
+        lines = self.content(response).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [row.as_dict() for row in self.rows])
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        content = self.content(self.download("arrow"))
+        table = pa.ipc.open_stream(content).read_all()
+        self.assertEqual(table.column("stock_name").to_pylist(), [row.stock_name for row in self.rows])
+        table = pq.read_table(io.BytesIO(self.download("parquet").content))
+        self.assertEqual(table.column("current_price").to_pylist(), [row.current_price for row in self.rows])
+
+        self.assertEqual(self.download("xls").status_code, 400)
+
+
+@override_settings(ALLOWED_HOSTS=["*"], CACHES=LOCMEM_CACHES)
+class ResultsApiTests(TestCase):
+    KEY = "vcp_tightness"
+    URL = f"/api/screeners/{KEY}/results/"
+
+    def setUp(self):
+        self.condition = SCREENER_CONDITIONS[self.KEY]["condition"]
+        self.rows = [StockRow(rank, f"SYM{rank}", rank % 5 - 2.0, 10.0 * rank, 1000 * rank) for rank in range(1, 21)]
+        self.rows[3].current_price = None
+        self.record()
+        self.client.force_login(User.objects.create_user("u", password="p"))
+
+    def record(self):
+        # Served from the recorded run, without a scan.
+        screener_cache.delete(self.KEY, self.condition)
+        self.addCleanup(screener_cache.delete, self.KEY, self.condition)
+        return record_scan(self.KEY, self.condition, self.rows, "chartink")
+
+    def get(self, **params):
+        return self.client.get(self.URL, params)
+
+    def symbols(self, response):
+        return [row["stock_name"] for row in response.json()["results"]]
+
+    def test_cursor_pages_through_every_row_once(self):
+        seen, params = [], {"limit": 7}
+        while True:
+            payload = self.get(**params).json()
+            self.assertEqual(payload["total"], 20)
+            seen += [row["stock_name"] for row in payload["results"]]
+            if payload["next_cursor"] is None:
+                break
+            params["cursor"] = payload["next_cursor"]
+        self.assertEqual(seen, [row.stock_name for row in self.rows])
+
+    def test_sort_and_filter(self):
+        by_price = self.symbols(self.get(sort="-price", limit=20))
+        self.assertEqual(by_price[:2], ["SYM20", "SYM19"])
+        # Missing values sort last either way.
+        self.assertEqual(by_price[-1], "SYM4")
+        self.assertEqual(self.symbols(self.get(sort="price", limit=20))[-1], "SYM4")
+
+        response = self.get(min_price=50, max_price=80, min_change=0)
+        self.assertEqual(self.symbols(response), ["SYM7", "SYM8"])
+        self.assertEqual(response.json()["total"], 2)
+
+        symbols = self.client.get(f"/api/screeners/{self.KEY}/symbols/", {"min_volume": 18000}).json()
+        self.assertEqual(symbols["symbols"], ["SYM18", "SYM19", "SYM20"])
+
+    def test_bad_parameters(self):
+        cursor = self.get(limit=5).json()["next_cursor"]
+        for params in ({"limit": 0}, {"limit": "ten"}, {"sort": "name"}, {"min_price": "cheap"},
+                       {"cursor": "not-a-cursor"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.get(**params).status_code, 400)
+
+        self.record()
+        response = self.get(limit=5, cursor=cursor)
+        self.assertEqual(response.status_code, 409)
+        self.assertIn("restart from the first page", response.json()["error"])
+
+    def test_page_rejects_limits_and_cursors_that_cannot_advance(self):
+        entry = self.record()
+        first = results.page(entry, {"limit": "15"})
+        self.assertEqual(len(first["results"]), 15)
+        second = results.page(entry, {"limit": "15", "cursor": first["next_cursor"]})
+        self.assertEqual(([row["stock_name"] for row in second["results"]], second["next_cursor"]),
+                         ([row.stock_name for row in self.rows[15:]], None))
+        for params in ({"limit": "0"}, {"limit": "-2"}, {"limit": "x"},
+                       {"cursor": results.encode_cursor(entry_version(entry), -2)}):
+            with self.assertRaises(ValueError):
+                results.page(entry, params)
+
+
+class ChangeTests(TestCase):
+    def rows(self, *symbols):
+        return [StockRow(rank, symbol, 1.0, 100.0, 1000) for rank, symbol in enumerate(symbols, 1)]
+
+    def test_diff(self):
+        delta = changes.diff({"A": 1, "B": 2, "C": 3}, {"C": 1, "D": 2, "A": 3, "E": 4})
+        self.assertEqual(delta, {"entered": ["D", "E"], "exited": ["B"], "moved": {"C": [3, 1], "A": [1, 3]}})
+
+    def test_runs_store_their_delta(self):
+        first = record_scan("vcp", {"scan_clause": "x"}, self.rows("A", "B", "C"), "chartink")
+        self.assertIsNone(first["delta"])
+        second = record_scan("vcp", {"scan_clause": "x"}, self.rows("B", "A", "D"), "chartink")
+        third = record_scan("vcp", {"scan_clause": "x"}, self.rows("B", "A", "D", "E"), "chartink")
+
+        self.assertEqual(second["previous_run_id"], first["run_id"])
+        self.assertEqual(second["delta"], {"entered": ["D"], "exited": ["C"], "moved": {"B": [2, 1], "A": [1, 2]}})
+        self.assertEqual(delta_since("vcp", third, second["run_id"]), third["delta"])
+        self.assertEqual(delta_since("vcp", third, first["run_id"])["entered"], ["D", "E"])
+        self.assertEqual(delta_since("vcp", third, third["run_id"]), changes.EMPTY)
+        with self.assertRaises(changes.UnknownRun):
+            delta_since("other", third, first["run_id"])
+        new = [row["stock_name"] for row in results.page(third, {})["results"] if row["new"]]
+        self.assertEqual(new, ["E"])
+
+
+@override_settings(
+    ALLOWED_HOSTS=["*"],
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "sessions": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "sessions-tests"},
+    },
+)
+class SessionTests(TestCase):
+    DEVICE = {"REMOTE_ADDR": "10.0.0.1", "HTTP_USER_AGENT": "Firefox"}
+
+    def session_queries(self, **device):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get("/", **device).status_code, 200)
+        return [q["sql"] for q in queries if "user_sessions_session" in q["sql"]]
+
+    def test_reads_are_cached_and_device_writes_throttled(self):
+        self.client.force_login(User.objects.create_user("u", password="p"))
+        self.assertEqual(len(self.session_queries(**self.DEVICE)), 1)  # records the device
+        self.assertEqual(self.session_queries(**self.DEVICE), [])
+        moved = self.session_queries(REMOTE_ADDR="10.0.0.2", HTTP_USER_AGENT="Firefox")
+        self.assertEqual(len(moved), 1)
+        self.assertTrue(moved[0].startswith("UPDATE"))
+        key = self.client.session.session_key
+        self.assertEqual(Session.objects.get(session_key=key).ip, "10.0.0.2")
+
+        with override_settings(SESSION_ACTIVITY_INTERVAL=0):
+            self.assertEqual(len(self.session_queries(REMOTE_ADDR="10.0.0.2", HTTP_USER_AGENT="Firefox")), 1)
+
+        # Logging out forgets the cached copy too.
+        self.client.post("/logout/")
+        self.assertFalse(SessionStore().exists(key))
+        self.assertIsNone(self.client.session.get("_auth_user_id"))
+
+    def test_deleted_sessions_are_logged_out(self):
+        user = User.objects.create_user("u", password="p")
+        other = self.client_class()
+        for client in (self.client, other):
+            client.force_login(user)
+            self.assertEqual(client.get("/", **self.DEVICE).status_code, 200)
+
+        self.client.post("/sessions/account/sessions/other/delete/")
+        self.assertEqual(self.client.get("/", **self.DEVICE).status_code, 200)
+        self.assertRedirects(other.get("/", **self.DEVICE), "/login/?next=/", fetch_redirect_response=False)
+
+        # A row deleted without the signal is caught by the next activity write.
+        key = self.client.session.session_key
+        Session.objects.filter(session_key=key)._raw_delete(Session.objects.db)
+        with override_settings(SESSION_ACTIVITY_INTERVAL=0):
+            self.assertRedirects(self.client.get("/", **self.DEVICE), "/login/?next=/", fetch_redirect_response=False)
+        self.assertFalse(SessionStore().exists(key))
+
+    def test_activity_writes_keep_the_cache_within_the_row_expiry(self):
+        self.client.force_login(User.objects.create_user("u", password="p"))
+        key = self.client.session.session_key
+        Session.objects.filter(session_key=key).update(expire_date=timezone.now() + timedelta(seconds=60))
+        caches["sessions"].delete(KEY_PREFIX + key)
+        set_ = self.enterContext(mock.patch.object(caches["sessions"], "set", wraps=caches["sessions"].set))
+
+        self.assertEqual(len(self.session_queries(**self.DEVICE)), 2)  # load, then record the device
+        self.assertEqual([call.args[0] for call in set_.call_args_list], [KEY_PREFIX + key] * 2)
+        self.assertTrue(all(call.args[2] <= 60 for call in set_.call_args_list))
+
+
+class LiveTests(SimpleTestCase):
+    def test_one_event_fans_out_and_slow_subscribers_drop_the_oldest(self):
+        hub = live.Hub(dict(live.DEFAULTS, QUEUE_SIZE=2))
+        subscribers = [live.Subscriber(["vcp"], 2) for _ in range(3)]
+        hub.subscribers["vcp"] = set(subscribers)
+        entry = {"rows": [StockRow(1, "A", 1.0, 10.0, 5)], "fetched_at": 0.0, "run_id": 7,
+                 "previous_run_id": 6, "delta": {"entered": ["A"], "exited": ["B"], "moved": {}}}
+        event = live.update_event("vcp", entry)
+        self.assertTrue(event.startswith(b"event: update\nid: 7\ndata: "))
+        self.assertIn(b'"since":6', event)
+
+        for message in (b"1", b"2", event):
+            hub.publish("vcp", message)
+        for subscriber in subscribers:
+            self.assertEqual([subscriber.queue.get_nowait() for _ in range(2)], [b"2", event])
+            self.assertEqual(subscriber.dropped, 1)
+        self.assertIs(hub.latest["vcp"], event)
+
+
+class FanoutTests(SimpleTestCase):
+    SCREENERS = {"slow": {"name": "Slow", "condition": {}}, "bad": {"name": "Bad", "condition": {}}}
+
+    def entry(self, *symbols):
+        return {"rows": [StockRow(rank, s, 1.0, 10.0, 5) for rank, s in enumerate(symbols, 1)],
+                "fetched_at": 1700000000.0, "run_id": 1}
+
+    def scans(self):
+        return {"a": self.entry("X", "Y"), "b": self.entry("Y", "Z"), "c": self.entry("Y"),
+                "bad": ValueError("no data"), "slow": self.entry("X")}
+
+    def test_outcomes_keep_input_order_and_report_failures(self):
+        scans = self.scans()
+
+        def scan(key, condition):
+            if key == "slow":
+                time.sleep(0.5)
+            elif isinstance(scans[key], Exception):
+                raise scans[key]
+            return scans[key]
+
+        async def ascan(key, condition):
+            if key == "slow":
+                await asyncio.sleep(0.5)
+            return scan(key, condition)
+
+        self.enterContext(mock.patch.object(fanout, "get_screener_result", scan))
+        self.enterContext(mock.patch.object(fanout, "aget_screener_result", ascan))
+
+        screeners = {key: {"name": key.title(), "condition": {}} for key in ("slow", "a", "bad", "b", "c")}
+        for outcomes in (fanout.run_many(screeners, timeout=0.1),
+                         asyncio.run(fanout.arun_many(screeners, timeout=0.1))):
+            self.assertEqual([(o["key"], o["status"]) for o in outcomes],
+                             [("slow", "timeout"), ("a", "ok"), ("bad", "error"), ("b", "ok"), ("c", "ok")])
+            self.assertEqual(outcomes[2]["error"], "ValueError: no data")
+            self.assertEqual(outcomes[1]["rows"], scans["a"]["rows"])
+            self.assertEqual([(h["symbol"], h["hits"], h["screeners"]) for h in fanout.confluence(outcomes)],
+                             [("Y", 3, ["a", "b", "c"]), ("X", 1, ["a"]), ("Z", 1, ["b"])])
+
+    def test_a_failure_cancels_and_awaits_the_other_screeners(self):
+        scans = []
+
+        async def scan(key, condition):
+            if key == "bad":
+                return {}  # no fetched_at: building its outcome raises KeyError
+            scans.append(asyncio.current_task())
+            await asyncio.sleep(10)
+
+        self.enterContext(mock.patch.object(fanout, "aget_screener_result", scan))
+
+        async def run():
+            with self.assertRaises(KeyError):
+                await fanout.arun_many(self.SCREENERS, timeout=5)
+            pending = [task for task in asyncio.all_tasks()
+                       if task.get_coro().__qualname__.endswith("run_one") and not task.done()]
+            for task in scans:
+                task.cancel()
+            return pending
+
+        self.assertEqual(asyncio.run(run()), [])
+
+
+class CombineTests(SimpleTestCase):
+    KEYS = frozenset({"a", "b", "c"})
+
+    def entry(self, version, *symbols):
+        return {"rows": [StockRow(rank, s, 1.0, 10.0, 5) for rank, s in enumerate(symbols, 1)],
+                "fetched_at": float(version), "run_id": version}
+
+    def test_parse(self):
+        self.assertEqual(combine.parse("a and (b OR c) and not c", self.KEYS).text, "a AND (b OR c) AND NOT c")
+        self.assertEqual(combine.parse("a & b | c - a", self.KEYS).text, "a AND b OR c AND NOT a")
+        self.assertEqual(combine.parse("(c or b) and a", self.KEYS).keys, ["c", "b", "a"])
+        for bad in ("", "a AND", "a b", "(a OR b", "a AND d", "a ; b"):
+            with self.assertRaises(ValueError):
+                combine.parse(bad, self.KEYS)
+        self.assertEqual(combine.parse("(" * 32 + "a" + ")" * 32, self.KEYS).text, "a")
+        for deep in ("(" * 400 + "a" + ")" * 400, "NOT " * 200 + "a"):
+            with self.assertRaisesMessage(ValueError, "expression nested too deeply"):
+                combine.parse(deep, self.KEYS)
+
+    def test_combine_ranks_by_leftmost_screener(self):
+        sets = combine.ScreenerSets()
+        entries = {"a": self.entry(1, "X", "Y", "Z"), "b": self.entry(2, "W", "Z", "Y"), "c": self.entry(3, "Y")}
+        entry = sets.combine(combine.parse("b AND a AND NOT c", self.KEYS), entries)
+        self.assertEqual([(r.rank, r.stock_name) for r in entry["rows"]], [(1, "Z")])
+        entry = sets.combine(combine.parse("a OR b", self.KEYS), entries)
+        self.assertEqual([r.stock_name for r in entry["rows"]], ["X", "Y", "Z", "W"])
+        self.assertEqual(entry["fetched_at"], 2.0)
+
+        # A new run of one screener is rebuilt; symbols interned since widen the others.
+        entries["c"] = self.entry(4, "V", "X")
+        entry = sets.combine(combine.parse("a AND c", self.KEYS), entries)
+        self.assertEqual([r.stock_name for r in entry["rows"]], ["X"])
+        self.assertEqual(len(sets.index), 5)
+
+
+@override_settings(
+    ALLOWED_HOSTS=["*"],
+    CACHES=LOCMEM_CACHES,
+)
+class RenderTests(TestCase):
+    KEY = "vcp_tightness"
+
+    def setUp(self):
+        condition = SCREENER_CONDITIONS[self.KEY]["condition"]
+        rows = [StockRow(rank, f"SYM{rank}", 1.0, 100.0, 1000) for rank in range(1, 60)]
+        self.run = record_scan(self.KEY, condition, rows, "chartink")
+        # Served from the recorded run, without a scan.
+        screener_cache.delete(self.KEY, condition)
+        self.addCleanup(screener_cache.delete, self.KEY, condition)
+        # Run ids repeat across tests, which roll back the database.
+        caches["template_fragments"].clear()
+        self.client.force_login(User.objects.create_user("u", password="p"))
+
+    def test_result_table_is_cached_per_run(self):
+        fragment = make_template_fragment_key("results_table", [f"{self.KEY}:{self.run['run_id']}"])
+        self.assertIsNone(caches["template_fragments"].get(fragment))
+        response = self.client.post("/", {"screener_name": self.KEY})
+        self.assertContains(response, "SYM59")
+        self.assertIn("SYM59", caches["template_fragments"].get(fragment))
+        self.assertContains(self.client.get("/"), 'value="%s"' % self.KEY)
+
+    def test_json_is_brotli_and_pages_with_a_csrf_token_are_gzip(self):
+        api = self.client.get(f"/api/screeners/{self.KEY}/results/", HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(api["Content-Encoding"], "br")
+        self.assertEqual(json.loads(brotli.decompress(api.content))["results"][0]["stock_name"], "SYM1")
+        page = self.client.post("/", {"screener_name": self.KEY}, HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(page["Content-Encoding"], "gzip")
+        self.assertIn(b"SYM59", gzip.decompress(page.content))
+        self.assertNotIn("Content-Encoding", self.client.get(f"/api/screeners/{self.KEY}/results/"))
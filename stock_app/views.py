@@ -1,631 +1,445 @@
-import requests
-from bs4 import BeautifulSoup as bs
-import pandas as pd
+from django.conf import settings
 from django.shortcuts import render
-from django.http import HttpResponse
-from datetime import datetime
-import pytz
+from django.http import Http404, HttpResponse, JsonResponse
+from datetime import date
+import logging
+import math
+import time
 from django.contrib.auth.decorators import login_required
+from django.utils.crypto import constant_time_compare
 from django.shortcuts import render
 
-# =========================
-# Screener definitions
-# =========================
-SCREENER_CONDITIONS = {
-    "episodic_pivot": {
-        "name": "Episodic Pivot (4.5% GAP)",
-        "condition": {
-            "scan_clause": "( {cash} ( latest open > 1 day ago close * 1.05 and latest close > 20 ) )"
-        }
-    },
-    "momentum_compression": {
-        "name": "10 Year IPO Setups",
-        "condition": {
-            "scan_clause": "( {cash} ( ( {cash} ( latest close / 1 month ago close > 1.2 and market cap > 0 and latest max( 3 , latest high ) / latest min( 3 , latest low ) <= 1.07 and latest volume > 5000 and market cap > 100 ) ) ) )"
-        }
-    },
-    "ipo_3_years": {
-        "name": "IPO's Listed in Last 3 Years",
-        "condition": {
-            "scan_clause": "( {cash} ( ( {cash} ( latest volume > 10000 and market cap > 500 and( {cash} not( 800 days ago close > 0 ) ) ) ) and latest close >= 1 day ago max( 252 , latest high ) * 0.75 and latest close <= 1 day ago max( 252 , latest high ) ) )"
-        }
-    },
-    "ipo_1_year": {
-        "name": "Recent IPOs: Last 1 Year",
-        "condition": {
-            "scan_clause": "( {cash} ( latest volume > 10000 and market cap > 500 and( {cash} not( 250 days ago close > 0 ) ) ) )"
-        }
-    },
-    "multi_year_breakout": {
-        "name": "Multi-Year Breakout Scanner (2Y–10Y Highs)",
-        "condition": {
-            "scan_clause": "( {cash} ( latest high = latest max( 520 , latest high ) and latest high = latest max( 780 , latest high ) and latest high = latest max( 1040 , latest high ) and latest high = latest max( 1300 , latest high ) and latest high = latest max( 1820 , latest high ) and latest high = latest max( 1560 , latest high ) and latest high = latest max( 2080 , latest high ) and latest high = latest max( 2340 , latest high ) and latest high = latest max( 2600 , latest high ) ) )"
-        }
-    },
-    "ten_year_range_breakout": {
-        "name": "10-Year Range Multi-Year Breakout",
-        "condition": {
-            "scan_clause": "( {cash} ( ( {cash} ( ( {cash} ( 120 months ago high > monthly close * .9 or 119 months ago high > monthly close * .9 or 118 months ago high > monthly close * .9 or 117 months ago high > monthly close * .9 or 116 months ago high > monthly close * .9 or 115 months ago high > monthly close * .9 or 114 months ago high > monthly close * .9 or 113 months ago high > monthly close * .9 or 112 months ago high > monthly close * .9 or 111 months ago high > monthly close * .9 or 110 months ago high > monthly close * .9 or 60 months ago max( 50 , monthly high ) > monthly close * .9 ) ) and 1 month ago max( 60 , monthly high ) < monthly close ) ) ) )"
-        }
-    },
-    "big_green_tight_consolidation": {
-        "name": "Big Green Candle + 3 Tight Candles",
-        "condition": {
-            "scan_clause": "( {cash} ( 3 days ago \"close - 1 candle ago close / 1 candle ago close * 100\" >= 5 and latest max( 3 , latest high - latest low ) < ( 3 days ago high - 3 days ago low ) * 0.75 and ( 3 days ago high - 3 days ago low ) * 0.60 < 3 days ago close - 3 days ago open and latest close >= 52 weeks ago high * 0.75 and market cap >= 500 ) )"
-        }
-    },
-    "multiyear_accumulation": {
-        "name": "Multiyear Accumulation Dashboard",
-        "condition": {
-            "scan_clause": "( {cash} ( latest close > latest max( 750 , latest high ) * 0.90 and latest close < latest max( 750 , latest high ) * 1.1 and latest count( 125, 1 where latest close > 1 day ago max( 750 , latest high ) and 1 day ago close <= 2 day ago max( 750 , latest high ) ) = 0 and market cap > 200 ) )"
-        }
-    },
-    "ipo_base_4day": {
-        "name": "4 Day IPO Base (Inside Bar)",
-        "condition": {
-            "scan_clause": "( {cash} ( latest high < 4 days ago high and 1 day ago high < 4 days ago high and 2 days ago high < 4 days ago high and 3 days ago high < 4 days ago high and 1 day ago low > 4 days ago low and 2 days ago low > 4 days ago low and 3 days ago low > 4 days ago low and latest low > 4 days ago low and ( {cash} ( market cap > 100 and ( {cash} not( 12 months ago close > 0 ) ) and latest volume > 5000 ) ) ) )"
-        }
-    },
-    "vcp_tightness": {
-        "name": "VCP Tightness",
-        "condition": {
-            "scan_clause": "( {cash} ( latest ema( latest close , 10 ) <= latest ema( latest close , 50 ) * 1.03 and latest ema( close,50 ) > latest ema( close,200 ) and latest rsi( 14 ) >= 45 and market cap >= 500 and latest ema( close,200 ) > 1 month ago ema( close,200 ) and latest high <= 1 day ago high and latest low >= 1 day ago low ) )"
-        }
-    },
-    "ipo_base": {
-        "name": "IPO Base Scan",
-        "condition": {
-            "scan_clause": "( {cash} ( market cap > 100 and( {cash} not( 12 months ago close > 0 ) ) and latest volume > 5000 ) )"
-        }
-    },
-    "all_tradable_stocks": {
-        "name": "All Tradable Stocks",
-        "condition": {
-            "scan_clause": "( {cash} ( latest close > 25 and latest close <= 10000 and market cap >= 300 and latest {custom_indicator_176230_start}\"(  sma(  close , 50 ) *  sma(  volume , 50 ) ) / 10000000\"{custom_indicator_176230_end} >= 5 ) )"
-        }
-    },
-    "smc_tradable_universe_near_ath": {
-        "name": "SMC Tradable Universe: 25% Near ATH Stocks",
-        "condition": {
-            "scan_clause": "( {cash} ( latest close >= 10 years ago high * 0.75 and market cap >= 500 and latest close > 20 and latest volume > 5000 and latest close > latest \"wma( ( ( 2 * wma( (latest close), 100) ) - wma((latest close), 200) ), 14)\" and latest close > latest \"wma( ( ( 2 * wma( (latest close), 25) ) - wma((latest close), 50) ), 7)\" ) )"
-        }
-    },
-    "minervini_stage_2": {
-        "name": "Minervini Stage 2 Stocks",
-        "condition": {
-            "scan_clause": "( {cash} ( ( {cash} ( latest close > latest ema( close,50 ) and latest ema( close,50 ) > latest ema( close,150 ) and latest ema( close,150 ) > latest ema( close,200 ) and latest close >= 1.33 * weekly min( 52 , weekly low ) and latest close * 1.43 >= weekly max( 52 , weekly high ) and latest ema( close,200 ) > 1 month ago ema( close,200 ) and latest close >= 25 and latest volume > 1000 and latest close > 1 day ago min( 504 , latest low ) * 1.5 ) ) ) )"
-        }
-    },
-    "epo_intraday": {
-        "name": "EPo (Intraday Opportunities)",
-        "condition": {
-            "scan_clause": "( {cash} ( ( {cash} ( latest close > 1 day ago close * 1.06 and latest volume > latest sma( latest volume , 20 ) * 4 and latest close > 1 day ago max( 20 , latest close ) and ( latest close - latest low ) / ( latest high - latest low ) > 0.7 and latest close * latest volume > 500000 ) ) ) )"
-        }
-    },
-    "hve_highest_volume_ever": {
-        "name": "Highest Volume – EVER (HVE)",
-        "condition": {
-            "scan_clause": "( {cash} ( ( {cash} ( latest volume >= 1 day ago max( 600 , latest volume ) and latest \"close - 1 candle ago close / 1 candle ago close * 100\" >= 0 and market cap > 500 ) ) ) )"
-        }
-    },
-    "hvy_highest_volume_yearly": {
-        "name": "Highest Volume – YEARLY (HVY)",
-        "condition": {
-            "scan_clause": "( {cash} ( ( {cash} ( ( {cash} ( latest volume = ( latest max( 252 , latest volume ) ) or latest close >= 20 or market cap >= 100 or weekly sma( weekly volume , 10 ) > 100000 or latest sma( latest volume , 50 ) * latest close > 500000 or latest close >= 1 day ago close ) ) ) ) ) )"
-        }
-    },
-    "hve_hvy_hvq": {
-        "name": "HVE / HVY / HVQ (Highest Volume Combined)",
-        "condition": {
-            "scan_clause": """( {cash} ( 
-                ( {cash} ( 
-                    ( {cash} ( 
-                        latest volume = ( latest max( 2000 , latest volume ) ) 
-                        or latest volume = ( latest max( 252 , latest volume ) ) 
-                        or latest volume = ( latest max( 63 , latest volume ) ) 
-                    ) ) 
-                    and ( {cash} ( 
-                        latest close >= 20 
-                        and market cap >= 100 
-                        and weekly sma( weekly volume , 10 ) > 100000 
-                        and latest sma( latest volume , 50 ) * latest close > 5000000 
-                    ) ) 
-                    and latest close >= 1 day ago close 
-                ) ) 
-            ) )"""
-        }
-    },
-    "volume_buzz": {
-        "name": "Volume Buzz",
-        "condition": {
-            "scan_clause": """( {cash} (
-                ( {cash} (
-                    ( {cash} (
-                        latest volume > latest max( 10 , latest volume * latest count( 1 , 1 where latest close < latest open ) )
-                        or ( {cash} (
-                            ( {cash} ( 1 day ago close > 2 days ago close )
-                                or ( {cash} ( 1 day ago close < 2 days ago close and 1 day ago volume < latest volume ) )
-                            )
-                            and ( {cash} ( 2 days ago close > 3 days ago close
-                                or ( {cash} ( 2 days ago close < 3 days ago close and 2 days ago volume < latest volume ) )
-                            ) )
-                            and ( {cash} ( 3 days ago close > 4 days ago close
-                                or ( {cash} ( 3 days ago close < 4 days ago close and 3 days ago volume < latest volume ) )
-                            ) )
-                            and ( {cash} ( 4 days ago close > 5 days ago close
-                                or ( {cash} ( 4 days ago close < 5 days ago close and 4 days ago volume < latest volume ) )
-                            ) )
-                            and ( {cash} ( 5 days ago close > 6 days ago close
-                                or ( {cash} ( 5 days ago close < 6 days ago close and 5 days ago volume < latest volume ) )
-                            ) )
-                            and ( {cash} ( 6 days ago close > 7 days ago close
-                                or ( {cash} ( 6 days ago close < 7 days ago close and 6 days ago volume < latest volume ) )
-                            ) )
-                            and ( {cash} ( 7 days ago close > 8 days ago close
-                                or ( {cash} ( 7 days ago close < 8 days ago close and 7 days ago volume < latest volume ) )
-                            ) )
-                            and ( {cash} ( 8 days ago close > 9 days ago close
-                                or ( {cash} ( 8 days ago close < 9 days ago close and 8 days ago volume < latest volume ) )
-                            ) )
-                            and ( {cash} ( 9 days ago close > 10 days ago close
-                                or ( {cash} ( 9 days ago close < 10 days ago close and 9 days ago volume < latest volume ) )
-                            ) )
-                        and ( {cash} ( 10 days ago close > 11 days ago close
-                          or ( {cash} ( 10 days ago close < 11 days ago close and 10 days ago volume < latest volume ) )
-                        ) )
-                    ) )
-                ) )
-            ) )
-            and latest close >= 1 day ago close
-            and ( {cash} (
-                latest close >= 20
-                and market cap >= 100
-                and weekly sma( weekly volume , 10 ) > 100000
-                and latest sma( latest volume , 50 ) * latest close > 5000000
-            ) )
-            and ( {cash} (
-                latest close > latest sma( latest close , 50 )
-                and latest close > latest sma( latest close , 200 )
-                and latest close > 1.3 * weekly min( 52 , weekly low )
-                and latest close > 0.75 * weekly max( 52 , weekly high )
-                and latest low <= latest wma( latest close , 10 )
-            ) )
-            ) )"""
-        }
-    },
-    "flags_formation": {
-        "name": "Flags Formation",
-        "condition": {
-        "scan_clause": """( {cash} (
-            ( {cash} (
-                    latest close > 25
-                    and latest close <= 10000
-                    and market cap >= 300
-                    and weekly "close - 1 candle ago close / 1 candle ago close * 100" > 19
-                    and latest {custom_indicator_176230_start}"( sma( close , 50 ) * sma( volume , 50 ) ) / 10000000"{custom_indicator_176230_end} > 5
-                ) )
-            ) )"""
-        }
-    },
-    "tight_flag": {
-        "name": "Tight Flag",
-        "condition": {
-            "scan_clause": """( {cash} (
-                ( {cash} (
-                    latest close / 1 month ago close > 1.2
-                    and market cap > 0
-                    and latest max( 3 , latest high ) / latest min( 3 , latest low ) <= 1.07
-                    and latest volume > 5000
-                    and latest close > 20
-                ) )
-            ) )"""
-        }
-    },
-    "tight_weekly_base": {
-        "name": "Tight Weekly Base",
-        "condition": {
-            "scan_clause": """( {cash} ( ( {cash} ( ( {cash} ( ( {cash} ( 
-                latest high > 50 
-                and latest close > latest sma( latest close , 20 ) 
-                and latest sma( latest volume , 50 ) >= 5000 
-                and latest close > latest ema( latest close , 50 ) 
-                and abs( ( weekly max( 3 , weekly close ) / weekly min( 3 , weekly close ) - 1 ) * 100 ) <= 2 
-                and ( ( 3 weeks ago max( 12 , weekly close ) / 3 weeks ago min( 12 , weekly close ) - 1 ) * 100 ) >= 30 
-                and latest {custom_indicator_176230_start}"( sma( close , 50 ) * sma( volume , 50 ) ) / 10000000"{custom_indicator_176230_end} > 5 
-            ) ) ) ) ) ) ) )"""
-        }
-    },
-    "power_trend_squeeze": {
-        "name": "Power Trend Squeeze",
-        "condition": {
-            "scan_clause": """( {cash} ( ( {cash} ( ( {cash} ( 
-                latest close > latest sma( close,200 ) 
-                and latest close > latest sma( close,150 ) 
-                and latest sma( close,150 ) > latest sma( close,200 ) 
-                and latest sma( close,200 ) > 25 days ago sma( close,200 ) 
-                and latest sma( close,50 ) > latest sma( close,150 ) 
-                and latest close > latest sma( close,50 ) 
-                and latest close > 30 
-                and 1 day ago close * 0.02 >= ( 1 day ago high - 1 day ago low ) 
-            ) ) ) ) ) )"""
-        }
-    },
-    "darvas_box": {
-        "name": "Darvas Box",
-        "condition": {
-            "scan_clause": """( {cash} ( ( {cash} (
-                latest close >= 20
-                and market cap >= 500
-                and ( {cash} (
-                    3 days ago high > 2 days ago high
-                    and 3 days ago high > 1 day ago high
-                    and 3 days ago high > latest high
-                    and 3 days ago low < 2 days ago low
-                    and 3 days ago low < 1 day ago low
-                    and 3 days ago low < latest low
-                ) )
-            ) ) ) )"""
-        }
-    },
-    "golden_crossover": {
-        "name": "Golden Crossover (50EMA > 200EMA)",
-        "condition": {
-            "scan_clause": """( {cash} ( ( {cash} (
-                latest ema( latest close , 50 ) > latest ema( latest close , 200 )
-                and 1 day ago ema( latest close , 50 ) <= 1 day ago ema( latest close , 200 )
-                and latest {custom_indicator_176230_start}"(
-                    sma( close , 50 ) * sma( volume , 50 )
-                ) / 10000000"{custom_indicator_176230_end} > 5
-            ) ) ) )"""
-        }
-    },
-    "liquid_ipos_2y": {
-        "name": "Liquid IPOs (2Y)",
-        "condition": {
-            "scan_clause": """( {cash} ( ( {cash} ( ( {cash} (
-                latest close > 20
-                and latest ema( latest volume , 20 ) > 50000
-                and ( {cash} not( 2 years ago close > 0 ) )
-                and weekly high < 1 week ago high * 1.01
-                and weekly low > 1 week ago low * 0.99
-                and market cap > 100
-            ) ) ) ) ) )"""
-        }
-    },
-    "stocks_near_highs": {
-        "name": "Stocks Near Highs",
-        "condition": {
-            "scan_clause": """( {cash} ( ( {cash} (
-                latest close >= weekly max( 52 , weekly high ) * 0.75
-                and latest close >= weekly max( 52 , weekly low ) * 1
-                and latest close >= 30
-                and market cap <= 30000
-                and latest close > latest sma( close,200 )
-                and latest close > latest sma( close,50 )
-                and latest sma( close,50 ) > latest sma( close,200 )
-                and latest close <= 3000
-                and latest sma( close,200 ) > 1 month ago sma( close,200 )
-                and 1 month ago sma( close,200 ) > 2 months ago sma( close,200 )
-                and 2 months ago sma( close,200 ) > 3 months ago sma( close,200 )
-            ) ) ) )"""
-        }
-    },
-    "vcp_minervini": {
-        "name": "Volatility Contraction Pattern (VCP) - Mark Minervini",
-        "condition": {
-            "scan_clause": """( {cash} (
-                weekly ema( close,13 ) > weekly ema( close,26 )
-                and weekly ema( close,26 ) > weekly sma( close,50 )
-                and weekly sma( close,40 ) > 5 weeks ago sma( close,40 )
-                and latest close >= weekly min( 50 , weekly low * 1.3 )
-                and latest close >= weekly max( 50 , weekly high * 0.75 )
-                and 20 days ago ema( close,13 ) > 20 weeks ago ema( close,26 )
-                and 5 weeks ago sma( close,40 ) > 10 weeks ago sma( close,40 )
-                and latest close > latest sma( close,50 )
-                and ( weekly wma( close,8 ) - weekly sma( close,8 ) ) * 6 / 29 < 0.5
-                and latest close > 10
-            ) )"""
-        }
-    },
-    "perfectly_stacked_ma": {
-        "name": "Perfectly Stacked Moving Average",
-        "condition": {
-            "scan_clause": """( {cash} ( 
-                ( {cash} (
-                    weekly ema( weekly close , 13 ) > weekly ema( weekly close , 26 )
-                    and weekly ema( weekly close , 26 ) > weekly sma( weekly close , 50 )
-                    and weekly sma( weekly close , 40 ) > 5 weeks ago sma( 5 weeks ago close , 40 )
-                    and latest close >= weekly min( 50 , weekly low * 1.3 )
-                    and latest close >= weekly max( 50 , weekly high * 0.75 )
-                    and 20 days ago ema( 20 days ago close , 13 ) > 20 weeks ago ema( 20 weeks ago close , 26 )
-                    and 5 weeks ago sma( weekly close , 40 ) > 10 weeks ago sma( 5 weeks ago close , 40 )
-                    and latest close > latest sma( latest close , 50 )
-                    and ( weekly wma( weekly close , 8 ) - weekly sma( weekly close , 8 ) ) * 6 / 29 < 0.5
-                    and latest close > 100
-                    and latest close > latest open
-                    and latest close > weekly open
-                    and latest close > monthly open
-                    and latest low > 1 day ago close - abs( 1 day ago close / 222 )
-                    and latest volume * latest close >= 10000000
-                ) )
-            ) )"""
-        }
-    },
-    "high_flags": {
-        "name": "High Flags",
-        "condition": {
-            "scan_clause": """( {cash} ( 
-                ( {cash} (
-                    ( latest max( 60 , latest high - 60 days ago close ) ) / 60 days ago close > 0.70
-                    and latest max( 20 , latest high ) < latest max( 60 , latest high )
-                    and latest min( 20 , latest close ) > 1 day ago max( 250 , latest high ) * 0.80
-                ) )
-            ) )"""
-        }
-    },
-    "promoter_stake_increase": {
-        "name": "Promoter Stake Increase (>1%)",
-        "condition": {
-            "scan_clause": """( {cash} (
-                ( {cash} (
-                    quarterly indian promoter and group shareholders > 1 quarter ago indian promoter and group shareholders * 1.01
-                    and quarterly insurance companies percentage > 2
-                ) )
-            ) )"""
-        }
-    },
-    "retail_stake_increase": {
-        "name": "Retail Stake Increase (>3%)",
-        "condition": {
-            "scan_clause": """( {cash} (
-                ( {cash} (
-                    ( quarterly individuals share capital up to rs 1 lakh percentage +
-                    quarterly individuals share capital in excess of rs 1 lakh percentage )
-                    > ( 1 quarter ago individuals share capital up to rs 1 lakh percentage +
-                        1 quarter ago individuals share capital in excess of rs 1 lakh percentage ) * 1.03
-                    and
-                    ( quarterly individuals share capital up to rs 1 lakh percentage +
-                    quarterly individuals share capital in excess of rs 1 lakh percentage )
-                    > ( 4 quarters ago individuals share capital up to rs 1 lakh percentage +
-                        4 quarters ago individuals share capital in excess of rs 1 lakh percentage ) * 1.03
-                ) )
-            ) )"""
-        }
-    },
-    "fii_dii_stake_increase": {
-        "name": "FII + DII Stake Increase (1Q)",
-        "condition": {
-            "scan_clause": """( {cash} (
-                ( {cash} (
-                    quarterly foreign institutional investors percentage >
-                    1 quarter ago foreign institutional investors percentage
-                    and
-                    quarterly mutual funds or uti percentage >
-                    1 quarter ago mutual funds or uti percentage
-                ) )
-            ) )"""
-        }
-    },
-    "consistent_mf_fii_accumulation": {
-        "name": "Consistent MF & FII Accumulation (4Q)",
-        "condition": {
-            "scan_clause": """( {cash} (
-                ( {cash} (
-                    ( {cash} (
-                        quarterly mutual funds or uti percentage >
-                        1 quarter ago mutual funds or uti percentage
-                        and
-                        1 quarter ago mutual funds or uti percentage >
-                        2 quarter ago mutual funds or uti percentage
-                        and
-                        2 quarter ago mutual funds or uti percentage >
-                        3 quarter ago mutual funds or uti percentage
-                        and
-                        quarterly foreign institutional investors percentage >
-                        1 quarter ago foreign institutional investors percentage
-                        and
-                        1 quarter ago foreign institutional investors percentage >
-                        2 quarter ago foreign institutional investors percentage
-                        and
-                        2 quarter ago foreign institutional investors percentage >
-                        3 quarter ago foreign institutional investors percentage
-                    ) )
-                ) )
-            ) )"""
-        }
-    },
-}
+from . import changes, combine, metrics, results
+from .combine import combined_result
+from .fanout import confluence, run_many
+from .exports import EXPORT_FORMATS, export_response
+from .resilience import CircuitOpen, RateLimited
+from .scans import (
+    as_of_result, delta_since, entry_version, get_screener_result, last_updated as entry_last_updated,
+)
+from .screeners import REGISTRY_VERSION, SCREENER_CATEGORIES, SCREENER_CONDITIONS, SCREENER_KEYS
+
+logger = logging.getLogger(__name__)
 
-# =========================
-# Category mapping
-# =========================
-SCREENER_CATEGORIES = {
-    "All Screeners":[
-        "minervini_stage_2",
-        "smc_tradable_universe_near_ath",
-        "all_tradable_stocks",
-        "ipo_1_year",
-        "ipo_3_years",
-        "momentum_compression",
-        "multi_year_breakout",
-        "ten_year_range_breakout",
-        "episodic_pivot", #4.5%  
-        "epo_intraday",
-        "hve_highest_volume_ever",
-        "hvy_highest_volume_yearly",
-        "hve_hvy_hvq",
-        "volume_buzz",
-        "flags_formation",
-        "tight_flag",
-        "tight_weekly_base",
-        "power_trend_squeeze",
-        "darvas_box",
-        "golden_crossover",
-        "liquid_ipos_2y",
-        "stocks_near_highs",
-        "vcp_minervini",
-        "high_flags",
-        "perfectly_stacked_ma",
-        "promoter_stake_increase",
-        "retail_stake_increase",
-        "consistent_mf_fii_accumulation",
-        "fii_dii_stake_increase"
-    ],
-    "Tradable Universe": [
-        "minervini_stage_2",
-        "smc_tradable_universe_near_ath",
-        "all_tradable_stocks"
-    ],
-    "IPO Base": [
-        "ipo_1_year",
-        "ipo_3_years",
-        "momentum_compression"
-    ],
-    "Multi-Year High Breakout": [
-        "multi_year_breakout",
-        "ten_year_range_breakout",
-    ],
-    "Episodic Pivot":[
-      "episodic_pivot", #4.5%  
-      "epo_intraday"
-    ],
-    "Volume":[
-        "hve_highest_volume_ever",
-        "hvy_highest_volume_yearly",
-        "hve_hvy_hvq",
-        "volume_buzz"
-    ],
-    "Flags":[
-        "flags_formation",
-        "tight_flag",
-        "tight_weekly_base"
-    ],
-    "Special category":[
-        "power_trend_squeeze",
-        "darvas_box",
-        "golden_crossover",
-        "liquid_ipos_2y",
-        "stocks_near_highs",
-        "vcp_minervini",
-        "high_flags",
-        "perfectly_stacked_ma"
-    ],
-    "Fundamental Screeners":[
-        "promoter_stake_increase",
-        "retail_stake_increase",
-        "consistent_mf_fii_accumulation",
-        "fii_dii_stake_increase"
-    ]
-}
 
 # =========================
-# Main index view
+# Shared view helpers
 # =========================
-@login_required(login_url='/login/')
-def index(request):
-    stock_list = None
-    last_updated = None
-    selected_screener = request.POST.get("screener_name")
-    selected_screener_name = ""
-    selected_category = request.GET.get("category")
-
-    # Show screeners by category
+def screeners_for_category(selected_category):
     if selected_category and selected_category in SCREENER_CATEGORIES:
-        filtered_screeners = {
+        return {
             key: SCREENER_CONDITIONS[key]
             for key in SCREENER_CATEGORIES[selected_category]
             if key in SCREENER_CONDITIONS
         }
-    else:
-        # Default: show all
-        filtered_screeners = SCREENER_CONDITIONS
+    # Default: show all
+    return SCREENER_CONDITIONS
 
-    # Run scan if user selects screener
-    if request.method == "POST" and selected_screener:
-        screener = SCREENER_CONDITIONS.get(selected_screener)
-        selected_screener_name = screener["name"] if screener else ""
-        condition = screener["condition"] if screener else {}
 
-        url = "https://chartink.com/screener/process"
-        try:
-            with requests.session() as s:
-                r_data = s.get(url)
-                soup = bs(r_data.content, "lxml")
-                meta = soup.find("meta", {"name": "csrf-token"})
-                header = {"x-csrf-token": meta["content"]} if meta else {}
-
-                response = s.post(url, headers=header, data=condition)
-                data = response.json()
-                raw_data = data["data"]
-
-                filtered_data = [
-                    row for row in raw_data
-                    if all(k in row for k in ["nsecode", "per_chg", "close", "volume", "sr"])
-                ]
-
-                stock_list = pd.DataFrame(filtered_data).rename(columns={
-                    "nsecode": "stock_name",
-                    "per_chg": "percent_change",
-                    "close": "current_price",
-                    "volume": "trade_volume",
-                    "sr": "rank"
-                }).to_dict(orient="records")
-
-                last_updated = datetime.now(pytz.timezone('Asia/Kolkata'))
+def grid_version(selected_category):
+    """Key of the cached screener grid (and key list): the registry version and the category shown."""
+    category = selected_category if selected_category in SCREENER_CATEGORIES else ""
+    return f"{REGISTRY_VERSION}:{category}"
 
-        except Exception as e:
-            print(f"Error: {e}")
-            stock_list = []
-
-    return render(request, 'stock_app/index.html', {
-        'stock_list': stock_list,
-        'last_updated': last_updated,
-        'screeners': filtered_screeners,
-        'selected_screener': selected_screener,
-        'selected_screener_name': selected_screener_name,
+
+def table_key(screener_key, entry):
+    """
+    Key of the cached first page of ``entry``'s results table, or ``None``
+    when the entry is not a recorded run (replays and combinations).
+    """
+    if entry.get("run_id") is None or entry.get("as_of"):
+        return None
+    return f"{screener_key}:{entry['run_id']}"
+
+
+def requested_screeners(request):
+    """
+    Screeners named by ``?category=`` or repeated ``?screener=`` parameters.
+    Raises ``ValueError`` for unknown names.
+    """
+    category = request.GET.get("category")
+    keys = request.GET.getlist("screener")
+    if category:
+        if category not in SCREENER_CATEGORIES:
+            raise ValueError(f"Unknown category: {category}")
+        keys = SCREENER_CATEGORIES[category]
+    if not keys:
+        raise ValueError("Pass a category or at least one screener")
+
+    unknown = [key for key in keys if key not in SCREENER_CONDITIONS]
+    if unknown:
+        raise ValueError(f"Unknown screener(s): {', '.join(unknown)}")
+    return {key: SCREENER_CONDITIONS[key] for key in keys}
+
+
+def as_of_errors():
+    """
+    Why an as-of replay cannot be served (the engine cannot run the clause,
+    or the store has no day that early). A function so the engine, and
+    NumPy with it, is only imported once an ``except`` clause checks it.
+    """
+    from . import engine
+
+    return (engine.UnsupportedClause, engine.ClauseSyntaxError, ValueError)
+
+
+def parse_as_of(value):
+    """The ``?as_of=`` day (YYYY-MM-DD) to replay a screener on, or ``None`` for live results."""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"as_of must be a date (YYYY-MM-DD), got {value!r}")
+
+
+def parse_expression(value):
+    """The ``combine.Expression`` for ``value``; raises ``ValueError`` if it does not parse."""
+    if not value:
+        raise ValueError("Pass an expression, e.g. minervini_stage_2 AND tight_flag AND NOT ipo_1_year")
+    return combine.parse(value, SCREENER_KEYS)
+
+
+def parse_since(value):
+    """The ``?since=`` run id to report changes from, or ``None`` for full results."""
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"since must be a run id, got {value!r}")
+
+
+def scan_failed(response, error):
+    """
+    ``response`` for a scan that raised ``error`` with no stale result to
+    fall back on: 503 with ``Retry-After`` while Chartink calls are being
+    refused, 502 otherwise.
+    """
+    response.status_code = 502
+    if isinstance(error, (CircuitOpen, RateLimited)):
+        response.status_code = 503
+        response["Retry-After"] = str(max(math.ceil(getattr(error, "retry_after", 1)), 1))
+    return response
+
+
+def results_response(entry, params, symbols_only=False, delta=None):
+    """
+    A page of ``entry`` (or all its symbols), or with ``delta`` only what
+    changed since the run ``params["since"]``.
+    """
+    try:
+        if delta is not None:
+            payload = changes.payload(entry, parse_since(params.get("since")), delta, symbols_only)
+        elif symbols_only:
+            found = results.symbols(entry, params)
+            payload = {"run": entry_version(entry), "count": len(found), "symbols": found}
+        else:
+            payload = results.page(entry, params)
+        if entry.get("stale"):
+            # The last good run, served because a fresh scan failed.
+            payload["stale"] = True
+        if "expression" in entry:
+            payload["expression"] = entry["expression"]
+            payload["evaluate_us"] = entry["evaluate_us"]
+        return JsonResponse(payload)
+    except (results.StaleCursor, changes.UnknownRun) as e:
+        return JsonResponse({"error": str(e)}, status=409)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+
+def fanout_response(outcomes, elapsed, include_rows):
+    payload = {
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "failed": [o["key"] for o in outcomes if o["status"] != "ok"],
+        "confluence": confluence(outcomes),
+        "screeners": outcomes,
+    }
+    for outcome in outcomes:
+        outcome["row_count"] = len(outcome["rows"])
+        if include_rows:
+            outcome["rows"] = [row.as_dict() for row in outcome["rows"]]
+        else:
+            del outcome["rows"]
+    return JsonResponse(payload)
+
+
+# =========================
+# Request parsing and responses shared with async_views
+# =========================
+def fetch_entry(screener_key, condition, as_of=None):
+    """The screener's result, or its replay as of ``as_of``'s close."""
+    if as_of:
+        return as_of_result(screener_key, condition, as_of)
+    return get_screener_result(screener_key, condition)
+
+
+def index_query(request):
+    """
+    The index page's context before any results, and what to fetch for it:
+    ``None``, ``{"screener": key, "condition": ..., "as_of": date or None}``
+    or ``{"expression": combine.Expression}``. Bad input becomes the page's
+    ``scan_error``.
+    """
+    selected_category = request.GET.get("category")
+    context = {
+        'stock_list': None,
+        'last_updated': None,
+        # Show screeners by category
+        'screeners': screeners_for_category(selected_category),
+        'selected_screener': request.POST.get("screener_name"),
+        'selected_screener_name': "",
         'categories': SCREENER_CATEGORIES.keys(),
-        'selected_category': selected_category
+        'selected_category': selected_category,
+        'grid_version': grid_version(selected_category),
+        'table_key': None,
+        'total_results': 0,
+        'next_cursor': None,
+        'as_of': None,
+        'as_of_value': request.GET.get("as_of", ""),
+        'stale': False,
+        'scan_error': None,
+        'delta': None,
+        'expression': request.POST.get("expression", "").strip(),
+        'run': None,
+    }
+    if request.method != "POST":
+        return context, None
+
+    query = None
+    try:
+        key = context['selected_screener']
+        if key:
+            screener = SCREENER_CONDITIONS.get(key)
+            if screener is None:
+                raise ValueError(f"Unknown screener: {key}")
+            context['selected_screener_name'] = screener["name"]
+            context['as_of'] = parse_as_of(request.GET.get("as_of"))
+            query = {"screener": key, "condition": screener["condition"], "as_of": context['as_of']}
+        # Or a combination of screeners, e.g. "vcp_tightness AND NOT ipo_1_year"
+        elif context['expression']:
+            context['selected_screener_name'] = context['expression']
+            combination = parse_expression(context['expression'])
+            context['expression'] = context['selected_screener_name'] = combination.text
+            query = {"expression": combination}
+    except ValueError as e:
+        index_failed(context, e)
+    return context, query
+
+
+def index_results(context, query, entry):
+    """Fill the index page's ``context`` from the fetched ``entry``."""
+    # The rest is paged in from screener_results on demand.
+    first_page = results.page(entry, {})
+    context.update({
+        'stock_list': first_page["results"],
+        'last_updated': entry_last_updated(entry),
+        'stale': entry.get("stale", False),
+        'total_results': first_page["total"],
+        'next_cursor': first_page["next_cursor"],
+        'run': first_page["run"],
     })
+    if "screener" in query:
+        context['delta'] = entry.get("delta")
+        context['table_key'] = table_key(query["screener"], entry)
+        if query["as_of"]:
+            # The day actually replayed (the last trading day up to as_of).
+            context['as_of'] = entry["as_of"]
+
+
+def index_failed(context, error):
+    if context['selected_screener']:
+        logger.warning("Scan of %s failed: %s", context['selected_screener'], error)
+    else:
+        logger.warning("Combination %r failed: %s", context['expression'], error)
+    context['scan_error'] = str(error)
+    context['stock_list'] = []
+
+
+def download_query(request):
+    """
+    ``(screener key, condition, export format, as_of)`` for a download, or
+    the error response for bad parameters.
+    """
+    screener_key = request.GET.get("screener_name", "episodic_pivot")
+    screener = SCREENER_CONDITIONS.get(screener_key)
+    if screener is None:
+        return HttpResponse(f"Unknown screener: {screener_key}", status=404)
+    export_format = request.GET.get("format", "csv")
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponse(f"Unknown export format: {export_format}", status=400)
+    try:
+        as_of = parse_as_of(request.GET.get("as_of"))
+    except ValueError as e:
+        return HttpResponse(str(e), status=400)
+    return screener_key, screener["condition"], export_format, as_of
+
+
+def download_failed(screener_key, export_format, error):
+    logger.warning("%s download of %s failed: %s", export_format, screener_key, error)
+    return scan_failed(HttpResponse(f"Error downloading {export_format.upper()}: {error}"), error)
+
+
+def result_api_query(request, screener_key):
+    """
+    ``(condition, as_of, since)`` for the results API, or the error
+    response for an unknown screener or bad parameters.
+    """
+    screener = SCREENER_CONDITIONS.get(screener_key)
+    if screener is None:
+        return JsonResponse({"error": f"Unknown screener: {screener_key}"}, status=404)
+    try:
+        return screener["condition"], parse_as_of(request.GET.get("as_of")), parse_since(request.GET.get("since"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+
+def result_api_failed(error, as_of):
+    """400 for a replay the engine cannot serve, else ``scan_failed``."""
+    if as_of and isinstance(error, as_of_errors()):
+        return JsonResponse({"error": str(error)}, status=400)
+    return scan_failed(JsonResponse({"error": f"Scan failed: {error}"}), error)
+
+
+def combined_api_query(request):
+    """``(expression, export format or None)`` for the combination API, or the error response."""
+    try:
+        expression = parse_expression(request.GET.get("expr"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    export_format = request.GET.get("format")
+    if export_format and export_format not in EXPORT_FORMATS:
+        return JsonResponse({"error": f"Unknown export format: {export_format}"}, status=400)
+    return expression, export_format
+
+
+# =========================
+# Main index view
+# =========================
+@login_required(login_url='/login/')
+def index(request):
+    context, query = index_query(request)
+    if query is not None:
+        try:
+            if "expression" in query:
+                entry = combined_result(query["expression"], SCREENER_CONDITIONS, settings.FANOUT_TIMEOUT)
+            else:
+                entry = fetch_entry(query["screener"], query["condition"], query["as_of"])
+            index_results(context, query, entry)
+        except Exception as e:
+            index_failed(context, e)
+
+    with metrics.stage("render"):
+        return render(request, 'stock_app/index.html', context)
 
 # =========================
-# CSV download view
+# Download view (csv, jsonl, arrow, parquet)
 # =========================
 def download_csv(request):
-    selected_screener = request.GET.get("screener_name", "episodic_pivot")
-    screener = SCREENER_CONDITIONS.get(selected_screener)
-    condition = screener["condition"] if screener else {}
+    query = download_query(request)
+    if isinstance(query, HttpResponse):
+        return query
+    screener_key, condition, export_format, as_of = query
+    try:
+        entry = fetch_entry(screener_key, condition, as_of)
+        return export_response(request, screener_key, entry, export_format)
+    except Exception as e:
+        return download_failed(screener_key, export_format, e)
 
-    url = "https://chartink.com/screener/process"
+# =========================
+# Multi-screener API
+# =========================
+@login_required(login_url='/login/')
+def run_screeners(request):
+    try:
+        screeners = requested_screeners(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    started = time.perf_counter()
+    outcomes = run_many(screeners, timeout=settings.FANOUT_TIMEOUT)
+    return fanout_response(outcomes, time.perf_counter() - started, request.GET.get("rows") != "0")
+
+
+# =========================
+# Results API (paged, sorted, filtered)
+# =========================
+def _screener_result_api(request, screener_key, symbols_only):
+    query = result_api_query(request, screener_key)
+    if isinstance(query, HttpResponse):
+        return query
+    condition, as_of, since = query
     try:
-        with requests.session() as s:
-            r_data = s.get(url)
-            soup = bs(r_data.content, "lxml")
-            meta = soup.find("meta", {"name": "csrf-token"})
-            header = {"x-csrf-token": meta["content"]} if meta else {}
-
-            response = s.post(url, headers=header, data=condition)
-            data = response.json()
-            raw_data = data["data"]
-
-            filtered_data = [
-                row for row in raw_data
-                if all(k in row for k in ["nsecode", "per_chg", "close", "volume", "sr"])
-            ]
-
-            df = pd.DataFrame(filtered_data).rename(columns={
-                "sr": "Rank",
-                "nsecode": "Stock Symbol",
-                "per_chg": "Percent Change",
-                "close": "Current Price",
-                "volume": "Trade Volume"
-            })
-
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = f'attachment; filename="{selected_screener}_stocks.csv"'
-            df.to_csv(path_or_buf=response, index=False)
-            return response
+        entry = fetch_entry(screener_key, condition, as_of)
+    except Exception as e:
+        return result_api_failed(e, as_of)
+    try:
+        delta = delta_since(screener_key, entry, since) if since is not None else None
+    except changes.UnknownRun as e:
+        return JsonResponse({"error": str(e)}, status=409)
+    return results_response(entry, request.GET, symbols_only, delta)
+
+
+@login_required(login_url='/login/')
+def screener_results(request, screener_key):
+    return _screener_result_api(request, screener_key, symbols_only=False)
+
+
+@login_required(login_url='/login/')
+def screener_symbols(request, screener_key):
+    return _screener_result_api(request, screener_key, symbols_only=True)
+
 
+# =========================
+# Screener combinations (AND / OR / NOT)
+# =========================
+def _combined_api(request, symbols_only):
+    query = combined_api_query(request)
+    if isinstance(query, HttpResponse):
+        return query
+    expression, export_format = query
+    try:
+        entry = combined_result(expression, SCREENER_CONDITIONS, settings.FANOUT_TIMEOUT)
     except Exception as e:
-        print("CSV download error:", e)
-        return HttpResponse("Error downloading CSV")
-    
+        return scan_failed(JsonResponse({"error": f"Scan failed: {e}"}), e)
+    if export_format:
+        return export_response(request, expression.slug, entry, export_format)
+    return results_response(entry, request.GET, symbols_only)
+
+
+@login_required(login_url='/login/')
+def combined_results(request):
+    """
+    ``?expr=`` evaluated over the screeners' latest results, paged like a
+    screener (``?format=`` exports it instead).
+    """
+    return _combined_api(request, symbols_only=False)
+
+
+@login_required(login_url='/login/')
+def combined_symbols(request):
+    return _combined_api(request, symbols_only=True)
+
+
+# =========================
+# Live updates (Server-Sent Events)
+# =========================
+@login_required(login_url='/login/')
+def screener_stream(request):
+    # A stream would hold a WSGI worker for as long as the client stays.
+    return JsonResponse({"error": "Live updates need the ASGI server (stock_project.asgi)"}, status=501)
+
+
+# =========================
+# Prometheus metrics
+# =========================
+def metrics_view(request):
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if token:
+        if not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return HttpResponse("Unauthorized", status=401)
+    elif not request.user.is_staff:
+        # Without a token only staff can read it.
+        raise Http404
+    return HttpResponse(metrics.registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
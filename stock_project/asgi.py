@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stock_project.settings')
+# Under ASGI the screener views await Chartink instead of blocking a thread.
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
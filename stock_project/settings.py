@@ -48,10 +48,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'stock_app.middleware.RequestTelemetryMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Records each session's IP and user agent for the sessions page.
+    'user_sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    # Brotli or gzip for HTML, JSON and CSV responses. Inside CSRF, which
+    # clears the flag that marks pages carrying a token once it sets the cookie.
+    'stock_app.compression.CompressionMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -77,6 +83,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'stock_project.wsgi.application'
 
+# Serve the screener pages with the async views (stock_app.async_views).
+# stock_project.asgi turns this on, so uvicorn workers get it by default.
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "0") == "1"
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
@@ -129,6 +139,14 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.0/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = os.environ.get("STATIC_ROOT", BASE_DIR / 'staticfiles')
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    # Hashed, precompressed files served by WhiteNoise (stock_app/storage.py).
+    'staticfiles': {'BACKEND': 'stock_app.storage.StaticFilesStorage'},
+}
+# Serve app static files before collectstatic has run, too.
+WHITENOISE_USE_FINDERS = True
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -139,9 +157,172 @@ LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'  # After login
 LOGOUT_REDIRECT_URL = '/login/'  # After logout
 
-SESSION_ENGINE = 'user_sessions.backends.db'
+# user_sessions backed by the "sessions" cache, with the database as the
+# store of record (stock_app/sessions.py).
+SESSION_ENGINE = 'stock_app.sessions'
+# The admin only looks for Django's own session middleware.
+SILENCED_SYSTEM_CHECKS = ['admin.E410']
+SESSION_CACHE_ALIAS = 'sessions'
 SESSION_COOKIE_AGE = 1209600  # 2 weeks (can be shorter)
+# Seconds between last-activity writes for a session seen from the same device.
+SESSION_ACTIVITY_INTERVAL = int(os.environ.get("SESSION_ACTIVITY_INTERVAL", 300))
 
 
+# Caches
+# The "screener" alias holds Chartink results and the "sessions" alias holds
+# sessions. Both must be shared by every worker process: a file cache on one
+# host, Redis when REDIS_URL is set.
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'screener': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get("SCREENER_CACHE_DIR", BASE_DIR / '.screener_cache'),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+    # Rendered screener grids and result tables ({% cache %} in index.html),
+    # keyed by registry version and run, so they are never stale.
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template_fragments',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 500},
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get("SESSION_CACHE_DIR", BASE_DIR / '.session_cache'),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+redis_url = os.environ.get("REDIS_URL")
+if redis_url:
+    CACHES['screener'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': redis_url,
+        'TIMEOUT': None,
+    }
+    CACHES['sessions'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': redis_url,
+        'KEY_PREFIX': 'sessions',
+    }
+
+SCREENER_CACHE = {
+    'ALIAS': 'screener',
+    # Seconds a result stays fresh in each market phase.
+    'TTL': {'pre_open': 120, 'open': 60, 'closed': 6 * 60 * 60},
+    'SCREENER_TTL': {
+        'epo_intraday': {'open': 30},
+        'promoter_stake_increase': {'open': 24 * 60 * 60, 'closed': 24 * 60 * 60},
+        'retail_stake_increase': {'open': 24 * 60 * 60, 'closed': 24 * 60 * 60},
+        'consistent_mf_fii_accumulation': {'open': 24 * 60 * 60, 'closed': 24 * 60 * 60},
+        'fii_dii_stake_increase': {'open': 24 * 60 * 60, 'closed': 24 * 60 * 60},
+    },
+    'STALE_GRACE': 24 * 60 * 60,
+    'LOCAL_MAX_ENTRIES': 64,
+    'LOCK_DIR': os.environ.get("SCREENER_LOCK_DIR"),
+    'LOCK_TIMEOUT': 30,
+}
 
+# Background refresh (manage.py run_screener_scheduler). Screeners without
+# a fixed interval are rescanned at REFRESH_FACTOR x their cache TTL. Runs
+# older than RETENTION_DAYS are pruned, except each screener's latest.
+SCREENER_SCHEDULE = {
+    'MAX_WORKERS': 4,
+    'JITTER': 10,
+    'REFRESH_FACTOR': 0.9,
+    'INTERVALS': {},
+    'RETENTION_DAYS': int(os.environ.get("SCREENER_RETENTION_DAYS", 30)),
+    'PRUNE_INTERVAL': 60 * 60,
+}
+
+# Chartink's scan endpoint; point it at benchmarks/fake_chartink.py for
+# benchmarks and load tests.
+CHARTINK_URL = os.environ.get("CHARTINK_URL", "https://chartink.com/screener/process")
+
+# Chartink request guards (stock_app.resilience): a rate limit shared by all
+# workers, per-attempt timeouts, jittered retries within an overall
+# deadline, and a circuit breaker. While calls fail, the last good result
+# is served marked stale.
+CHARTINK_RESILIENCE = {
+    'RATE': float(os.environ.get("CHARTINK_RATE", 2)),
+    'BURST': 5,
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 10,
+    'RETRIES': 2,
+    'BACKOFF_BASE': 0.5,
+    'BACKOFF_CAP': 4,
+    'DEADLINE': 20,
+    'BREAKER_THRESHOLD': 5,
+    'BREAKER_RESET': 30,
+    'STATE_DIR': os.environ.get("SCREENER_LOCK_DIR"),
+}
+
+# Multi-screener API (/api/screeners/run/): concurrent scans and the
+# seconds to wait before reporting a screener as timed out.
+FANOUT_MAX_WORKERS = 8
+FANOUT_TIMEOUT = 10
+
+# Live updates (/api/screeners/stream/, ASGI only; stock_app.live): how
+# often each watched screener is looked up, and how many events a slow
+# client may fall behind before its oldest are dropped.
+LIVE_UPDATES = {
+    'POLL_INTERVAL': 5,
+    'QUEUE_SIZE': 16,
+    'KEEPALIVE': 15,
+    'MAX_SCREENERS': 20,
+}
+
+# NSE trading holidays as ISO dates, e.g. "2025-10-21,2025-11-05".
+NSE_HOLIDAYS = [d for d in os.environ.get("NSE_HOLIDAYS", "").split(",") if d]
+
+# Where each screener is evaluated: "chartink" (remote scan) or "local"
+# (stock_app.engine over the OHLCV store below). SCREENER_SOURCES overrides
+# the default per screener key; clauses the panel has no data for (the
+# shareholding screeners) always fall back to Chartink.
+SCREENER_SOURCE = os.environ.get("SCREENER_SOURCE", "chartink")
+SCREENER_SOURCES = {}
+# Memory-mapped daily bars for the local engine; appended to by
+# manage.py ingest_eod.
+OHLCV_STORE_DIR = os.environ.get("OHLCV_STORE_DIR", BASE_DIR / 'data' / 'ohlcv')
+# Bytes of daily indicator series (EMAs, rolling highs, ...) each process
+# keeps so screeners and later days reuse them.
+INDICATOR_CACHE_MAX_BYTES = int(os.environ.get("INDICATOR_CACHE_MAX_BYTES", 256 * 2 ** 20))
+
+# Metrics (stock_app.metrics, served at /metrics). With METRICS_DIR set,
+# each worker writes its values there and a scrape sums them; otherwise a
+# scrape sees only the worker that answered it. Scrapers
+# send "Authorization: Bearer <METRICS_TOKEN>"; without a token only staff
+# users can read /metrics.
+METRICS_DIR = os.environ.get("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = 5
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# Logging: one JSON object per line with the request id and screener
+# (stock_app.logs). LOG_FORMAT=text for plain lines in development.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_context': {'()': 'stock_app.logs.RequestContextFilter'},
+    },
+    'formatters': {
+        'json': {'()': 'stock_app.logs.JsonFormatter'},
+        'text': {'format': '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['request_context'],
+            'formatter': os.environ.get("LOG_FORMAT", "json"),
+        },
+    },
+    'root': {'handlers': ['console'], 'level': os.environ.get("LOG_LEVEL", "INFO")},
+    'loggers': {
+        # Access lines come from stock_app.requests instead.
+        'django.server': {'level': 'WARNING'},
+    },
+}
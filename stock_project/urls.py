@@ -14,6 +14,7 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
 from stock_app import views
@@ -21,9 +22,23 @@ from django.contrib.auth import views as auth_views
 from django.urls import path, include
 
 
+if settings.ASYNC_VIEWS:
+    from stock_app import async_views as screener_views
+else:
+    screener_views = views
+
 urlpatterns = [
-    path('', views.index, name='home'),
-    path('download/', views.download_csv, name='download_csv'),
+    path('', screener_views.index, name='home'),
+    path('download/', screener_views.download_csv, name='download_csv'),
+    path('api/screeners/run/', screener_views.run_screeners, name='run_screeners'),
+    path('api/screeners/stream/', screener_views.screener_stream, name='screener_stream'),
+    path('api/screeners/combine/', screener_views.combined_results, name='combined_results'),
+    path('api/screeners/combine/symbols/', screener_views.combined_symbols, name='combined_symbols'),
+    path('api/screeners/<str:screener_key>/results/', screener_views.screener_results, name='screener_results'),
+    path('api/screeners/<str:screener_key>/symbols/', screener_views.screener_symbols, name='screener_symbols'),
+
+    # Prometheus scrape target
+    path('metrics', views.metrics_view, name='metrics'),
 
     # Admin
     path('admin/', admin.site.urls),